@@ -5,6 +5,7 @@ from config import config
 from models import MeterReading, PVData
 from utils import pv_profile, retry_on_failure, get_rabbitmq_connection
 from simulation import SimulationManager
+from storage import get_results_store
 from logging_config import setup_logging
 
 __all__ = [
@@ -15,5 +16,6 @@ __all__ = [
     'retry_on_failure',
     'get_rabbitmq_connection',
     'SimulationManager',
+    'get_results_store',
     'setup_logging'
 ]
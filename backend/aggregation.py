@@ -0,0 +1,249 @@
+"""
+Downsampling and aggregation of results for long time ranges
+"""
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from storage import Columns, concat_columns, from_epoch_micros
+
+SERIES = ('meter', 'pv', 'net')
+MAX_LTTB_POINTS = 10_000  # The selected rows are held in memory
+
+BUCKET_UNITS = {
+    's': 1_000_000,
+    'm': 60 * 1_000_000,
+    'h': 60 * 60 * 1_000_000,
+    'd': 24 * 60 * 60 * 1_000_000,
+}
+
+
+def parse_bucket(bucket: str) -> int:
+    """
+    Parse a bucket size such as '30s', '1m', '15m', '1h' or '1d'
+
+    Returns:
+        Bucket size in microseconds
+    """
+    match = re.fullmatch(r'(\d+)([smhd])', bucket.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid bucket size: {bucket}")
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+
+
+def _bucket_partials(columns: Columns, bucket_us: int) -> Dict[str, np.ndarray]:
+    """
+    Per-bucket count and sum/min/max of each series for one chunk
+
+    Rows are grouped with a single vectorized pass (reduceat over bucket
+    boundaries), so cost is linear in the number of rows.
+    """
+    bucket_ids = np.asarray(columns['timestamp'], dtype=np.int64) // bucket_us
+    order = None
+    if np.any(bucket_ids[1:] < bucket_ids[:-1]):
+        order = np.argsort(bucket_ids, kind='stable')
+        bucket_ids = bucket_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], bucket_ids[1:] != bucket_ids[:-1])))
+
+    partials = {'bucket': bucket_ids[starts], 'count': np.diff(np.append(starts, len(bucket_ids)))}
+    for name in SERIES:
+        values = np.asarray(columns[name], dtype=np.float64)
+        if order is not None:
+            values = values[order]
+        partials[name + '.sum'] = np.add.reduceat(values, starts)
+        partials[name + '.min'] = np.minimum.reduceat(values, starts)
+        partials[name + '.max'] = np.maximum.reduceat(values, starts)
+    return partials
+
+
+def _merge_partials(partials: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Combine per-chunk partials into one entry per bucket, oldest first"""
+    if len(partials) == 1:
+        return partials[0]
+    combined = {key: np.concatenate([part[key] for part in partials]) for key in partials[0]}
+    order = np.argsort(combined['bucket'], kind='stable')
+    bucket_ids = combined['bucket'][order]
+    starts = np.flatnonzero(np.concatenate(([True], bucket_ids[1:] != bucket_ids[:-1])))
+    reducers = {'count': np.add, 'sum': np.add, 'min': np.minimum, 'max': np.maximum}
+    merged = {'bucket': bucket_ids[starts]}
+    for key, values in combined.items():
+        if key != 'bucket':
+            merged[key] = reducers[key.rsplit('.', 1)[-1]].reduceat(values[order], starts)
+    return merged
+
+
+def aggregate_chunks(chunks: Iterable[Columns], bucket_us: int) -> List[Dict]:
+    """
+    Min/mean/max of meter, pv and net per time bucket over column chunks
+
+    Each chunk is reduced to per-bucket count/sum/min/max before the next
+    is read, so memory use is bounded by the chunk size and the number of
+    buckets rather than by the number of rows.
+
+    Args:
+        chunks: timestamp/meter/pv/net column arrays, e.g. from ResultsStore.iter_range
+        bucket_us: Bucket size in microseconds
+
+    Returns:
+        One entry per non-empty bucket, oldest first
+    """
+    partials = [_bucket_partials(columns, bucket_us) for columns in chunks if len(columns['timestamp'])]
+    if not partials:
+        return []
+    merged = _merge_partials(partials)
+    counts = merged['count']
+
+    stats = {}
+    for name in SERIES:
+        stats[name] = {
+            'min': np.round(merged[name + '.min'], 2).tolist(),
+            'mean': np.round(merged[name + '.sum'] / counts, 2).tolist(),
+            'max': np.round(merged[name + '.max'], 2).tolist(),
+        }
+
+    bucket_starts = from_epoch_micros(merged['bucket'] * bucket_us).tolist()
+    return [
+        {
+            'timestamp': bucket_starts[i],
+            'count': int(counts[i]),
+            **{name: {key: stats[name][key][i] for key in ('min', 'mean', 'max')} for name in SERIES},
+        }
+        for i in range(len(counts))
+    ]
+
+
+def aggregate(columns: Columns, bucket_us: int) -> List[Dict]:
+    """
+    Min/mean/max of meter, pv and net per time bucket
+
+    Args:
+        columns: timestamp/meter/pv/net arrays
+        bucket_us: Bucket size in microseconds
+
+    Returns:
+        One entry per non-empty bucket, oldest first
+    """
+    return aggregate_chunks([columns], bucket_us)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Picks at most threshold points that preserve the visual shape of the
+    series (peaks and troughs are kept, flat stretches are thinned out).
+
+    Args:
+        x: Monotonic x values (e.g. epoch microseconds)
+        y: Series values
+        threshold: Maximum number of points to keep
+
+    Returns:
+        Indices of the selected points, in order
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError("LTTB needs a threshold of at least 3 points")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges for the n - 2 interior points; first and last points are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_chunks(read_chunks: Callable[[], Iterable[Columns]], series: str, threshold: int) -> Columns:
+    """
+    Largest-Triangle-Three-Buckets downsampling of column chunks
+
+    Selects the same points as lttb() without holding the series in memory:
+    the chunks are read three times, to count the rows, to average each
+    bucket and to pick the point of each bucket.
+
+    Args:
+        read_chunks: Returns a fresh iterator over the column chunks, e.g.
+            lambda: store.iter_range(start_us, end_us)
+        series: Series to preserve the shape of (one of SERIES)
+        threshold: Maximum number of points to keep, at least 3
+
+    Returns:
+        Column arrays of the selected rows, in order
+    """
+    if threshold < 3:
+        raise ValueError("LTTB needs a threshold of at least 3 points")
+    n = sum(len(columns['timestamp']) for columns in read_chunks())
+    if n <= threshold:
+        return concat_columns([columns for columns in read_chunks() if len(columns['timestamp'])])
+
+    # Same buckets as lttb(): id -1 is the first point, threshold - 2 the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    def bucketed():
+        base = 0
+        for columns in read_chunks():
+            size = len(columns['timestamp'])
+            ids = np.searchsorted(edges, np.arange(base, base + size), side='right') - 1
+            base += size
+            yield (columns, ids, np.asarray(columns['timestamp'], dtype=np.float64),
+                   np.asarray(columns[series], dtype=np.float64))
+
+    sums_x = np.zeros(threshold)
+    sums_y = np.zeros(threshold)
+    counts = np.zeros(threshold)
+    for _, ids, x, y in bucketed():
+        sums_x += np.bincount(ids + 1, weights=x, minlength=threshold)
+        sums_y += np.bincount(ids + 1, weights=y, minlength=threshold)
+        counts += np.bincount(ids + 1, minlength=threshold)
+    avg_x = sums_x / np.maximum(counts, 1)
+    avg_y = sums_y / np.maximum(counts, 1)
+
+    selected: List[Columns] = []
+    a_x = a_y = best_x = best_y = 0.0
+    current, best_area = -1, -1.0
+    best: Optional[Columns] = None
+    for columns, ids, x, y in bucketed():
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        for start, end in zip(starts, np.append(starts[1:], len(ids))):
+            bucket = int(ids[start])
+            if bucket != current and best is not None:
+                # The previous bucket is complete: its point is the next triangle's apex
+                selected.append(best)
+                a_x, a_y = best_x, best_y
+                best_area, best = -1.0, None
+            current = bucket
+            if bucket == -1 or bucket == threshold - 2:
+                best = {name: values[start:start + 1] for name, values in columns.items()}
+                best_x, best_y = x[start], y[start]
+                continue
+            area = np.abs(
+                (a_x - avg_x[bucket + 2]) * (y[start:end] - a_y)
+                - (a_x - x[start:end]) * (avg_y[bucket + 2] - a_y)
+            )
+            top = int(np.argmax(area))
+            if area[top] > best_area:
+                row = start + top
+                best_area = area[top]
+                best = {name: values[row:row + 1] for name, values in columns.items()}
+                best_x, best_y = x[row], y[row]
+    if best is not None:
+        selected.append(best)
+    return concat_columns(selected)
@@ -3,9 +3,10 @@ import sys
 import signal
 import atexit
 import time
-import csv
+import json
 from datetime import datetime
 
+import numpy as np
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from flask_limiter import Limiter
@@ -16,6 +17,16 @@ from config import config
 from models import MeterReading, PVData
 from utils import get_rabbitmq_connection
 from simulation import SimulationManager
+from async_engine import AsyncSimulationEngine
+from coordination import SimulationCoordinator
+from storage import get_results_store, columns_to_records, result_records, RECORD_CHUNK_ROWS
+from backfill import BackfillJob, BackfillBusy, backfill_rows, to_micros
+from export import iter_export, ExportUnavailable, EXPORT_FORMATS
+from broadcast import broadcaster, StoreFollower
+from ring_buffer import recent_results
+from counters import pipeline_counters, prometheus_text, COUNTER_HELP
+from latency import latency_histograms, summarize, prometheus_samples, STAGES, SLOTS
+from aggregation import aggregate_chunks, lttb_chunks, parse_bucket, SERIES, MAX_LTTB_POINTS
 from logging_config import setup_logging
 
 # Ensure data directory exists
@@ -39,31 +50,153 @@ limiter = Limiter(
 
 start_time = time.time()
 
-# Initialize simulation manager
-simulation_manager = SimulationManager()
+# Initialize simulation manager; only the process holding the leader lock runs it
+simulation_manager = AsyncSimulationEngine() if config.ENGINE == 'asyncio' else SimulationManager()
+coordinator = SimulationCoordinator(simulation_manager)
+# Other processes feed their stream clients from the results store
+store_follower = StoreFollower(broadcaster, lambda: coordinator.is_leader)
+backfill_job = None
+
+# Serve recent results from memory, starting from the tail of the existing store
+recent_results.warm(get_results_store())
 
 # Graceful shutdown
 def shutdown_handler(signum, frame):
     logger.info("Received shutdown signal, stopping simulation...")
-    simulation_manager.stop()
+    if coordinator.is_leader:
+        coordinator.stop()
     sys.exit(0)
 
 signal.signal(signal.SIGTERM, shutdown_handler)
 signal.signal(signal.SIGINT, shutdown_handler)
-atexit.register(lambda: simulation_manager.stop())
+atexit.register(lambda: coordinator.is_leader and coordinator.stop())
+
+def _result_fields(result: dict) -> tuple:
+    # Map 'sum' column to 'net' for frontend compatibility
+    net = result['sum'] if 'sum' in result else result.get('net', 0.0)
+    return result['timestamp'], result['meter'], result['pv'], net
+
+def convert_results(results: list) -> list:
+    """Convert result rows of any backend to the record shape the frontend expects"""
+    if not results:
+        return results
+    try:
+        return result_records(*zip(*(_result_fields(result) for result in results)))
+    except (ValueError, KeyError, TypeError):
+        pass
+    # Return the rows that cannot be converted as they are
+    converted = []
+    for result in results:
+        try:
+            converted.extend(result_records(*zip(_result_fields(result))))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Error converting result data: {e}")
+            converted.append(result)
+    return converted
+
+def parse_time_arg(name: str):
+    """Parse an optional ISO timestamp query argument into epoch microseconds"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return to_micros(datetime.fromisoformat(value))
+
+def parse_count_arg(name: str):
+    """Parse an optional non-negative integer query argument"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+    if count < 0:
+        raise ValueError(f"{name} must be a non-negative integer")
+    return count
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def wants_ndjson() -> bool:
+    """Whether the client asked for newline-delimited JSON (?format=ndjson or Accept)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def serialize_records(chunks, ndjson: bool):
+    """
+    Serialize chunks of result records as one JSON array or as NDJSON
+    
+    Only one chunk is held in memory at a time, so the response starts
+    immediately and its size does not affect the server's memory use.
+    """
+    count = 0
+    if not ndjson:
+        yield '['
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            chunk = convert_results(chunk)
+            if ndjson:
+                yield ''.join(json.dumps(result) + '\n' for result in chunk)
+            else:
+                body = json.dumps(chunk)[1:-1]
+                yield body if count == 0 else ',' + body
+            count += len(chunk)
+    except Exception as e:
+        # Headers are already sent, so end the response with the rows written so far
+        logger.error(f"Error reading results: {e}")
+    if not ndjson:
+        yield ']'
+    logger.info(f"Returned {count} results")
+
+def range_record_chunks(store, start_us, end_us, offset: int, limit):
+    """Read a time range, page it and convert it to records a chunk at a time"""
+    # The sparse index bounds the read to the range; paging skips and stops chunk by chunk
+    remaining = limit
+    for columns in store.iter_range(start_us, end_us, RECORD_CHUNK_ROWS):
+        if remaining == 0:
+            return
+        size = len(columns['timestamp'])
+        if offset >= size:
+            offset -= size
+            continue
+        stop = size if remaining is None else min(size, offset + remaining)
+        yield columns_to_records({name: values[offset:stop] for name, values in columns.items()})
+        if remaining is not None:
+            remaining -= stop - offset
+        offset = 0
 
 # API endpoints
 @app.route('/start', methods=['POST'])
 @limiter.limit("5 per minute")
 def start_simulation():
-    """Start the PV simulation"""
-    if simulation_manager.is_running:
+    """Start the PV simulation, optionally for a fleet of sites"""
+    if coordinator.status()['running']:
         return jsonify({'status': 'already running', 'running': True}), 200
     
+    params = request.get_json(silent=True) or {}
+    try:
+        fleet_size = int(params.get('fleet_size', request.args.get('fleet_size', config.FLEET_SIZE)))
+        consumers = int(params.get('consumers', request.args.get('consumers', config.PV_CONSUMERS)))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'fleet_size and consumers must be integers', 'running': False}), 400
+    if not 1 <= fleet_size <= config.MAX_FLEET_SIZE or consumers < 1:
+        return jsonify({
+            'status': 'error',
+            'message': f'fleet_size must be between 1 and {config.MAX_FLEET_SIZE} and consumers at least 1',
+            'running': False
+        }), 400
+    
     try:
-        success = simulation_manager.start()
-        if success:
-            return jsonify({'status': 'started', 'running': True}), 200
+        result = coordinator.start(fleet_size=fleet_size, consumers=consumers)
+        if result == 'started':
+            return jsonify({'status': 'started', 'running': True, 'fleet_size': fleet_size}), 200
+        elif result == 'already running':
+            # Another worker process won the race to start the simulation
+            return jsonify({'status': 'already running', 'running': True}), 200
+        elif result == 'busy':
+            return jsonify({'status': 'error', 'message': 'A backfill is writing the results store', 'running': False}), 409
         else:
             return jsonify({'status': 'failed to start', 'running': False}), 500
     except Exception as e:
@@ -75,149 +208,374 @@ def start_simulation():
 def stop_simulation():
     """Stop the PV simulation"""
     try:
-        success = simulation_manager.stop()
+        if not coordinator.stop():
+            return jsonify({'status': 'error', 'message': 'Simulation did not stop in time', 'running': True}), 500
         return jsonify({'status': 'stopped', 'running': False}), 200
     except Exception as e:
         logger.error(f"Error stopping simulation: {e}")
-        return jsonify({'status': 'error', 'message': str(e), 'running': simulation_manager.is_running}), 500
+        return jsonify({'status': 'error', 'message': str(e), 'running': coordinator.status()['running']}), 500
 
 @app.route('/status', methods=['GET'])
 def get_status():
-    """Get current simulation status"""
+    """Get current simulation status (the same in every worker process)"""
+    status = coordinator.status()
     return jsonify({
-        'running': simulation_manager.is_running,
+        'running': status['running'],
+        'fleet_size': status['fleet_size'],
+        'leader_pid': status['leader_pid'],
         'uptime': int(time.time() - start_time)
     })
 
 @app.route('/results', methods=['GET'])
 @limiter.limit("30 per minute")
 def get_results():
-    """Get all simulation results"""
-    if not os.path.exists(config.RESULTS_FILE):
-        return jsonify([])
+    """
+    Get all simulation results, optionally limited to a time range (?from=&to=)
     
+    The response is streamed as a JSON array, or as NDJSON with
+    ?format=ndjson or Accept: application/x-ndjson. ?offset= and ?limit=
+    page through the matching rows.
+    """
     try:
-        with open(config.RESULTS_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            results = list(reader)
-            
-        # Convert string values to float for frontend
-        for result in results:
-            try:
-                result['meter'] = float(result['meter'])
-                result['pv'] = float(result['pv'])
-                # Map 'sum' column to 'net' for frontend compatibility
-                if 'sum' in result:
-                    result['net'] = float(result['sum'])
-                elif 'net' in result:
-                    result['net'] = float(result['net'])
-                else:
-                    result['net'] = 0.0  # Fallback value
-            except (ValueError, KeyError) as e:
-                logger.warning(f"Error converting result data: {e}")
-                continue
-            
-        logger.info(f"Returned {len(results)} results")
-        return jsonify(results)
+        start_us = parse_time_arg('from')
+        end_us = parse_time_arg('to')
+        offset = parse_count_arg('offset') or 0
+        limit = parse_count_arg('limit')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    ndjson = wants_ndjson()
+    store = get_results_store()
+    if not store.exists():
+        return Response('', mimetype=NDJSON_MIMETYPE) if ndjson else jsonify([])
+    
+    try:
+        # Served from the ring buffer when it holds every row in the range
+        results = recent_results.read_range(store, start_us, end_us)
     except Exception as e:
         logger.error(f"Error reading results: {e}")
-        return jsonify([])
+        results = None
+    if results is not None:
+        stop = None if limit is None else offset + limit
+        chunks = [results[offset:stop]]
+    elif start_us is None and end_us is None:
+        chunks = store.iter_records(offset, limit)
+    else:
+        chunks = range_record_chunks(store, start_us, end_us, offset, limit)
+    
+    return Response(serialize_records(chunks, ndjson), mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
 
 @app.route('/results/latest', methods=['GET'])
 @limiter.limit("60 per minute")
 def get_latest_results():
-    """Get the latest results for real-time chart updates"""
-    if not os.path.exists(config.RESULTS_FILE):
-        return jsonify([])
+    """
+    Get the latest results for real-time chart updates
+    
+    With ?since=<cursor> only rows written after the cursor are returned,
+    together with the cursor for the next request. Responses carry an ETag
+    derived from the store's size and mtime, so polls with a matching
+    If-None-Match are answered with 304 after a single stat call.
+    """
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'since must be an integer cursor'}), 400
+    
+    store = get_results_store()
+    etag = store.etag()
+    if etag is None:
+        return jsonify([] if since is None else {'results': [], 'cursor': 0})
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
     
     try:
-        with open(config.RESULTS_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            results = list(reader)
-            
-        # Get latest entries based on config
-        latest_results = results[-config.MAX_RESULTS_RETURNED:] if len(results) > config.MAX_RESULTS_RETURNED else results
+        if since is None:
+            # Read only the latest entries, from memory if possible
+            latest_results = recent_results.latest(store, config.MAX_RESULTS_RETURNED)
+            if latest_results is None:
+                latest_results = store.tail(config.MAX_RESULTS_RETURNED)
+            # Same shape whether the ring buffer or the store answered
+            body = convert_results(latest_results)
+        else:
+            latest_results, cursor = store.read_since(since, config.MAX_RESULTS_RETURNED)
+            body = {'results': convert_results(latest_results), 'cursor': cursor}
         
-        # Convert string values to float for frontend
-        for result in latest_results:
-            try:
-                result['meter'] = float(result['meter'])
-                result['pv'] = float(result['pv'])
-                # Map 'sum' column to 'net' for frontend compatibility
-                if 'sum' in result:
-                    result['net'] = float(result['sum'])
-                elif 'net' in result:
-                    result['net'] = float(result['net'])
-                else:
-                    result['net'] = 0.0  # Fallback value
-            except (ValueError, KeyError) as e:
-                logger.warning(f"Error converting result data: {e}")
-                continue
-            
-        return jsonify(latest_results)
+        response = jsonify(body)
+        response.set_etag(etag)
+        # Cached copies must be revalidated, which costs the server a stat call
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.error(f"Error reading latest results: {e}")
+        # Keep the response shape of the mode, so a polling client keeps its cursor
+        return jsonify([] if since is None else {'results': [], 'cursor': since})
+
+@app.route('/results/stream', methods=['GET'])
+@limiter.limit("30 per minute")
+def stream_results():
+    """Server-Sent Events stream of new results as they are written"""
+    store_follower.ensure_started()
+    subscription = broadcaster.subscribe()
+    if subscription is None:
+        return jsonify({'status': 'error', 'message': 'Too many stream clients'}), 503
+    
+    def events():
+        # Ask EventSource to reconnect after 3 seconds if the connection drops
+        yield 'retry: 3000\n\n'
+        while True:
+            records = subscription.get(timeout=config.STREAM_HEARTBEAT)
+            if records:
+                yield f"data: {json.dumps(records)}\n\n"
+            else:
+                # Comment line keeps idle connections open through proxies
+                yield ': keep-alive\n\n'
+    
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(subscription.close)
+    return response
+
+@app.route('/results/export', methods=['GET'])
+@limiter.limit("10 per minute")
+def export_results():
+    """
+    Bulk download of results as CSV, Arrow IPC stream or Parquet
+    
+    ?format=csv|arrow|parquet selects the format (CSV by default) and
+    ?from=&to= limit the time range. The file is encoded and sent one row
+    group at a time, so exports of any size use bounded memory.
+    """
+    export_format = request.args.get('format', 'csv')
+    try:
+        start_us = parse_time_arg('from')
+        end_us = parse_time_arg('to')
+        blocks = iter_export(get_results_store(), export_format, start_us, end_us)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 501
+    
+    response = Response(blocks, mimetype=EXPORT_FORMATS[export_format].mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=results.{EXPORT_FORMATS[export_format].extension}'
+    return response
+
+@app.route('/results/aggregate', methods=['GET'])
+@limiter.limit("30 per minute")
+def get_aggregated_results():
+    """Downsampled results for a time range: per-bucket min/mean/max or LTTB points"""
+    try:
+        start_us = parse_time_arg('from')
+        end_us = parse_time_arg('to')
+        method = request.args.get('method', 'bucket')
+        if method == 'bucket':
+            bucket = request.args.get('bucket', '1m')
+            bucket_us = parse_bucket(bucket)
+        elif method == 'lttb':
+            points = int(request.args.get('points', 500))
+            series = request.args.get('series', 'net')
+            if not 3 <= points <= MAX_LTTB_POINTS or series not in SERIES:
+                raise ValueError(f"points must be between 3 and {MAX_LTTB_POINTS} and series one of {', '.join(SERIES)}")
+        else:
+            raise ValueError("method must be 'bucket' or 'lttb'")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    store = get_results_store()
+    if not store.exists():
+        return jsonify([])
+    
+    try:
+        # Both read the range a chunk at a time, however long it is
+        if method == 'bucket':
+            return jsonify(aggregate_chunks(store.iter_range(start_us, end_us), bucket_us))
+        
+        return jsonify(columns_to_records(lttb_chunks(lambda: store.iter_range(start_us, end_us), series, points)))
+    except Exception as e:
+        logger.error(f"Error aggregating results: {e}")
         return jsonify([])
 
+@app.route('/backfill', methods=['POST'])
+@limiter.limit("5 per minute")
+def start_backfill():
+    """Generate synthetic results for a time range without RabbitMQ"""
+    global backfill_job
+    if backfill_job is not None and backfill_job.is_running:
+        return jsonify({'status': 'already running', 'backfill': backfill_job.as_dict()}), 409
+    if coordinator.status()['running']:
+        return jsonify({'status': 'error', 'message': 'Stop the simulation before backfilling'}), 409
+    
+    params = request.get_json(silent=True) or {}
+    try:
+        job = BackfillJob(
+            start=datetime.fromisoformat(params['start']),
+            end=datetime.fromisoformat(params['end']),
+            step=float(params.get('step', config.METER_INTERVAL)),
+            seed=int(params.get('seed', 0))
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f'Invalid backfill parameters: {e}'}), 400
+    try:
+        total = backfill_rows(job.start, job.end, job.step)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'end must be after start and step must be positive'}), 400
+    if total > config.BACKFILL_MAX_ROWS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Backfill of {total} rows exceeds the limit of {config.BACKFILL_MAX_ROWS}'
+        }), 400
+    
+    try:
+        job.run_async()
+    except (BackfillBusy, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    backfill_job = job
+    return jsonify({'status': 'started', 'backfill': job.as_dict()}), 202
+
+@app.route('/backfill', methods=['GET'])
+def get_backfill():
+    """Get progress of the current or last backfill"""
+    if backfill_job is None:
+        return jsonify({'status': 'idle', 'backfill': None})
+    return jsonify({'status': backfill_job.state, 'backfill': backfill_job.as_dict()})
+
 # Health check and monitoring endpoints
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for container orchestration"""
-    try:
-        # Check RabbitMQ connection
-        connection = get_rabbitmq_connection()
-        connection.close()
-        rabbitmq_status = "healthy"
-    except Exception as e:
-        logger.warning(f"RabbitMQ health check failed: {e}")
-        rabbitmq_status = "unhealthy"
+    if config.TRANSPORT == 'inprocess':
+        # Messages never leave the process, so there is no broker to check
+        rabbitmq_status = "not used"
+    else:
+        try:
+            # Check RabbitMQ connection
+            connection = get_rabbitmq_connection()
+            connection.close()
+            rabbitmq_status = "healthy"
+        except Exception as e:
+            logger.warning(f"RabbitMQ health check failed: {e}")
+            rabbitmq_status = "unhealthy"
     
     # Check file system
     file_status = "healthy" if os.access(config.DATA_DIR, os.W_OK) else "unhealthy"
     
     status = {
-        "status": "healthy" if all([rabbitmq_status == "healthy", file_status == "healthy"]) else "unhealthy",
+        "status": "healthy" if all([rabbitmq_status != "unhealthy", file_status == "healthy"]) else "unhealthy",
         "timestamp": datetime.now().isoformat(),
         "services": {
             "rabbitmq": rabbitmq_status,
+            "transport": config.TRANSPORT,
             "filesystem": file_status,
-            "simulation": "running" if simulation_manager.is_running else "stopped"
+            "simulation": "running" if coordinator.status()['running'] else "stopped"
         }
     }
     
     return jsonify(status), 200 if status["status"] == "healthy" else 503
 
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Accept values that select the text format (Prometheus asks for the versioned one)
+PROMETHEUS_ACCEPT = ['text/plain', 'text/plain; version=0.0.4']
+
+def wants_prometheus() -> bool:
+    """Whether the client asked for the Prometheus text format (?format=prometheus or Accept)"""
+    if request.args.get('format') == 'prometheus':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', *PROMETHEUS_ACCEPT]) in PROMETHEUS_ACCEPT
+
+def prometheus_families(body: dict, histograms: np.ndarray) -> list:
+    """Prometheus metric families for the body of a /metrics response and the latency histograms"""
+    counters = body['counters']
+    families = [
+        (f"pvsim_{name}_total", 'counter', help_text, [({}, counters[name])])
+        for name, help_text in COUNTER_HELP.items()
+    ]
+    families.extend([
+        ('pvsim_last_write_timestamp_seconds', 'gauge', 'Time of the last write to the results store',
+         [({}, counters['last_write'])]),
+        ('pvsim_results_rows', 'gauge', 'Rows in the results store', [({}, body['data_points'])]),
+        ('pvsim_results_bytes', 'gauge', 'Size of the results store in bytes', [({}, body['file_size_bytes'])]),
+        ('pvsim_simulation_running', 'gauge', 'Whether a simulation is running',
+         [({}, int(body['simulation_running']))]),
+        ('pvsim_fleet_size', 'gauge', 'Simulated sites', [({}, body['fleet_size'])]),
+        ('pvsim_stream_clients', 'gauge', 'Clients connected to /results/stream', [({}, body['stream_clients'])]),
+        ('pvsim_uptime_seconds', 'gauge', 'Seconds since this server process started',
+         [({}, body['uptime_seconds'])]),
+        ('pvsim_consumer_messages_total', 'counter', 'Messages processed by each PV consumer of this process',
+         [({'consumer': str(stats['consumer']), 'queue': stats['queue']}, stats['messages'])
+          for stats in body['throughput']]),
+        ('pvsim_stage_latency_seconds', 'histogram', 'Time spent in each pipeline stage',
+         prometheus_samples(histograms)),
+    ])
+    return families
+
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    """Basic metrics endpoint"""
+    """
+    Metrics endpoint, as JSON or in the Prometheus text format
+    
+    The pipeline counters and the per-stage latency histograms are
+    maintained in the write path (see counters.py and latency.py), so a
+    scrape reads a few memory-mapped values and stats the results store
+    without reading it.
+    """
     try:
-        file_size = os.path.getsize(config.RESULTS_FILE) if os.path.exists(config.RESULTS_FILE) else 0
-        if os.path.exists(config.RESULTS_FILE):
-            with open(config.RESULTS_FILE, 'r') as f:
-                line_count = sum(1 for _ in f) - 1  # Exclude header
-        else:
-            line_count = 0
+        store = get_results_store()
+        file_size = store.size_bytes()
+        line_count = recent_results.total_rows(store)
+        if line_count is None:
+            line_count = store.count()
     except Exception as e:
         logger.warning(f"Error getting metrics: {e}")
         file_size = 0
         line_count = 0
+    try:
+        counters = pipeline_counters.snapshot()
+    except OSError as e:
+        logger.warning(f"Error reading pipeline counters: {e}")
+        counters = dict.fromkeys(COUNTER_HELP, 0)
+        counters['last_write'] = 0.0
+    try:
+        histograms = latency_histograms.snapshot()
+    except OSError as e:
+        logger.warning(f"Error reading latency histograms: {e}")
+        histograms = np.zeros((len(STAGES), SLOTS), dtype=np.int64)
     
-    return jsonify({
-        "simulation_running": simulation_manager.is_running,
+    status = coordinator.status()
+    body = {
+        "simulation_running": status['running'],
+        "fleet_size": status['fleet_size'],
+        "leader_pid": status['leader_pid'],
+        "throughput": simulation_manager.throughput(),
+        "stream_clients": broadcaster.client_count,
         "data_points": line_count,
         "file_size_bytes": file_size,
+        "counters": counters,
+        "latency": summarize(histograms),
         "uptime_seconds": int(time.time() - start_time),
         "config": {
             "meter_interval": config.METER_INTERVAL,
-            "max_results_returned": config.MAX_RESULTS_RETURNED
+            "max_results_returned": config.MAX_RESULTS_RETURNED,
+            "pv_consumers": config.PV_CONSUMERS,
+            "batch_mode": config.BATCH_MODE,
+            "transport": config.TRANSPORT,
+            "engine": config.ENGINE,
+            "results_backend": config.RESULTS_BACKEND,
+            "latency_histograms": config.LATENCY_HISTOGRAMS
         }
-    })
+    }
+    if wants_prometheus():
+        return Response(prometheus_text(prometheus_families(body, histograms)), mimetype=PROMETHEUS_MIMETYPE)
+    return jsonify(body)
 
 if __name__ == '__main__':
     logger.info(f"Starting PV Simulator on {config.FLASK_HOST}:{config.FLASK_PORT}")
     logger.info(f"Debug mode: {config.FLASK_DEBUG}")
     logger.info(f"RabbitMQ: {config.RABBITMQ_HOST}:{config.RABBITMQ_PORT}")
-    logger.info(f"Results file: {config.RESULTS_FILE}")
+    logger.info(f"Results file: {get_results_store().path} ({config.RESULTS_BACKEND})")
     
     try:
         app.run(
@@ -0,0 +1,210 @@
+"""
+Asyncio execution engine for PV Simulator
+
+Runs the simulation as coroutines on a single event loop instead of one
+blocking thread per meter connection and PV consumer. Every site is a meter
+coroutine, so thousands of meters cost a few hundred bytes each rather than
+a thread, and stop() cancels everything at once instead of waiting for
+sleeps and broker polls to time out.
+"""
+import asyncio
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from config import config
+from simulation import ConsumerStats, MeterSample, compute_result_rows
+from fleet import build_fleet, shard_queue, sites_by_queue, Site
+from storage import get_results_store, ResultsStore
+from ring_buffer import recent_results
+from broadcast import broadcaster
+from counters import pipeline_counters
+from latency import latency_histograms
+from utils import current_profile_table
+
+logger = logging.getLogger(__name__)
+
+# Same consumption range as the threaded meter worker, inside models.METER_BOUNDS
+METER_RANGE = (0.5, 10.0)
+
+
+class AsyncSimulationEngine:
+    """
+    Drop-in alternative to SimulationManager that runs on one asyncio loop
+
+    Meter coroutines put decoded readings on bounded asyncio queues, one per
+    PV consumer shard, so a slow consumer applies backpressure to its meters.
+    Consumer coroutines drain their queue in batches of up to BATCH_SIZE and
+    hand the rows to a single writer thread, keeping fsync off the loop.
+    Readings never leave the process, so no message transport is used.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._main_task: Optional[asyncio.Task] = None
+        self._started = threading.Event()
+        self._sites: List[Site] = []
+        self._consumer_stats: List[ConsumerStats] = []
+
+    def start(self, fleet_size: Optional[int] = None, consumers: Optional[int] = None) -> bool:
+        """
+        Start the event loop thread with one coroutine per meter and PV consumer
+
+        Args:
+            fleet_size: Number of simulated sites (defaults to config.FLEET_SIZE)
+            consumers: Number of PV consumer coroutines (defaults to
+                config.PV_CONSUMERS, capped at the fleet size)
+
+        Returns:
+            True if the simulation started, False if it was already running
+        """
+        with self._lock:
+            if self.is_running:
+                return False
+
+            current_profile_table()
+            fleet_size = fleet_size or config.FLEET_SIZE
+            consumers = min(consumers or config.PV_CONSUMERS, fleet_size)
+            self._sites = build_fleet(fleet_size, consumers, config.FLEET_SEED)
+            groups = sites_by_queue(self._sites)
+            queues = [shard_queue(index, consumers) for index in range(consumers)]
+            self._consumer_stats = [
+                ConsumerStats(index, queue, len(groups.get(queue, [])))
+                for index, queue in enumerate(queues)
+            ]
+
+            self._started.clear()
+            self._thread = threading.Thread(target=self._thread_main, daemon=False)
+            self._thread.start()
+            self._started.wait(timeout=10)
+
+            logger.info(f"Async simulation started ({fleet_size} sites, {consumers} consumers)")
+            return True
+
+    def stop(self) -> bool:
+        """
+        Cancel all meter and consumer coroutines and wait for the loop to exit
+
+        Readings already queued, and batches already handed to the writer,
+        are still written before the loop exits.
+
+        Returns:
+            True if the simulation was stopped, False if it was not running
+        """
+        with self._lock:
+            if not self.is_running:
+                return False
+            self._loop.call_soon_threadsafe(self._main_task.cancel)
+            self._thread.join(timeout=10)
+            self._thread = None
+            logger.info("Async simulation stopped")
+            return True
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def fleet_size(self) -> int:
+        return len(self._sites)
+
+    def throughput(self) -> List[dict]:
+        """Messages processed and messages/s for each PV consumer"""
+        return [stats.as_dict() for stats in self._consumer_stats]
+
+    def _thread_main(self) -> None:
+        try:
+            asyncio.run(self._run())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Async simulation error: {e}")
+        finally:
+            # Unblock start() if the loop failed before it was ready
+            self._started.set()
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        store = get_results_store()
+        store.initialize()
+        pipeline_counters.open()
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pv-writer')
+
+        queues = {stats.queue: asyncio.Queue(maxsize=config.PREFETCH_COUNT) for stats in self._consumer_stats}
+        tasks = [
+            asyncio.create_task(self._pv_consumer(stats, queues[stats.queue], store, writer))
+            for stats in self._consumer_stats
+        ]
+        # Spread the meters over the interval so readings arrive evenly
+        interval = config.METER_INTERVAL
+        for position, site in enumerate(self._sites):
+            phase = interval * position / len(self._sites)
+            tasks.append(asyncio.create_task(self._meter(site, queues[site.routing_key], phase)))
+        self._started.set()
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Write whatever the cancelled consumers had not picked up yet,
+            # after the batches they had already submitted
+            for stats in self._consumer_stats:
+                queue = queues[stats.queue]
+                readings = [queue.get_nowait() for _ in range(queue.qsize())]
+                if readings:
+                    writer.submit(self._write, store, stats, readings)
+            writer.shutdown(wait=True)
+            latency_histograms.flush()
+
+    async def _meter(self, site: Site, queue: asyncio.Queue, phase: float) -> None:
+        """Meter coroutine: one random reading per interval for a single site"""
+        loop = asyncio.get_running_loop()
+        next_reading = loop.time() + phase
+        while True:
+            await asyncio.sleep(max(0.0, next_reading - loop.time()))
+            value = round(random.uniform(*METER_RANGE), 2)
+            await queue.put((datetime.now().isoformat(), value, site.capacity_kw))
+            next_reading += config.METER_INTERVAL
+
+    async def _pv_consumer(self, stats: ConsumerStats, queue: asyncio.Queue,
+                           store: ResultsStore, writer: ThreadPoolExecutor) -> None:
+        """PV consumer coroutine: drains its queue in batches and writes the results"""
+        loop = asyncio.get_running_loop()
+        while True:
+            readings = [await queue.get()]
+            while len(readings) < config.BATCH_SIZE and not queue.empty():
+                readings.append(queue.get_nowait())
+            # Shielded: cancelling the consumer must not cancel a batch still
+            # waiting for the writer, as its readings have left the queue
+            await asyncio.shield(loop.run_in_executor(writer, self._write, store, stats, readings))
+
+    @staticmethod
+    def _write(store: ResultsStore, stats: ConsumerStats, readings: List[MeterSample]) -> None:
+        """Compute, validate and store a batch of readings (runs on the writer thread)"""
+        if latency_histograms.enabled:
+            # Readings are queued rather than brokered, so this is their time in the queue
+            for reading in readings:
+                latency_histograms.record_age('dwell', reading[0])
+        rows = [row for row in compute_result_rows(readings) if row is not None]
+        stats.messages += len(readings)
+        # Readings never pass through a broker here, so nothing is acked or nacked
+        pipeline_counters.add(messages_consumed=len(readings), validation_failures=len(readings) - len(rows))
+        if not rows:
+            return
+        timer = latency_histograms.start()
+        try:
+            written = recent_results.write(store, rows, sync=True)
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(rows)} rows: {e}")
+            return
+        latency_histograms.lap('write', timer)
+        pipeline_counters.record_write(len(rows), written)
+        broadcaster.publish(rows)
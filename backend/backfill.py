@@ -0,0 +1,242 @@
+"""
+Offline backfill / historical replay for PV Simulator
+
+Generates synthetic results for a time range directly into the results
+store, bypassing RabbitMQ. Meter values come from a seeded NumPy RNG and PV
+output is computed with array operations, one bounded chunk at a time.
+
+The stores are read with binary searches over time, so a backfill must
+start after the last stored reading. While it runs it holds the lock of
+the simulation leader (see coordination.py), so neither the simulation nor
+another backfill, in any process, writes to the store at the same time.
+"""
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+from config import config
+from coordination import LeaderLock, LOCK_FILE, BACKFILL_LOCK_FILE
+from storage import get_results_store, ResultsStore, Columns, CHUNK_ROWS
+from counters import pipeline_counters
+from utils import fractional_hours, pv_output
+
+logger = logging.getLogger(__name__)
+
+# Same consumption range as the live meter worker
+METER_RANGE = (0.5, 10.0)
+
+
+class BackfillBusy(Exception):
+    """The simulation or another backfill is writing the results store"""
+
+
+def to_micros(value: datetime) -> int:
+    """Convert a naive datetime to epoch microseconds"""
+    return int(np.datetime64(value, 'us').astype(np.int64))
+
+
+def backfill_rows(start: datetime, end: datetime, step: float) -> int:
+    """
+    Number of rows a backfill of [start, end) every step seconds writes
+
+    Raises:
+        ValueError: If the step is not positive or end is not after start
+    """
+    step_us = int(round(step * 1_000_000))
+    if step_us <= 0:
+        raise ValueError("Backfill step must be positive")
+    start_us, end_us = to_micros(start), to_micros(end)
+    if end_us <= start_us:
+        raise ValueError("Backfill end must be after start")
+    return -(-(end_us - start_us) // step_us)
+
+
+def check_backfill_start(store: ResultsStore, start: datetime) -> None:
+    """
+    Check a backfill would keep the store in time order
+
+    Raises:
+        ValueError: If start is not after the last stored reading
+    """
+    if not store.exists():
+        return
+    last = store.tail(1)
+    if last and to_micros(start) <= int(np.datetime64(str(last[0]['timestamp']), 'us').astype(np.int64)):
+        raise ValueError(f"Backfill must start after the last stored reading ({last[0]['timestamp']})")
+
+
+class BackfillLock:
+    """
+    Locks held for the duration of a backfill
+
+    The backfill lock tells the servers a backfill is running; the simulation
+    leader lock keeps the simulation from starting meanwhile.
+    """
+
+    def __init__(self, data_dir: Optional[str] = None):
+        data_dir = data_dir or config.DATA_DIR
+        os.makedirs(data_dir, exist_ok=True)
+        self._backfill = LeaderLock(os.path.join(data_dir, BACKFILL_LOCK_FILE))
+        self._leader = LeaderLock(os.path.join(data_dir, LOCK_FILE))
+
+    def acquire(self) -> None:
+        """
+        Raises:
+            BackfillBusy: If another backfill or the simulation is writing the store
+        """
+        if not self._backfill.acquire():
+            raise BackfillBusy("Another backfill is writing the results store")
+        if not self._leader.acquire():
+            self._backfill.release()
+            raise BackfillBusy("The simulation is writing the results store")
+
+    def release(self) -> None:
+        self._leader.release()
+        self._backfill.release()
+
+
+def generate_chunk(rng: np.random.Generator, timestamps: np.ndarray,
+                   capacity: Optional[float] = None) -> Columns:
+    """
+    Generate result columns for a chunk of timestamps
+
+    Args:
+        rng: Seeded random generator for meter values
+        timestamps: int64 epoch microseconds
+        capacity: PV capacity in kW (defaults to the reference household)
+
+    Returns:
+        timestamp/meter/pv/net column arrays
+    """
+    meter = np.round(rng.uniform(*METER_RANGE, size=len(timestamps)), 2)
+    pv = np.round(pv_output(fractional_hours(timestamps), capacity or config.PV_CAPACITY), 2)
+    net = np.round(pv - meter, 2)
+    return {'timestamp': timestamps, 'meter': meter, 'pv': pv, 'net': net}
+
+
+def run_backfill(start: datetime, end: datetime, step: float, seed: int = 0,
+                 store: Optional[ResultsStore] = None, chunk_rows: int = CHUNK_ROWS,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 cancel: Optional[threading.Event] = None) -> int:
+    """
+    Generate synthetic results for [start, end) every step seconds
+
+    Args:
+        start: First timestamp (inclusive)
+        end: Last timestamp (exclusive)
+        step: Seconds between readings
+        seed: Seed for the meter value RNG
+        store: Target store (defaults to the configured results store)
+        chunk_rows: Rows generated and written per chunk, bounding memory use
+        progress: Called with (rows written, total rows) after every chunk
+        cancel: Event that stops the backfill after the current chunk
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        ValueError: If the range is empty or does not start after the last stored reading
+    """
+    total = backfill_rows(start, end, step)
+    step_us = int(round(step * 1_000_000))
+    start_us = to_micros(start)
+
+    store = store or get_results_store()
+    check_backfill_start(store, start)
+    store.initialize()
+    pipeline_counters.open()
+    rng = np.random.default_rng(seed)
+    written = 0
+
+    logger.info(f"Backfilling {total} rows from {start} to {end} every {step}s into {store.path}")
+    while written < total:
+        if cancel is not None and cancel.is_set():
+            logger.info(f"Backfill cancelled after {written} rows")
+            break
+        count = min(chunk_rows, total - written)
+        timestamps = start_us + step_us * np.arange(written, written + count, dtype=np.int64)
+        nbytes = store.append_columns(generate_chunk(rng, timestamps))
+        pipeline_counters.record_write(count, nbytes)
+        written += count
+        if progress is not None:
+            progress(written, total)
+
+    logger.info(f"Backfill wrote {written} rows")
+    return written
+
+
+class BackfillJob:
+    """Runs a backfill in a background thread and tracks its progress"""
+
+    def __init__(self, start: datetime, end: datetime, step: float, seed: int = 0):
+        self.start = start
+        self.end = end
+        self.step = step
+        self.seed = seed
+        self.state = 'pending'
+        self.rows_written = 0
+        self.total_rows = 0
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._lock = BackfillLock()
+
+    def run_async(self) -> None:
+        """
+        Take the store for this backfill and start the backfill thread
+
+        Raises:
+            BackfillBusy: If the simulation or another backfill is writing the store
+            ValueError: If the backfill does not start after the last stored reading
+        """
+        self._lock.acquire()
+        try:
+            check_backfill_start(get_results_store(), self.start)
+        except ValueError:
+            self._lock.release()
+            raise
+        self.state = 'running'
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Ask the backfill to stop after the current chunk"""
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    @property
+    def is_running(self) -> bool:
+        return self.state == 'running'
+
+    def _progress(self, written: int, total: int) -> None:
+        self.rows_written = written
+        self.total_rows = total
+
+    def _run(self) -> None:
+        try:
+            run_backfill(self.start, self.end, self.step, self.seed,
+                         progress=self._progress, cancel=self._cancel)
+            self.state = 'cancelled' if self._cancel.is_set() else 'completed'
+        except Exception as e:
+            logger.error(f"Backfill failed: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self._lock.release()
+
+    def as_dict(self) -> dict:
+        return {
+            'state': self.state,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'step': self.step,
+            'seed': self.seed,
+            'rows_written': self.rows_written,
+            'total_rows': self.total_rows,
+            'error': self.error,
+        }
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for PV Simulator
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_tail``.
+"""
@@ -0,0 +1,82 @@
+"""
+Benchmark: /results and /results/latest latency against synthetic results files
+
+Serves requests through the Flask test client (no network, rate limits
+and request logging off) from a CSV results file of each size.
+/results/latest is timed cold (first request after the file changed, which
+warms the ring buffer), warm, and as a conditional poll answered with 304.
+/results is timed as a first page, a one-hour range and, up to
+--full-limit rows, the whole file.
+
+Usage:
+    python -m benchmarks.bench_api --rows 10000 100000 1000000 10000000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from benchmarks.common import time_call, write_synthetic_results, SYNTHETIC_START, SYNTHETIC_STEP_US
+from config import config
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+FULL_RESULTS_LIMIT = 1_000_000  # Larger files are not served whole by default
+
+
+def get(client, url: str, **kwargs) -> int:
+    """Request a URL and read the whole (possibly streamed) body, returning its size"""
+    response = client.get(url, **kwargs)
+    if response.status_code not in (200, 304):
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return len(response.get_data())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--full-limit', type=int, default=FULL_RESULTS_LIMIT,
+                        help='Largest file served whole by /results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(config, 'DATA_DIR', tmp), \
+            patch.object(config, 'RESULTS_BACKEND', 'csv'):
+        import app as server
+        server.limiter.enabled = False
+        # The server logs to stdout, which is where the results go
+        logging.disable(logging.INFO)
+        client = server.app.test_client()
+        for rows in args.rows:
+            path = os.path.join(tmp, f'results_{rows}.csv')
+            write_synthetic_results(path, rows)
+            last_hour = SYNTHETIC_START + (rows * SYNTHETIC_STEP_US - 3600 * 1_000_000)
+            hour_url = f'/results?from={last_hour}&to={last_hour + 3600 * 1_000_000}'
+            with patch.object(config, 'RESULTS_FILE', path):
+                start = time.perf_counter()
+                get(client, '/results/latest')
+                latest_cold_ms = (time.perf_counter() - start) * 1000
+                etag = client.get('/results/latest').headers['ETag']
+                result = {
+                    'rows': rows,
+                    'file_size_bytes': os.path.getsize(path),
+                    'latest_cold_ms': round(latest_cold_ms, 3),
+                    'latest_ms': round(time_call(lambda: get(client, '/results/latest'), args.repeat), 3),
+                    'latest_not_modified_ms': round(time_call(
+                        lambda: get(client, '/results/latest', headers={'If-None-Match': etag}), args.repeat
+                    ), 3),
+                    'results_page_ms': round(time_call(lambda: get(client, '/results?limit=1000'), args.repeat), 3),
+                    'results_hour_ms': round(time_call(lambda: get(client, hour_url), args.repeat), 3),
+                    'results_full_ms': None,
+                }
+                if rows <= args.full_limit:
+                    result['results_full_ms'] = round(time_call(lambda: get(client, '/results'), 1), 3)
+            print(json.dumps(result))
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
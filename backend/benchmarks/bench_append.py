@@ -0,0 +1,62 @@
+"""
+Benchmark: append throughput of the results stores
+
+Appends synthetic result rows to a new store of each backend, one append
+call per batch, as the PV workers do with and without batch mode.
+
+Usage:
+    python -m benchmarks.bench_append --rows 100000 --batch-sizes 1 100 10000 --backend csv binary
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.common import SYNTHETIC_START, SYNTHETIC_STEP_US
+from config import config
+from storage import RESULTS_BACKENDS, from_epoch_micros
+
+
+def synthetic_rows(rows: int) -> list:
+    """(timestamp, meter, pv, net) rows 3 seconds apart"""
+    numbers = np.arange(rows)
+    timestamps = from_epoch_micros(int(SYNTHETIC_START.astype(np.int64)) + numbers * SYNTHETIC_STEP_US)
+    pv = (numbers % 800) / 100
+    return list(zip(timestamps.tolist(), [5.5] * rows, pv.tolist(), (pv - 5.5).round(2).tolist()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), nargs='+', default=['csv', 'binary'])
+    parser.add_argument('--sync', action='store_true', help='fsync after every append, as batch mode does')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp, patch.object(config, 'RESULTS_AUTO_COMPACT', False):
+        for backend in args.backend:
+            for batch_size in args.batch_sizes:
+                store = RESULTS_BACKENDS[backend](os.path.join(tmp, f'results_{backend}_{batch_size}'))
+                store.initialize()
+                start = time.perf_counter()
+                for first in range(0, len(rows), batch_size):
+                    store.append(rows[first:first + batch_size], sync=args.sync)
+                seconds = time.perf_counter() - start
+                print(json.dumps({
+                    'backend': backend,
+                    'rows': args.rows,
+                    'batch_size': batch_size,
+                    'sync': args.sync,
+                    'rows_per_second': round(args.rows / seconds),
+                    'us_per_row': round(seconds * 1e6 / args.rows, 3),
+                    'bytes_per_row': round(store.size_bytes() / args.rows, 2),
+                }))
+
+
+if __name__ == '__main__':
+    main()
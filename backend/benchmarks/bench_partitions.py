@@ -0,0 +1,60 @@
+"""
+Benchmark: compaction of day partitions and range queries over them
+
+Backfills several days into a partitioned store, compacts the closed days,
+then times one-hour range queries against a compacted day and the open day,
+and the same queries against a single binary results file.
+
+Usage:
+    python -m benchmarks.bench_partitions --days 7 --step 3
+"""
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from benchmarks.common import time_call
+from backfill import run_backfill, to_micros
+from config import config
+from storage import BinaryResultsStore, PartitionedResultsStore, DAY_MICROS
+
+HOUR_US = 3600 * 1_000_000
+START = datetime(2025, 1, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--step', type=float, default=3.0, help="Seconds between readings")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    end = START + timedelta(days=args.days)
+    with tempfile.TemporaryDirectory() as tmp, patch.object(config, 'RESULTS_AUTO_COMPACT', False):
+        partitioned = PartitionedResultsStore(os.path.join(tmp, 'results'))
+        binary = BinaryResultsStore(os.path.join(tmp, 'results.bin'))
+        rows = run_backfill(START, end, args.step, seed=0, store=partitioned)
+        run_backfill(START, end, args.step, seed=0, store=binary)
+
+        raw_bytes = partitioned.size_bytes()
+        compact_ms = time_call(partitioned.compact, 1)
+        closed_hour = to_micros(START) + DAY_MICROS // 2
+        open_hour = to_micros(end) - HOUR_US
+        for name, store in (('partitioned', partitioned), ('binary', binary)):
+            print(json.dumps({
+                'store': name,
+                'days': args.days,
+                'rows': rows,
+                'bytes_per_row': round(store.size_bytes() / rows, 2),
+                'raw_bytes_per_row': round(raw_bytes / rows, 2) if name == 'partitioned' else None,
+                'compact_ms': round(compact_ms, 3) if name == 'partitioned' else None,
+                'closed_day_hour_ms': round(time_call(lambda: store.read_range(closed_hour, closed_hour + HOUR_US), args.repeat), 3),
+                'open_day_hour_ms': round(time_call(lambda: store.read_range(open_hour, open_hour + HOUR_US), args.repeat), 3),
+                'count_ms': round(time_call(store.count, args.repeat), 3),
+            }))
+
+
+if __name__ == '__main__':
+    main()
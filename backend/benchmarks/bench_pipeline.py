@@ -0,0 +1,91 @@
+"""
+Benchmark: PV consumer and storage throughput on the in-process transport
+
+Prefills the in-process broker with meter readings for a fleet, then runs
+the simulation's PV workers until every reading is stored. No broker is
+involved, so the numbers are the CPU cost of the simulation and storage
+layers alone.
+
+Usage:
+    python -m benchmarks.bench_pipeline --messages 100000 --consumers 1 4 --backend csv binary
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from config import config
+from fleet import build_fleet
+from simulation import SimulationManager, create_meter_messages
+from storage import get_results_store, RESULTS_BACKENDS
+from transport import get_in_process_broker
+from wire import message_properties
+
+FLEET_SIZE = 1000
+
+
+def run(messages: int, consumers: int, backend: str, batch_mode: bool, tmp: str,
+        processes: int = 0) -> dict:
+    """
+    Process messages readings and return throughput figures
+
+    CPU time is that of the server process only; with processes > 0 the
+    decoding and PV work done in the pool processes is not included.
+    """
+    results_file = os.path.join(tmp, f'results_{backend}_{consumers}_{batch_mode}_{processes}')
+    with patch.object(config, 'TRANSPORT', 'inprocess'), \
+            patch.object(config, 'RESULTS_BACKEND', backend), \
+            patch.object(config, 'RESULTS_FILE', results_file + '.csv'), \
+            patch.object(config, 'RESULTS_BINARY_FILE', results_file + '.bin'), \
+            patch.object(config, 'BATCH_MODE', batch_mode), \
+            patch.object(config, 'PV_PROCESSES', processes), \
+            patch.object(config, 'INPROCESS_QUEUE_SIZE', messages + FLEET_SIZE):
+        get_in_process_broker.cache_clear()
+        channel = get_in_process_broker().connect().channel()
+        sites = build_fleet(FLEET_SIZE, consumers, config.FLEET_SEED)
+        for _ in range(messages // FLEET_SIZE):
+            for routing_key, body in create_meter_messages(sites):
+                channel.basic_publish(exchange='', routing_key=routing_key, body=body,
+                                      properties=message_properties(body))
+
+        store = get_results_store()
+        # The meter thread publishes one more round as soon as it starts
+        expected = (messages // FLEET_SIZE + 1) * FLEET_SIZE
+        manager = SimulationManager()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        manager.start(fleet_size=FLEET_SIZE, consumers=consumers)
+        while store.count() < expected:
+            time.sleep(0.01)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        manager.stop()
+        get_in_process_broker.cache_clear()
+
+    return {
+        'messages': expected,
+        'consumers': consumers,
+        'backend': backend,
+        'batch_mode': batch_mode,
+        'processes': processes,
+        'messages_per_second': round(expected / wall),
+        'cpu_us_per_message': round(cpu / expected * 1e6, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--consumers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), nargs='+', default=['csv', 'binary'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backend:
+            for consumers in args.consumers:
+                for batch_mode in (False, True):
+                    print(json.dumps(run(args.messages, consumers, backend, batch_mode, tmp)))
+
+
+if __name__ == '__main__':
+    main()
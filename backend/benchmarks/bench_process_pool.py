@@ -0,0 +1,40 @@
+"""
+Benchmark: PV consumer throughput with batches computed in a process pool
+
+Runs the batch-mode pipeline benchmark on the in-process transport with an
+increasing number of pool processes (0 computes in the PV consumer threads)
+and reports the speedup over the threaded run. Pool start-up is included in
+the wall time, so use enough messages for it to be amortised.
+
+Usage:
+    python -m benchmarks.bench_process_pool --messages 200000 --processes 0 1 2 4 --consumers 2
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from storage import RESULTS_BACKENDS
+from benchmarks.bench_pipeline import run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=200_000)
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=sorted({0, 1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--consumers', type=int, default=2)
+    parser.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), default='binary')
+    args = parser.parse_args()
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for processes in args.processes:
+            result = run(args.messages, args.consumers, args.backend, True, tmp, processes=processes)
+            baseline = baseline or result['messages_per_second']
+            result['speedup'] = round(result['messages_per_second'] / baseline, 2)
+            print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark: scalar pv_profile per reading vs. vectorized pv_profile_batch
+and the precomputed PVProfileTable lookup
+
+Usage:
+    python -m benchmarks.bench_pv_profile --points 1 1000 1000000
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import time_call
+from utils import pv_profile, pv_profile_batch, PVProfileTable
+
+DEFAULT_POINTS = [1, 1_000, 1_000_000]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--points', type=int, nargs='+', default=DEFAULT_POINTS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    table = PVProfileTable()
+    for points in args.points:
+        hours = rng.integers(0, 24, size=points)
+        minutes = rng.integers(0, 60, size=points)
+        fractional = hours + minutes / 60.0
+        pairs = list(zip(hours.tolist(), minutes.tolist()))
+
+        scalar_ms = time_call(lambda: [pv_profile(h, m) for h, m in pairs], args.repeat)
+        batch_ms = time_call(lambda: pv_profile_batch(fractional), args.repeat)
+        table_scalar_ms = time_call(lambda: [table.lookup_scalar(h, m) for h, m in pairs], args.repeat)
+        table_batch_ms = time_call(lambda: table.lookup(fractional), args.repeat)
+        print(json.dumps({
+            'points': points,
+            'scalar_ms': round(scalar_ms, 4),
+            'batch_ms': round(batch_ms, 4),
+            'table_scalar_ms': round(table_scalar_ms, 4),
+            'table_batch_ms': round(table_batch_ms, 4),
+            'scalar_ns_per_point': round(scalar_ms * 1e6 / points, 1),
+            'batch_ns_per_point': round(batch_ms * 1e6 / points, 1),
+            'speedup': round(scalar_ms / batch_ms, 1) if batch_ms else None,
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark: "last hour" range queries through the sparse time index
+
+Usage:
+    python -m benchmarks.bench_range --rows 100000 1000000 10000000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.common import time_call, write_synthetic_results, SYNTHETIC_START, SYNTHETIC_STEP_US
+from storage import CsvResultsStore, SparseTimeIndex
+
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+HOUR_US = 3600 * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f'results_{rows}.csv')
+            write_synthetic_results(path, rows)
+            store = CsvResultsStore(path)
+
+            build_ms = time_call(lambda: SparseTimeIndex(path).sync(), 1)
+            end_us = int(SYNTHETIC_START.astype('int64')) + rows * SYNTHETIC_STEP_US
+            last_hour = lambda: store.read_range(end_us - HOUR_US, end_us)
+            print(json.dumps({
+                'rows': rows,
+                'file_size_bytes': os.path.getsize(path),
+                'index_build_ms': round(build_ms, 3),
+                'last_hour_rows': len(last_hour()['timestamp']),
+                'last_hour_ms': round(time_call(last_hour, args.repeat), 3),
+            }))
+            os.unlink(path)
+            os.unlink(path + '.idx')
+
+
+if __name__ == '__main__':
+    main()
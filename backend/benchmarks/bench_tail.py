@@ -0,0 +1,54 @@
+"""
+Benchmark: tail-seek reader vs. full CSV parse for /results/latest
+
+Usage:
+    python -m benchmarks.bench_tail --rows 10000 1000000 50000000
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+
+from benchmarks.common import time_call, write_synthetic_results
+from storage import tail_csv
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000, 10_000_000]
+# Full parses above this size take minutes, so they are skipped unless --full is given
+FULL_PARSE_LIMIT = 2_000_000
+
+
+def full_parse(path: str, n: int) -> list:
+    """Previous /results/latest implementation: parse everything, keep the last n"""
+    with open(path, 'r') as f:
+        return list(csv.DictReader(f))[-n:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--tail', type=int, default=50, help='Rows requested from the tail')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--full', action='store_true', help='Also time full parses of large files')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f'results_{rows}.csv')
+            write_synthetic_results(path, rows)
+            result = {
+                'rows': rows,
+                'file_size_bytes': os.path.getsize(path),
+                'tail_ms': round(time_call(lambda: tail_csv(path, args.tail), args.repeat), 3),
+                'full_parse_ms': None,
+            }
+            if args.full or rows <= FULL_PARSE_LIMIT:
+                result['full_parse_ms'] = round(
+                    time_call(lambda: full_parse(path, args.tail), 1), 3
+                )
+            print(json.dumps(result))
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark: PVData model per row vs. vectorized validate_batch
+
+Usage:
+    python -m benchmarks.bench_validation --rows 100 10000 100000
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import time_call
+from models import PVData, validate_batch
+
+DEFAULT_ROWS = [100, 10_000, 100_000]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        meter = np.round(rng.uniform(0.5, 10.0, size=rows), 2)
+        pv = np.round(rng.uniform(0.0, 8.0, size=rows), 2)
+        net = np.round(pv - meter, 2)
+        timestamp = '2025-01-01T12:00:00'
+        records = list(zip(meter.tolist(), pv.tolist(), net.tolist()))
+
+        model_ms = time_call(
+            lambda: [PVData(timestamp=timestamp, meter=m, pv=p, net=n) for m, p, n in records], args.repeat
+        )
+        batch_ms = time_call(lambda: validate_batch(pv=pv, net=net), args.repeat)
+        print(json.dumps({
+            'rows': rows,
+            'model_ms': round(model_ms, 4),
+            'batch_ms': round(batch_ms, 4),
+            'model_ns_per_row': round(model_ms * 1e6 / rows, 1),
+            'batch_ns_per_row': round(batch_ms * 1e6 / rows, 1),
+            'speedup': round(model_ms / batch_ms, 1) if batch_ms else None,
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: size and encode/decode cost of the meter message wire formats
+
+Encodes one round of readings for a fleet as JSON and as binary frames of
+several sizes, then decodes every message as a PV consumer would.
+
+Usage:
+    python -m benchmarks.bench_wire --sites 10000 --frame-sizes 1 10 100
+"""
+import argparse
+import json
+
+from benchmarks.common import time_call
+from fleet import build_fleet
+from simulation import create_meter_messages, decode_meter_samples
+from wire import WIRE_FORMATS
+
+
+def measure(sites, wire_format: str, frame_size: int, repeat: int) -> dict:
+    capacities = {site.meter_id: site.capacity_kw for site in sites}
+    content_type = WIRE_FORMATS[wire_format]
+    messages = create_meter_messages(sites, wire_format, frame_size)
+    bodies = [body.encode() if isinstance(body, str) else body for _, body in messages]
+
+    encode_ms = time_call(lambda: create_meter_messages(sites, wire_format, frame_size), repeat)
+    decode_ms = time_call(
+        lambda: [decode_meter_samples(body, content_type, capacities) for body in bodies], repeat
+    )
+    readings = len(sites)
+    total_bytes = sum(len(body) for body in bodies)
+    return {
+        'wire_format': wire_format,
+        'frame_size': frame_size if wire_format == 'binary' else 1,
+        'readings': readings,
+        'messages': len(bodies),
+        'bytes_per_message': round(total_bytes / len(bodies), 1),
+        'bytes_per_reading': round(total_bytes / readings, 1),
+        'encode_us_per_reading': round(encode_ms * 1000 / readings, 3),
+        'decode_us_per_reading': round(decode_ms * 1000 / readings, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=10_000)
+    parser.add_argument('--consumers', type=int, default=4)
+    parser.add_argument('--frame-sizes', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sites = build_fleet(args.sites, args.consumers, seed=42)
+    print(json.dumps(measure(sites, 'json', 1, args.repeat)))
+    for frame_size in args.frame_sizes:
+        print(json.dumps(measure(sites, 'binary', frame_size, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Shared helpers for PV Simulator benchmarks
+"""
+import time
+from typing import Callable
+
+import numpy as np
+
+from storage import from_epoch_micros
+
+SYNTHETIC_START = np.datetime64('2025-01-01T00:00:00', 'us')
+SYNTHETIC_STEP_US = 3_000_000
+SYNTHETIC_BLOCK_ROWS = 100_000
+
+
+def time_call(func: Callable[[], object], repeat: int) -> float:
+    """Return the best wall time of func over repeat calls, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def write_synthetic_results(path: str, rows: int) -> None:
+    """Write a results CSV with the given number of data rows, 3 seconds apart"""
+    start_us = int(SYNTHETIC_START.astype(np.int64))
+    with open(path, 'w', newline='') as f:
+        f.write('timestamp,meter,pv,sum\r\n')
+        for first in range(0, rows, SYNTHETIC_BLOCK_ROWS):
+            count = min(SYNTHETIC_BLOCK_ROWS, rows - first)
+            numbers = np.arange(first, first + count)
+            timestamps = from_epoch_micros(start_us + numbers * SYNTHETIC_STEP_US)
+            pv = (numbers % 800) / 100
+            f.write(''.join(
+                f"{t},5.5,{p:.2f},{p - 5.5:.2f}\r\n" for t, p in zip(timestamps.tolist(), pv.tolist())
+            ))
@@ -0,0 +1,223 @@
+"""
+Benchmark suite: run the benchmarks and collect their results as one JSON document
+
+Every benchmark runs in its own Python process, so the configuration it
+patches and the memory it uses do not leak into the next one. The JSON
+lines a benchmark prints become its results; the document also records
+the commit, Python version and machine, so runs can be compared later.
+With --compare, every metric is compared to the same benchmark and
+parameters in an earlier run. Regressions larger than --threshold are
+reported and give exit status 1.
+
+Usage:
+    python -m benchmarks.suite --profile quick --output baseline.json
+    python -m benchmarks.suite --profile quick --compare baseline.json
+    python -m benchmarks.suite --only api tail --profile full
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arguments of each benchmark module by profile: 'quick' runs in a minute or two, 'full' uses the sizes
+# the benchmarks were written for (10M-row files, 100k-message pipelines)
+SUITE: Dict[str, Dict[str, Optional[List[str]]]] = {
+    'pv_profile': {
+        'quick': ['--points', '1', '1000', '100000', '--repeat', '3'],
+        'full': ['--points', '1', '1000', '1000000'],
+    },
+    'wire': {
+        'quick': ['--sites', '1000', '--repeat', '3'],
+        'full': [],
+    },
+    'validation': {
+        'quick': ['--rows', '100', '10000'],
+        'full': [],
+    },
+    'append': {
+        'quick': ['--rows', '20000', '--backend', 'csv', 'binary'],
+        'full': ['--rows', '200000', '--backend', 'csv', 'binary', 'partitioned'],
+    },
+    'tail': {
+        'quick': ['--rows', '10000', '1000000'],
+        'full': ['--rows', '10000', '1000000', '10000000'],
+    },
+    'range': {
+        'quick': ['--rows', '100000'],
+        'full': [],
+    },
+    'api': {
+        'quick': ['--rows', '10000', '100000', '--repeat', '3'],
+        'full': ['--rows', '10000', '100000', '1000000', '10000000'],
+    },
+    'pipeline': {
+        'quick': ['--messages', '20000', '--consumers', '1', '--backend', 'csv', 'binary'],
+        'full': [],
+    },
+    'process_pool': {
+        'quick': None,  # Pool start-up needs large runs to amortise
+        'full': [],
+    },
+    'partitions': {
+        'quick': ['--days', '2', '--repeat', '3'],
+        'full': [],
+    },
+}
+PROFILES = ('quick', 'full')
+
+# Metrics are the result fields matching this pattern; the other fields identify the measurement
+METRIC_PATTERN = re.compile(r'(_ms|_bytes|_per_[a-z]+|speedup)$')
+# Metrics where a larger value is better; for all others smaller is better
+HIGHER_IS_BETTER = re.compile(r'(_per_second|speedup)$')
+
+
+def run_benchmark(name: str, args: List[str]) -> dict:
+    """
+    Run one benchmark module in a child process
+
+    Returns:
+        Entry of the suite document: name, arguments, wall time, exit
+        status, results (one dict per JSON line printed) and the stderr
+        tail if it failed
+    """
+    command = [sys.executable, '-m', f'benchmarks.bench_{name}', *args]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    results = []
+    for line in process.stdout.splitlines():
+        if line.startswith('{'):
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+    entry = {
+        'name': name,
+        'args': args,
+        'seconds': round(time.perf_counter() - start, 2),
+        'returncode': process.returncode,
+        'results': results,
+    }
+    if process.returncode:
+        entry['error'] = process.stderr[-2000:]
+    return entry
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(profile: str, only: Optional[List[str]] = None) -> dict:
+    """Run the benchmarks of a profile and build the suite document"""
+    document = {
+        'profile': profile,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'benchmarks': [],
+    }
+    for name, profiles in SUITE.items():
+        args = profiles[profile]
+        if (only and name not in only) or args is None:
+            continue
+        print(f"Running {name} {' '.join(args)}", file=sys.stderr)
+        entry = run_benchmark(name, args)
+        status = 'ok' if entry['returncode'] == 0 else f"failed ({entry['returncode']})"
+        print(f"  {status}: {len(entry['results'])} results in {entry['seconds']} s", file=sys.stderr)
+        document['benchmarks'].append(entry)
+    return document
+
+
+def _measurements(document: dict) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """Metrics of every result, keyed by benchmark name and the result's other fields"""
+    measurements = {}
+    for entry in document['benchmarks']:
+        for result in entry['results']:
+            parameters = {key: value for key, value in result.items() if not METRIC_PATTERN.search(key)}
+            metrics = {key: value for key, value in result.items()
+                       if METRIC_PATTERN.search(key) and isinstance(value, (int, float))}
+            measurements[(entry['name'], json.dumps(parameters, sort_keys=True))] = metrics
+    return measurements
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """
+    Compare the metrics of two suite documents
+
+    Args:
+        baseline: Earlier suite document
+        current: Suite document of this run
+        threshold: Relative change (e.g. 0.1 for 10%) beyond which a worse value is a regression
+
+    Returns:
+        One entry per metric present in both runs, with the relative change
+        (positive means better) and whether it is a regression
+    """
+    before = _measurements(baseline)
+    changes = []
+    for key, metrics in _measurements(current).items():
+        for metric, value in metrics.items():
+            previous = before.get(key, {}).get(metric)
+            if previous is None or previous == 0:
+                continue
+            change = (value - previous) / abs(previous)
+            if not HIGHER_IS_BETTER.search(metric):
+                change = -change
+            changes.append({
+                'benchmark': key[0],
+                'parameters': json.loads(key[1]),
+                'metric': metric,
+                'baseline': previous,
+                'current': value,
+                'change': round(change, 4),
+                'regression': change < -threshold,
+            })
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--profile', choices=PROFILES, default='quick')
+    parser.add_argument('--only', nargs='+', choices=sorted(SUITE), help='Benchmarks to run (default all)')
+    parser.add_argument('--output', help='File for the suite document (default stdout)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Suite document of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative worsening reported as a regression (default 0.1)')
+    args = parser.parse_args()
+
+    document = run_suite(args.profile, args.only)
+    failed = [entry['name'] for entry in document['benchmarks'] if entry['returncode']]
+    if args.compare:
+        with open(args.compare) as f:
+            document['comparison'] = compare(json.load(f), document, args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        print(json.dumps(document, indent=2))
+
+    regressions = [change for change in document.get('comparison', []) if change['regression']]
+    for change in regressions:
+        print(f"Regression in {change['benchmark']} {change['metric']} {change['parameters']}: "
+              f"{change['baseline']} -> {change['current']}", file=sys.stderr)
+    if failed:
+        print(f"Failed benchmarks: {', '.join(failed)}", file=sys.stderr)
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+In-process fan-out of new results to streaming clients
+"""
+import queue
+import time
+import threading
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+from config import config
+from storage import ResultRow, get_results_store, result_records
+
+logger = logging.getLogger(__name__)
+
+
+def rows_to_records(rows: List[ResultRow]) -> List[Dict]:
+    """Convert result rows to the record shape returned by the results endpoints"""
+    if not rows:
+        return []
+    return result_records(*zip(*rows))
+
+
+class Subscription:
+    """
+    A client's bounded queue of new result records
+
+    When a slow client falls behind, its oldest records are dropped so the
+    publisher never blocks and memory per client stays bounded.
+    """
+
+    def __init__(self, broadcaster: 'ResultBroadcaster', max_queue: int):
+        self._broadcaster = broadcaster
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def put(self, records: List[Dict]) -> None:
+        for record in records:
+            while True:
+                try:
+                    self._queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout: float) -> List[Dict]:
+        """
+        Wait for new records
+
+        Args:
+            timeout: Seconds to wait for the first record
+
+        Returns:
+            All queued records, oldest first (empty on timeout)
+        """
+        try:
+            records = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def close(self) -> None:
+        self._broadcaster.unsubscribe(self)
+
+
+class ResultBroadcaster:
+    """Publishes result rows written by the PV workers to all subscribers"""
+
+    def __init__(self, max_queue: Optional[int] = None, max_clients: Optional[int] = None):
+        self._max_queue = max_queue or config.STREAM_QUEUE_SIZE
+        self._max_clients = max_clients or config.STREAM_MAX_CLIENTS
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Optional[Subscription]:
+        """Register a new client, or return None if the client limit is reached"""
+        with self._lock:
+            if len(self._subscribers) >= self._max_clients:
+                return None
+            subscription = Subscription(self, self._max_queue)
+            self._subscribers.append(subscription)
+        logger.debug(f"Stream client subscribed ({len(self._subscribers)} connected)")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+        logger.debug(f"Stream client unsubscribed ({len(self._subscribers)} connected)")
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, rows: Iterable[ResultRow]) -> None:
+        """Fan out newly written rows to every subscriber"""
+        if not self._subscribers:
+            return
+        records = rows_to_records(list(rows))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(records)
+
+
+class StoreFollower:
+    """
+    Publishes rows that another process appended to the results store
+
+    The process running the simulation publishes its rows directly. In the
+    other server processes this thread polls the store cursor (see
+    ResultsStore.read_since) while stream clients are connected, so every
+    process can serve /results/stream.
+
+    Args:
+        broadcaster: Broadcaster to publish to
+        is_writer: Returns True while this process writes (and publishes) the rows itself
+        interval: Seconds between polls
+    """
+
+    def __init__(self, broadcaster: ResultBroadcaster, is_writer: Callable[[], bool],
+                 interval: Optional[float] = None):
+        self._broadcaster = broadcaster
+        self._is_writer = is_writer
+        self._interval = interval or config.STREAM_POLL_INTERVAL
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        cursor = None
+        while True:
+            time.sleep(self._interval)
+            store = get_results_store()
+            if not self._broadcaster.client_count or not store.exists():
+                cursor = None
+                continue
+            try:
+                if cursor is None:
+                    # Start at the end of the store: clients only receive new rows
+                    _, cursor = store.read_since(0, 1)
+                    continue
+                rows, cursor = store.read_since(cursor, config.STREAM_QUEUE_SIZE)
+                if rows and not self._is_writer():
+                    net_key = 'sum' if 'sum' in rows[0] else 'net'
+                    self._broadcaster.publish(
+                        (r['timestamp'], r['meter'], r['pv'], r[net_key]) for r in rows
+                    )
+            except Exception as e:
+                logger.warning(f"Error following results store: {e}")
+                cursor = None
+
+
+broadcaster = ResultBroadcaster()
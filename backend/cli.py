@@ -0,0 +1,145 @@
+"""
+Command line tools for PV Simulator
+
+Usage:
+    python cli.py convert results.csv results.bin
+    python cli.py export-csv results.csv --backend binary
+    python cli.py export results.parquet --from 2025-01-01 --to 2025-02-01
+    python cli.py backfill --start 2024-01-01 --end 2025-01-01 --step 3
+    python cli.py compact --retention-days 90
+    python cli.py loadgen --rate 2000 --duration 30 --pollers 50 --poll-rate 2
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from config import config
+from storage import convert_csv_to_binary, export_csv, get_results_store, RESULTS_BACKENDS
+from export import export_results, ExportUnavailable, EXPORT_FORMATS
+from backfill import run_backfill, BackfillLock, BackfillBusy, to_micros
+import loadgen
+
+
+def cmd_convert(args: argparse.Namespace) -> int:
+    """Convert an existing results CSV file to the binary format"""
+    rows = convert_csv_to_binary(args.source, args.target)
+    print(f"Converted {rows} rows to {args.target}")
+    return 0
+
+
+def cmd_export_csv(args: argparse.Namespace) -> int:
+    """Export the configured results store to CSV"""
+    store = get_results_store(args.backend)
+    rows = export_csv(store, args.target)
+    print(f"Exported {rows} rows from {store.path} to {args.target}")
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Export the results store as CSV, Arrow IPC stream or Parquet"""
+    export_format = args.format or os.path.splitext(args.target)[1].lstrip('.')
+    if export_format == 'arrows':
+        export_format = 'arrow'
+    if export_format not in EXPORT_FORMATS:
+        print(f"Cannot tell the format from {args.target}; pass --format", file=sys.stderr)
+        return 2
+    store = get_results_store(args.backend)
+    start_us = to_micros(args.start) if args.start else None
+    end_us = to_micros(args.end) if args.end else None
+    try:
+        size = export_results(store, args.target, export_format, start_us, end_us)
+    except ExportUnavailable as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Exported {store.path} to {args.target} ({export_format}, {size} bytes)")
+    return 0
+
+
+def cmd_backfill(args: argparse.Namespace) -> int:
+    """Generate synthetic results for a time range directly into the store"""
+    store = get_results_store(args.backend)
+
+    def progress(written: int, total: int) -> None:
+        print(f"\r{written}/{total} rows", end='', file=sys.stderr)
+
+    lock = BackfillLock()
+    try:
+        lock.acquire()
+    except BackfillBusy as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        rows = run_backfill(args.start, args.end, args.step, args.seed, store=store, progress=progress)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        lock.release()
+    print(f"\nBackfilled {rows} rows into {store.path}")
+    return 0
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    """Compact closed results partitions and remove those past the retention period"""
+    if args.retention_days is not None:
+        config.RESULTS_RETENTION_DAYS = args.retention_days
+    store = get_results_store('partitioned')
+    compacted, removed = store.compact()
+    print(f"Compacted {compacted} and removed {removed} partitions in {store.path}")
+    return 0
+
+
+def cmd_loadgen(args: argparse.Namespace) -> int:
+    """Drive the meter queue and /results/latest at target rates and report latencies"""
+    return loadgen.run_from_args(args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="PV Simulator command line tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help="Convert a results CSV file to binary")
+    convert.add_argument('source', nargs='?', default=config.RESULTS_FILE, help="Results CSV file")
+    convert.add_argument('target', nargs='?', default=config.RESULTS_BINARY_FILE, help="Binary file to create")
+    convert.set_defaults(func=cmd_convert)
+
+    export = subparsers.add_parser('export-csv', help="Export the results store to CSV")
+    export.add_argument('target', help="CSV file to write")
+    export.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), default=config.RESULTS_BACKEND)
+    export.set_defaults(func=cmd_export_csv)
+
+    bulk_export = subparsers.add_parser('export', help="Export the results store as CSV, Arrow or Parquet")
+    bulk_export.add_argument('target', help="File to write (.csv, .arrow or .parquet)")
+    bulk_export.add_argument('--format', choices=sorted(EXPORT_FORMATS), help="Defaults to the target's extension")
+    bulk_export.add_argument('--from', dest='start', type=datetime.fromisoformat, help="ISO start time (inclusive)")
+    bulk_export.add_argument('--to', dest='end', type=datetime.fromisoformat, help="ISO end time (exclusive)")
+    bulk_export.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), default=config.RESULTS_BACKEND)
+    bulk_export.set_defaults(func=cmd_export)
+
+    backfill = subparsers.add_parser('backfill', help="Generate synthetic results for a time range")
+    backfill.add_argument('--start', type=datetime.fromisoformat, required=True, help="ISO start time (inclusive)")
+    backfill.add_argument('--end', type=datetime.fromisoformat, required=True, help="ISO end time (exclusive)")
+    backfill.add_argument('--step', type=float, default=config.METER_INTERVAL, help="Seconds between readings")
+    backfill.add_argument('--seed', type=int, default=0, help="Seed for the meter value RNG")
+    backfill.add_argument('--backend', choices=sorted(RESULTS_BACKENDS), default=config.RESULTS_BACKEND)
+    backfill.set_defaults(func=cmd_backfill)
+
+    compact = subparsers.add_parser('compact', help="Compact and expire results partitions")
+    compact.add_argument('--retention-days', type=int, help="Defaults to RESULTS_RETENTION_DAYS (0 keeps all)")
+    compact.set_defaults(func=cmd_compact)
+
+    load = subparsers.add_parser('loadgen', help="Generate meter and API load and report latencies")
+    loadgen.add_arguments(load)
+    load.set_defaults(func=cmd_loadgen)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
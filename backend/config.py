@@ -14,11 +14,59 @@ class Config:
     RABBITMQ_PORT: int = int(os.getenv('RABBITMQ_PORT', '5672'))
     METER_QUEUE: str = os.getenv('METER_QUEUE', 'meter_queue')
     
+    # Message transport: 'amqp' (RabbitMQ) or 'inprocess' (bounded in-memory queues, single node)
+    TRANSPORT: str = os.getenv('TRANSPORT', 'amqp')
+    INPROCESS_QUEUE_SIZE: int = int(os.getenv('INPROCESS_QUEUE_SIZE', '100000'))  # Publishers block when full
+    INPROCESS_PUBLISH_TIMEOUT: float = float(os.getenv('INPROCESS_PUBLISH_TIMEOUT', '5.0'))
+    # Execution engine: 'threads' (blocking workers on TRANSPORT) or 'asyncio' (meter coroutines on one loop)
+    ENGINE: str = os.getenv('ENGINE', 'threads')
+    
     # App settings
     RESULTS_FILE: str = os.getenv('RESULTS_FILE', 'results.csv')
+    RESULTS_BINARY_FILE: str = os.getenv('RESULTS_BINARY_FILE', 'results.bin')
+    RESULTS_BACKEND: str = os.getenv('RESULTS_BACKEND', 'csv')  # 'csv', 'binary' or 'partitioned'
+    RESULTS_PARTITION_DIR: str = os.getenv('RESULTS_PARTITION_DIR', 'results')  # One partition per day
+    RESULTS_RETENTION_DAYS: int = int(os.getenv('RESULTS_RETENTION_DAYS', '0'))  # Days of partitions kept, 0 keeps all
+    RESULTS_AUTO_COMPACT: bool = os.getenv('RESULTS_AUTO_COMPACT', 'True').lower() == 'true'  # Compact when a new day starts
     DATA_DIR: str = os.getenv('DATA_DIR', './data')
-    METER_INTERVAL: int = int(os.getenv('METER_INTERVAL', '3'))
+    METER_INTERVAL: float = float(os.getenv('METER_INTERVAL', '3'))  # Seconds between readings, fractions allowed
     MAX_RESULTS_RETURNED: int = int(os.getenv('MAX_RESULTS_RETURNED', '50'))
+    RING_BUFFER_SIZE: int = int(os.getenv('RING_BUFFER_SIZE', '10000'))  # Recent rows kept in memory, 0 disables
+    BACKFILL_MAX_ROWS: int = int(os.getenv('BACKFILL_MAX_ROWS', '20000000'))  # Largest backfill POST /backfill accepts
+    
+    # Batching settings (publish bursts, buffered writes, multi-message acks)
+    BATCH_MODE: bool = os.getenv('BATCH_MODE', 'False').lower() == 'true'
+    BATCH_SIZE: int = int(os.getenv('BATCH_SIZE', '100'))
+    BATCH_LINGER: float = float(os.getenv('BATCH_LINGER', '1.0'))  # Max seconds a reading waits in a batch
+    PREFETCH_COUNT: int = int(os.getenv('PREFETCH_COUNT', '500'))
+    PV_PROCESSES: int = int(os.getenv('PV_PROCESSES', '0'))  # Pool processes computing batches (0 computes in the PV threads)
+    
+    # Instrumentation: per-stage latency histograms (see latency.py), off removes every timing call
+    LATENCY_HISTOGRAMS: bool = os.getenv('LATENCY_HISTOGRAMS', 'True').lower() == 'true'
+    
+    # Meter message encoding: 'json' or 'binary' (packed frames, see wire.py); consumers accept both
+    WIRE_FORMAT: str = os.getenv('WIRE_FORMAT', 'json')
+    WIRE_FRAME_SIZE: int = int(os.getenv('WIRE_FRAME_SIZE', '1'))  # Readings per binary message
+    
+    # PV profile settings (bell curve parameters and optional lookup table)
+    PV_PEAK_HOUR: float = float(os.getenv('PV_PEAK_HOUR', '12.0'))
+    PV_WIDTH: float = float(os.getenv('PV_WIDTH', '18.0'))
+    PV_CAPACITY: float = float(os.getenv('PV_CAPACITY', '8.0'))
+    PV_LOOKUP_TABLE: bool = os.getenv('PV_LOOKUP_TABLE', 'False').lower() == 'true'
+    PV_TABLE_RESOLUTION: int = int(os.getenv('PV_TABLE_RESOLUTION', '1'))  # Seconds per table entry
+    
+    # Fleet settings (number of simulated sites and PV consumer workers)
+    FLEET_SIZE: int = int(os.getenv('FLEET_SIZE', '1'))
+    MAX_FLEET_SIZE: int = int(os.getenv('MAX_FLEET_SIZE', '10000'))
+    PV_CONSUMERS: int = int(os.getenv('PV_CONSUMERS', '1'))
+    FLEET_SEED: int = int(os.getenv('FLEET_SEED', '42'))
+    LEADER_HEARTBEAT: float = float(os.getenv('LEADER_HEARTBEAT', '1.0'))  # Seconds between shared state updates
+    
+    # Streaming settings (Server-Sent Events on /results/stream)
+    STREAM_QUEUE_SIZE: int = int(os.getenv('STREAM_QUEUE_SIZE', '1000'))  # Records buffered per client
+    STREAM_MAX_CLIENTS: int = int(os.getenv('STREAM_MAX_CLIENTS', '100'))
+    STREAM_HEARTBEAT: float = float(os.getenv('STREAM_HEARTBEAT', '15.0'))  # Seconds between keep-alives
+    STREAM_POLL_INTERVAL: float = float(os.getenv('STREAM_POLL_INTERVAL', '1.0'))  # Store polling in non-leader processes
     
     # Flask settings
     FLASK_HOST: str = os.getenv('FLASK_HOST', '0.0.0.0')
@@ -0,0 +1,256 @@
+"""
+Coordination of the simulation across server processes
+
+gunicorn runs several worker processes that each import app.py. Exactly one
+of them, the leader, runs the simulation threads: it holds an exclusive
+flock on the lock file in DATA_DIR for as long as the simulation runs and
+publishes its status to a small memory-mapped state file. The other
+processes answer /status and /metrics from that file and ask the leader to
+stop through it. The kernel drops the lock when the leader dies, so a
+crashed leader never blocks a restart.
+
+The lock is a whole-file record lock on an open file description (Linux
+F_OFD_SETLK) rather than a flock, so other processes can test for it with
+F_GETLK without taking it: a probe that took the lock, however briefly,
+would make a concurrent /start fail as 'already running'. Elsewhere it
+falls back to POSIX record locks, which belong to the process: there two
+LeaderLocks in one process do not exclude each other, and closing any
+descriptor of the file drops the process's lock.
+"""
+import errno
+import fcntl
+import os
+import struct
+import time
+import threading
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import config
+from simulation import SimulationManager
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = 'simulation.lock'
+BACKFILL_LOCK_FILE = 'backfill.lock'  # Held by a backfill, along with LOCK_FILE
+STATE_FILE = 'simulation.state'
+
+SHARED_STATE_DTYPE = np.dtype([
+    ('running', 'u1'),
+    ('stop_requested', '<f8'),  # started_at of the run asked to stop, 0 for none
+    ('pid', '<i4'),
+    ('fleet_size', '<i4'),
+    ('consumers', '<i4'),
+    ('started_at', '<f8'),
+    ('heartbeat', '<f8'),
+    ('messages', '<i8'),
+])
+
+# Seconds a non-leader waits for the leader to honour a stop request
+STOP_TIMEOUT = 15.0
+
+_SETLK = getattr(fcntl, 'F_OFD_SETLK', fcntl.F_SETLK)
+_GETLK = getattr(fcntl, 'F_OFD_GETLK', fcntl.F_GETLK)
+# struct flock: l_type, l_whence, l_start, l_len, l_pid (0 for OFD locks), padding
+_FLOCK = 'hhqqi4x'
+
+
+def _flock_record(lock_type: int) -> bytes:
+    """struct flock covering the whole file"""
+    return struct.pack(_FLOCK, lock_type, os.SEEK_SET, 0, 0, 0)
+
+
+class LeaderLock:
+    """Non-blocking exclusive record lock on a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        """Whether this process holds the lock"""
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """Try to take the lock without waiting"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.fcntl(fd, _SETLK, _flock_record(fcntl.F_WRLCK))
+        except OSError as e:
+            os.close(fd)
+            if e.errno in (errno.EACCES, errno.EAGAIN):
+                return False
+            raise
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.fcntl(self._fd, _SETLK, _flock_record(fcntl.F_UNLCK))
+            os.close(self._fd)
+            self._fd = None
+
+    def held_elsewhere(self) -> bool:
+        """Whether another process (or another LeaderLock) holds the lock, tested without taking it"""
+        if self._fd is not None:
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            result = fcntl.fcntl(fd, _GETLK, _flock_record(fcntl.F_WRLCK))
+        finally:
+            os.close(fd)
+        return struct.unpack(_FLOCK, result)[0] != fcntl.F_UNLCK
+
+
+class SharedState:
+    """Fixed-size simulation status record shared through a memory-mapped file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < SHARED_STATE_DTYPE.itemsize:
+                os.ftruncate(fd, SHARED_STATE_DTYPE.itemsize)
+        finally:
+            os.close(fd)
+        self._record = np.memmap(path, dtype=SHARED_STATE_DTYPE, mode='r+', shape=(1,))
+
+    def read(self) -> Dict:
+        record = self._record[0]
+        return {name: record[name].item() for name in SHARED_STATE_DTYPE.names}
+
+    def update(self, **fields) -> None:
+        for name, value in fields.items():
+            self._record[name] = value
+
+
+class SimulationCoordinator:
+    """
+    Runs the local SimulationManager only while this process is the leader
+
+    Args:
+        manager: This process's simulation manager
+        data_dir: Directory for the lock and state files (defaults to config.DATA_DIR)
+    """
+
+    def __init__(self, manager: SimulationManager, data_dir: Optional[str] = None):
+        data_dir = data_dir or config.DATA_DIR
+        os.makedirs(data_dir, exist_ok=True)
+        self.manager = manager
+        self._leader = LeaderLock(os.path.join(data_dir, LOCK_FILE))
+        self._backfill = LeaderLock(os.path.join(data_dir, BACKFILL_LOCK_FILE))
+        self._state = SharedState(os.path.join(data_dir, STATE_FILE))
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.held
+
+    def start(self, fleet_size: Optional[int] = None, consumers: Optional[int] = None) -> str:
+        """
+        Start the simulation in this process unless another process runs it
+
+        Returns:
+            'started', 'already running', 'busy' (a backfill holds the lock) or 'failed'
+        """
+        with self._lock:
+            if self.manager.is_running:
+                return 'already running'
+            if not self._leader.acquire():
+                # Backfills hold the leader lock too, so the store has a single writer
+                return 'busy' if self._backfill.held_elsewhere() else 'already running'
+            # A leader that died without clearing the state must not block this run
+            self._state.update(running=0, stop_requested=0)
+
+            if not self.manager.start(fleet_size=fleet_size, consumers=consumers):
+                self._resign()
+                return 'failed'
+
+            self._started_at = now = time.time()
+            self._state.update(
+                running=1, stop_requested=0, pid=os.getpid(), fleet_size=self.manager.fleet_size,
+                consumers=len(self.manager.throughput()), started_at=now, heartbeat=now, messages=0
+            )
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._heartbeat.start()
+            logger.info(f"Process {os.getpid()} is running the simulation")
+            return 'started'
+
+    def stop(self) -> bool:
+        """
+        Stop the simulation, wherever it runs
+
+        Returns:
+            True once no process runs the simulation
+        """
+        with self._lock:
+            # Read before the lock test, so a run started after the test is never the target
+            started_at = self._state.read()['started_at']
+            if self._leader.held or not self._leader.held_elsewhere():
+                self.manager.stop()
+                self._resign()
+                return True
+
+        # The request names the run it stops: a leader started since then ignores it
+        self._state.update(stop_requested=started_at)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while time.monotonic() < deadline:
+            state = self._state.read()
+            if not state['running'] or state['started_at'] != started_at or not self._leader.held_elsewhere():
+                return True
+            time.sleep(0.1)
+        logger.warning("Simulation leader did not stop in time")
+        return False
+
+    def status(self) -> Dict:
+        """Simulation status as seen from this process"""
+        if self._leader.held or self.manager.is_running:
+            return {
+                'running': self.manager.is_running,
+                'fleet_size': self.manager.fleet_size,
+                'leader_pid': os.getpid(),
+                'is_leader': True,
+            }
+        state = self._state.read()
+        # Trust the shared state only while its writer still holds the lock
+        running = bool(state['running']) and self._leader.held_elsewhere()
+        return {
+            'running': running,
+            'fleet_size': state['fleet_size'] if running else self.manager.fleet_size,
+            'leader_pid': state['pid'] if running else None,
+            'is_leader': False,
+        }
+
+    def _resign(self) -> None:
+        """Clear the shared state and give up leadership (lock must be held)"""
+        if self._leader.held:
+            self._state.update(running=0, stop_requested=0, heartbeat=time.time())
+            self._leader.release()
+
+    def _heartbeat_loop(self) -> None:
+        """Publish progress and honour stop requests from other processes"""
+        while True:
+            time.sleep(config.LEADER_HEARTBEAT)
+            with self._lock:
+                # A heartbeat from an earlier run exits once a new run has replaced it
+                if not self._leader.held or self._heartbeat is not threading.current_thread():
+                    return
+                if self._state.read()['stop_requested'] == self._started_at or not self.manager.is_running:
+                    logger.info("Simulation leader stepping down")
+                    self.manager.stop()
+                    self._resign()
+                    return
+                self._state.update(
+                    heartbeat=time.time(),
+                    messages=sum(stats['messages'] for stats in self.manager.throughput())
+                )
@@ -0,0 +1,161 @@
+"""
+Bulk export of results as CSV, Arrow IPC stream or Parquet
+
+Exports are encoded from the results store's column chunks (see
+ResultsStore.iter_range), one record batch or row group per chunk, and
+produced as a stream of byte blocks. They can be sent as an HTTP response or
+written to a file without holding more than one chunk in memory. The Arrow
+and Parquet formats need the optional pyarrow package.
+"""
+import csv
+import io
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from storage import ResultsStore, Columns, CSV_HEADER, from_epoch_micros
+
+# Rows per record batch / row group
+EXPORT_CHUNK_ROWS = 100_000
+
+# Compression codec of Arrow IPC buffers and Parquet column chunks
+EXPORT_COMPRESSION = 'zstd'
+
+
+class ExportFormat(NamedTuple):
+    mimetype: str
+    extension: str
+    needs_pyarrow: bool
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    'csv': ExportFormat('text/csv', 'csv', False),
+    'arrow': ExportFormat('application/vnd.apache.arrow.stream', 'arrows', True),
+    'parquet': ExportFormat('application/vnd.apache.parquet', 'parquet', True),
+}
+
+
+class ExportUnavailable(RuntimeError):
+    """The requested export format needs an optional dependency that is not installed"""
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Arrow and Parquet exports need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects what the writers produce until drained"""
+
+    def __init__(self):
+        super().__init__()
+        self._blocks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._blocks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._blocks)
+        self._blocks = []
+        return data
+
+
+def _rounded(columns: Columns) -> List[np.ndarray]:
+    """Reading columns rounded to 2 decimals as float64, as served by the API"""
+    return [np.round(columns[name].astype(np.float64), 2) for name in ('meter', 'pv', 'net')]
+
+
+def _csv_blocks(chunks: Iterator[Columns]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue().encode('utf-8')
+    for columns in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(zip(
+            from_epoch_micros(columns['timestamp']).tolist(),
+            *(values.tolist() for values in _rounded(columns))
+        ))
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _pyarrow_blocks(pa, export_format: str, chunks: Iterator[Columns]) -> Iterator[bytes]:
+    schema = pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('meter', pa.float64()),
+        ('pv', pa.float64()),
+        ('net', pa.float64()),
+    ])
+    sink = _ChunkSink()
+    if export_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, schema, compression=EXPORT_COMPRESSION)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=EXPORT_COMPRESSION)
+        writer = pa.ipc.new_stream(sink, schema, options=options)
+
+    for columns in chunks:
+        timestamps = pa.array(columns['timestamp'].astype(np.int64)).cast(pa.timestamp('us'))
+        writer.write_batch(pa.record_batch([timestamps, *_rounded(columns)], schema=schema))
+        yield sink.drain()
+    # Parquet files end with their footer, Arrow streams with an end-of-stream marker
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(store: ResultsStore, export_format: str, start_us: Optional[int] = None,
+                end_us: Optional[int] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Encode the results in a time range, one block of bytes per chunk
+
+    The format is checked when this is called, before any block is produced.
+
+    Args:
+        store: Source results store
+        export_format: 'csv', 'arrow' (IPC stream) or 'parquet'
+        start_us: Inclusive lower bound in epoch microseconds (None for no bound)
+        end_us: Exclusive upper bound in epoch microseconds (None for no bound)
+        chunk_rows: Rows per record batch / row group
+
+    Raises:
+        ValueError: If the format is unknown
+        ExportUnavailable: If the format needs pyarrow and it is not installed
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    pa = _import_pyarrow() if EXPORT_FORMATS[export_format].needs_pyarrow else None
+    chunks = store.iter_range(start_us, end_us, chunk_rows)
+    if pa is None:
+        return _csv_blocks(chunks)
+    return _pyarrow_blocks(pa, export_format, chunks)
+
+
+def export_results(store: ResultsStore, path: str, export_format: str, start_us: Optional[int] = None,
+                   end_us: Optional[int] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Write an export of the results in a time range to a file
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    with open(path, 'wb') as f:
+        for block in iter_export(store, export_format, start_us, end_us, chunk_rows):
+            f.write(block)
+            written += len(block)
+    return written
@@ -0,0 +1,104 @@
+"""
+Fleet model for multi-site PV simulation
+"""
+import bisect
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from config import config
+
+# Range of PV capacities drawn for sites in a multi-site fleet
+FLEET_CAPACITY_RANGE = (3.0, 10.0)
+
+
+@dataclass(frozen=True)
+class Site:
+    """A simulated household with its own meter and PV installation"""
+    meter_id: int
+    capacity_kw: float
+    routing_key: str
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring mapping keys to consumer indices
+
+    Every consumer is placed on the ring at several virtual points, so
+    changing the number of consumers only moves the keys adjacent to the
+    added or removed points.
+    """
+
+    def __init__(self, nodes: Sequence[int], replicas: int = 100):
+        if not nodes:
+            raise ValueError("Hash ring needs at least one node")
+        points = sorted(
+            (self._hash(f"consumer-{node}#{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._nodes = [n for _, n in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def lookup(self, key: str) -> int:
+        """Return the node responsible for a key"""
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+def shard_queue(index: int, consumers: int) -> str:
+    """
+    Name of the queue consumed by a PV consumer
+
+    A single consumer keeps using METER_QUEUE, so the default deployment is
+    unchanged.
+    """
+    if consumers == 1:
+        return config.METER_QUEUE
+    return f"{config.METER_QUEUE}.{index}"
+
+
+def build_fleet(size: int, consumers: int, seed: int = 0) -> List[Site]:
+    """
+    Create a fleet of sites routed to consumers by consistent hashing
+
+    Args:
+        size: Number of sites
+        consumers: Number of PV consumer workers
+        seed: Seed for the per-site PV capacities
+
+    Returns:
+        Sites ordered by meter ID
+    """
+    if size < 1 or consumers < 1:
+        raise ValueError("Fleet size and consumer count must be at least 1")
+
+    if size == 1:
+        capacities = [config.PV_CAPACITY]
+    else:
+        rng = np.random.default_rng(seed)
+        capacities = np.round(rng.uniform(*FLEET_CAPACITY_RANGE, size=size), 1).tolist()
+
+    ring = ConsistentHashRing(range(consumers))
+    return [
+        Site(
+            meter_id=meter_id,
+            capacity_kw=capacity,
+            routing_key=shard_queue(ring.lookup(str(meter_id)), consumers),
+        )
+        for meter_id, capacity in enumerate(capacities)
+    ]
+
+
+def sites_by_queue(sites: Sequence[Site]) -> Dict[str, List[Site]]:
+    """Group sites by the queue their readings are routed to"""
+    groups: Dict[str, List[Site]] = {}
+    for site in sites:
+        groups.setdefault(site.routing_key, []).append(site)
+    return groups
@@ -0,0 +1,367 @@
+"""
+Latency histograms of the pipeline stages
+
+Each stage between a meter publishing a reading and its result being
+acknowledged records how long it took into a fixed-bucket, HDR-style
+histogram: values below 32 us get a bucket each, larger values get 16
+buckets per power of two, so every bucket is at most 1/16 (6.25%) wide
+relative to its values and the layout never changes. A recording adds to
+two integers in lists owned by the recording thread, without a lock. At
+most once per FLUSH_INTERVAL the increase since the last flush is added to
+a memory-mapped file in DATA_DIR, so every server process (and the PV pool
+processes) adds to the same histograms and /metrics reads them from any
+process.
+
+Stages:
+    publish: basic_publish of one meter message (includes the broker
+        confirm in batch mode)
+    dwell: age of a reading when a consumer decodes it, from the timestamp
+        the meter gave it (broker queueing and batching included)
+    decode: decoding one message, or one batch in a PV pool process
+    compute: PV and net calculation for one message or batch
+    validate: range checks of one message or batch
+    write: appending one message or batch to the results store
+    ack: acknowledging one message or batch
+
+Setting LATENCY_HISTOGRAMS to false switches the instrumentation off
+completely: no clock is read and nothing is recorded.
+"""
+import fcntl
+import mmap
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAMS_FILE = 'latency.histograms'
+HISTOGRAMS_MAGIC = b'PVLAT001'
+
+STAGES = ('publish', 'dwell', 'decode', 'compute', 'validate', 'write', 'ack')
+_STAGE_INDEX = {stage: index for index, stage in enumerate(STAGES)}
+
+# Bucket layout: 2**SUB_BUCKET_BITS buckets per power of two, exact below 2 * SUB_BUCKETS us
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_SHIFT = 32
+BUCKETS = (MAX_SHIFT + 2) * SUB_BUCKETS
+MAX_MICROS = (2 * SUB_BUCKETS << MAX_SHIFT) - 1  # About 38 hours; longer values go in the last bucket
+
+# Slots of a stage's row: count and sum in microseconds, then the buckets
+COUNT, TOTAL = 0, 1
+FIRST_BUCKET = 2
+SLOTS = FIRST_BUCKET + BUCKETS
+
+# Seconds between merges of a process's recordings into the shared file
+FLUSH_INTERVAL = 1.0
+
+# Upper bounds of the buckets exported to Prometheus: powers of 4 from 16 us to about 67 s
+PROMETHEUS_BOUNDS = [4 ** exponent for exponent in range(2, 14)]
+
+PERCENTILES = (('p50', 50.0), ('p90', 90.0), ('p99', 99.0), ('p999', 99.9))
+
+
+def bucket_index(micros: int) -> int:
+    """Bucket of a duration in microseconds (negative durations count as 0)"""
+    micros = min(max(micros, 0), MAX_MICROS)
+    shift = max(micros.bit_length() - SUB_BUCKET_BITS - 1, 0)
+    return (shift << SUB_BUCKET_BITS) + (micros >> shift)
+
+
+def bucket_bounds() -> Tuple[np.ndarray, np.ndarray]:
+    """Inclusive lower and exclusive upper bound in microseconds of every bucket"""
+    index = np.arange(BUCKETS, dtype=np.int64)
+    shift = np.maximum(index // SUB_BUCKETS - 1, 0)
+    mantissa = index - (shift << SUB_BUCKET_BITS)
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+_LOWER, _UPPER = bucket_bounds()
+
+
+class _Recorder:
+    """Histogram rows of one thread: only that thread writes them, flushes read them"""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.rows: List[List[int]] = [[0] * SLOTS for _ in STAGES]
+        self.flushed = np.zeros((len(STAGES), SLOTS), dtype=np.int64)  # Rows as of the last flush
+        self.last_parsed: Tuple[Optional[str], float] = (None, 0.0)  # Last timestamp given to record_age
+
+
+class LatencyHistograms:
+    """
+    Per-stage latency histograms, shared by all processes through a memory-mapped file
+
+    Every thread records into its own rows; since the rows only grow, a
+    flush adds their increase since the previous flush to the file under an
+    exclusive flock. Flushes happen once FLUSH_INTERVAL has passed, or on
+    flush() and snapshot(). The file is opened on first use, so DATA_DIR is
+    read when recording starts rather than at import.
+
+    Args:
+        path: Histograms file (defaults to HISTOGRAMS_FILE in config.DATA_DIR)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._fd: Optional[int] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._shared: Optional[np.ndarray] = None  # (stage, slot) view of the file
+        self._local = threading.local()
+        self._recorders: List[_Recorder] = []
+        self._dirty = False
+        self._next_flush = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path or os.path.join(config.DATA_DIR, HISTOGRAMS_FILE)
+
+    @property
+    def enabled(self) -> bool:
+        return config.LATENCY_HISTOGRAMS
+
+    def _recorder(self) -> _Recorder:
+        """Rows of the calling thread, registered on its first recording"""
+        recorder = getattr(self._local, 'recorder', None)
+        if recorder is None:
+            recorder = self._local.recorder = _Recorder()
+            with self._lock:
+                self._recorders.append(recorder)
+        return recorder
+
+    def start(self) -> Optional[float]:
+        """Start timing a stage; returns None when the histograms are switched off"""
+        return time.perf_counter() if config.LATENCY_HISTOGRAMS else None
+
+    def lap(self, stage: str, started: Optional[float]) -> Optional[float]:
+        """
+        Record the time since started for a stage and start timing the next one
+
+        Args:
+            stage: Stage that just finished
+            started: Value returned by start() or the previous lap()
+
+        Returns:
+            Start of the next stage, or None if started was None
+        """
+        if started is None:
+            return None
+        now = time.perf_counter()
+        self.record(stage, int((now - started) * 1_000_000))
+        return now
+
+    def record_age(self, stage: str, timestamp: str) -> None:
+        """Record the age of a reading from its naive ISO timestamp, as set by the meters"""
+        if not config.LATENCY_HISTOGRAMS:
+            return
+        recorder = self._recorder()
+        # The readings of a burst share their timestamp, so it is parsed once per burst
+        last_timestamp, epoch = recorder.last_parsed
+        if timestamp != last_timestamp:
+            try:
+                epoch = datetime.fromisoformat(timestamp).timestamp()
+            except (TypeError, ValueError):
+                # A malformed timestamp is the pipeline's to reject, not the histogram's
+                return
+            recorder.last_parsed = (timestamp, epoch)
+        self.record(stage, int((time.time() - epoch) * 1_000_000))
+
+    def record(self, stage: str, micros: int) -> None:
+        """
+        Record one duration
+
+        Args:
+            stage: One of STAGES
+            micros: Duration in microseconds
+        """
+        # bucket_index, inlined: this runs several times per message
+        if micros < 0:
+            micros = 0
+        elif micros > MAX_MICROS:
+            micros = MAX_MICROS
+        shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+        index = FIRST_BUCKET + ((shift << SUB_BUCKET_BITS) + (micros >> shift) if shift > 0 else micros)
+        row = self._recorder().rows[_STAGE_INDEX[stage]]
+        row[COUNT] += 1
+        row[TOTAL] += micros
+        row[index] += 1
+        self._dirty = True
+        if time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Add what this process recorded since the last flush to the shared file"""
+        with self._lock:
+            self._next_flush = time.monotonic() + FLUSH_INTERVAL
+            if not self._dirty:
+                return
+            self._dirty = False
+            increase = np.zeros((len(STAGES), SLOTS), dtype=np.int64)
+            recorders = []
+            for recorder in self._recorders:
+                # A thread that had finished before its rows are read records nothing more
+                if recorder.thread.is_alive():
+                    recorders.append(recorder)
+                rows = np.array(recorder.rows, dtype=np.int64)
+                increase += rows - recorder.flushed
+                recorder.flushed = rows
+            self._recorders = recorders
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._shared += increase
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _open(self) -> None:
+        """Map the histograms file, creating or resetting it if needed (lock must be held)"""
+        if self._fd is not None:
+            return
+        size = len(HISTOGRAMS_MAGIC) + len(STAGES) * SLOTS * 8
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != size or os.pread(fd, len(HISTOGRAMS_MAGIC), 0) != HISTOGRAMS_MAGIC:
+                # New file, or one written with another bucket layout
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HISTOGRAMS_MAGIC, 0)
+            self._mmap = mmap.mmap(fd, size)
+            shared = np.frombuffer(self._mmap, dtype='<i8', offset=len(HISTOGRAMS_MAGIC))
+            self._shared = shared.reshape(len(STAGES), SLOTS)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+
+    def snapshot(self) -> np.ndarray:
+        """Copy of the shared histograms, one row of SLOTS per stage, including this process's recordings"""
+        self.flush()
+        with self._lock:
+            self._open()
+            return self._shared.copy()
+
+    def reset(self) -> None:
+        """Clear the shared histograms and what this process has not flushed yet, e.g. before a load test"""
+        with self._lock:
+            for recorder in self._recorders:
+                recorder.flushed = np.array(recorder.rows, dtype=np.int64)
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._shared[:] = 0
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is None:
+                return
+            # The array view must be released before the map can be closed
+            self._shared = None
+            self._mmap.close()
+            os.close(self._fd)
+            self._fd, self._mmap = None, None
+
+
+def percentile(row: np.ndarray, percent: float) -> int:
+    """
+    Value at a percentile of a stage's histogram, in microseconds
+
+    Like HDR histograms, this is the highest value of the bucket the
+    percentile falls in, so 100 gives the maximum at bucket resolution.
+    """
+    count = int(row[COUNT])
+    if not count:
+        return 0
+    rank = max(int(np.ceil(count * percent / 100.0)), 1)
+    index = int(np.searchsorted(np.cumsum(row[FIRST_BUCKET:]), rank))
+    return int(_UPPER[index]) - 1
+
+
+def summarize_row(row: np.ndarray) -> Dict[str, float]:
+    """Count, mean, percentiles and maximum of one histogram row, in milliseconds"""
+    count = int(row[COUNT])
+    stats = {'count': count, 'mean_ms': round(row[TOTAL] / count / 1000, 3) if count else 0.0}
+    for name, percent in PERCENTILES:
+        stats[f'{name}_ms'] = percentile(row, percent) / 1000
+    stats['max_ms'] = percentile(row, 100.0) / 1000
+    return stats
+
+
+def summarize(histograms: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """
+    Count, mean, percentiles and maximum of every stage, in milliseconds
+
+    Args:
+        histograms: Rows returned by LatencyHistograms.snapshot()
+    """
+    return {stage: summarize_row(row) for stage, row in zip(STAGES, histograms)}
+
+
+class Histogram:
+    """
+    A single in-process histogram with the same buckets, e.g. for a load test's own measurements
+
+    Not thread-safe: give every thread its own and merge them.
+    """
+
+    def __init__(self):
+        self.row = np.zeros(SLOTS, dtype=np.int64)
+
+    def record(self, micros: int) -> None:
+        """Record one duration in microseconds"""
+        micros = max(micros, 0)
+        self.row[COUNT] += 1
+        self.row[TOTAL] += micros
+        self.row[FIRST_BUCKET + bucket_index(micros)] += 1
+
+    def merge(self, other: 'Histogram') -> 'Histogram':
+        self.row += other.row
+        return self
+
+    def summary(self) -> Dict[str, float]:
+        return summarize_row(self.row)
+
+
+def cumulative_buckets(row: np.ndarray) -> List[Tuple[float, int]]:
+    """
+    Cumulative counts of a stage at PROMETHEUS_BOUNDS, as (upper bound in seconds, count)
+
+    The bounds are powers of two, which are bucket boundaries, so the counts are exact.
+    """
+    cumulative = np.cumsum(row[FIRST_BUCKET:])
+    ends = np.searchsorted(_UPPER, PROMETHEUS_BOUNDS, side='right')
+    return [(bound / 1_000_000, int(cumulative[end - 1])) for bound, end in zip(PROMETHEUS_BOUNDS, ends)]
+
+
+def prometheus_samples(histograms: np.ndarray) -> List[tuple]:
+    """
+    Series of a Prometheus histogram with a stage label: cumulative buckets, sum and count
+
+    Args:
+        histograms: Rows returned by LatencyHistograms.snapshot()
+
+    Returns:
+        (suffix, labels, value) samples, durations in seconds
+    """
+    samples = []
+    for stage, row in zip(STAGES, histograms):
+        samples.extend(('_bucket', {'stage': stage, 'le': repr(bound)}, count)
+                       for bound, count in cumulative_buckets(row))
+        samples.append(('_bucket', {'stage': stage, 'le': '+Inf'}, int(row[COUNT])))
+        samples.append(('_sum', {'stage': stage}, int(row[TOTAL]) / 1_000_000))
+        samples.append(('_count', {'stage': stage}, int(row[COUNT])))
+    return samples
+
+
+latency_histograms = LatencyHistograms()
@@ -0,0 +1,359 @@
+"""
+Load generator: drive the meter queue and /results/latest at target rates
+
+Meter readings are published open-loop. Reading i is due at i / rate
+seconds after the start and carries that intended time as its timestamp,
+rather than the time it was actually sent. A publisher that falls behind
+(broker backpressure, a GC pause) then shows up as latency of the late
+readings instead of quietly lowering the offered load, which is the
+coordinated omission a closed-loop generator suffers from. Latencies are
+measured from the intended time:
+
+- send lag: until basic_publish returned
+- end to end: until the result row could be read from the results store
+
+HTTP pollers request /results/latest with If-None-Match, as the dashboard
+does. Each poller has its own keep-alive connection and open-loop schedule,
+so its latencies also count from the intended request time.
+
+By default the PV consumers (SimulationManager without its meter thread)
+and the API run in this process, on the configured transport;
+TRANSPORT=inprocess needs nothing else. With --no-consumers the readings
+go to a broker consumed by a running server, and --url points the pollers
+at that server. End-to-end latency then needs the server's results store
+(same DATA_DIR and backend) and no meter thread of its own writing to it.
+
+Usage:
+    python loadgen.py --rate 2000 --duration 30 --pollers 50 --poll-rate 2
+    TRANSPORT=amqp python loadgen.py --rate 500 --no-consumers --url http://localhost:5000
+"""
+import argparse
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from config import config
+from fleet import build_fleet, Site
+from latency import Histogram
+from simulation import SimulationManager, create_meter_messages, open_connection
+from storage import get_results_store, ResultsStore
+from transport import BackpressureTimeout
+from wire import message_properties
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_INTERVAL = 0.01  # Seconds between reads of the results store
+FOLLOW_LIMIT = 1_000_000  # Rows per read; read_since skips older rows beyond this
+HTTP_TIMEOUT = 10.0
+
+
+def _wait_until(start: float, offset: float, stop: threading.Event) -> None:
+    """Sleep until offset seconds after start (a perf_counter value), unless stopped"""
+    delay = start + offset - time.perf_counter()
+    if delay > 0:
+        stop.wait(delay)
+
+
+class MeterLoad:
+    """
+    Open-loop publisher of meter readings, one message per reading
+
+    Args:
+        sites: Sites to send readings for, in turn
+        rate: Readings per second
+        duration: Seconds to send for
+    """
+
+    def __init__(self, sites: Sequence[Site], rate: float, duration: float):
+        self.sites = sites
+        self.rate = rate
+        self.total = int(rate * duration)
+        self.sent = 0
+        self.dropped = 0
+        self.send_lag = Histogram()
+        self.seconds = 0.0
+
+    def run(self, wall_start: float, start: float, stop: threading.Event) -> None:
+        """
+        Publish the readings
+
+        Args:
+            wall_start: time.time() at the start, for the reading timestamps
+            start: time.perf_counter() at the start, for the schedule
+            stop: Set to stop early
+        """
+        connection = open_connection()
+        channel = connection.channel()
+        for queue in sorted({site.routing_key for site in self.sites}):
+            channel.queue_declare(queue=queue, durable=True)
+        try:
+            for index in range(self.total):
+                if stop.is_set():
+                    break
+                intended = index / self.rate
+                _wait_until(start, intended, stop)
+                site = self.sites[index % len(self.sites)]
+                timestamp = datetime.fromtimestamp(wall_start + intended).isoformat()
+                try:
+                    for routing_key, body in create_meter_messages([site], timestamp=timestamp):
+                        channel.basic_publish(exchange='', routing_key=routing_key, body=body,
+                                              properties=message_properties(body))
+                except BackpressureTimeout:
+                    self.dropped += 1
+                    continue
+                self.send_lag.record(int((time.perf_counter() - start - intended) * 1_000_000))
+                self.sent += 1
+        finally:
+            self.seconds = time.perf_counter() - start
+            connection.close()
+
+
+class ResultsFollower:
+    """
+    Reads the rows appended to the results store and records their age
+
+    Rows with timestamps before the start of the run are not counted.
+
+    Args:
+        store: Results store the consumers write to
+        wall_start: time.time() at the start of the run
+    """
+
+    def __init__(self, store: ResultsStore, wall_start: float):
+        self.store = store
+        # Compared as datetimes: the first reading's timestamp is exactly this one
+        self.since = datetime.fromtimestamp(wall_start)
+        self.written = 0
+        self.end_to_end = Histogram()
+        # Start at the end of the store: only rows of this run are counted
+        _, self._cursor = store.read_since(0, 1)
+
+    def read(self) -> None:
+        rows, self._cursor = self.store.read_since(self._cursor, FOLLOW_LIMIT)
+        now = time.time()
+        for row in rows:
+            timestamp = row['timestamp']
+            if not isinstance(timestamp, datetime):
+                timestamp = datetime.fromisoformat(timestamp)
+            if timestamp >= self.since:
+                self.written += 1
+                self.end_to_end.record(int((now - timestamp.timestamp()) * 1_000_000))
+
+    def run(self, expected: List[Optional[int]], deadline: List[float], stop: threading.Event) -> None:
+        """
+        Follow the store until the expected rows arrived or the deadline passed
+
+        Args:
+            expected: One-element list holding the number of rows to wait for,
+                None until the publisher has finished
+            deadline: One-element list holding the perf_counter deadline
+            stop: Set to stop early
+        """
+        while not stop.is_set() and time.perf_counter() < deadline[0]:
+            try:
+                self.read()
+            except Exception as e:
+                logger.warning(f"Error reading results store: {e}")
+            if expected[0] is not None and self.written >= expected[0]:
+                return
+            stop.wait(FOLLOW_INTERVAL)
+
+
+class Poller:
+    """
+    Open-loop poller of one API path on its own keep-alive connection
+
+    Args:
+        url: Base URL of the server, e.g. http://127.0.0.1:5000
+        path: Path to request
+        rate: Requests per second
+        duration: Seconds to poll for
+        offset: Seconds to shift the schedule by, so pollers do not fire together
+    """
+
+    def __init__(self, url: str, path: str, rate: float, duration: float, offset: float = 0.0):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=HTTP_TIMEOUT)
+        self.path = path
+        self.rate = rate
+        self.total = int(rate * duration)
+        self.offset = offset
+        self.latency = Histogram()
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def run(self, start: float, stop: threading.Event) -> None:
+        etag = None
+        try:
+            for index in range(self.total):
+                if stop.is_set():
+                    break
+                intended = self.offset + index / self.rate
+                _wait_until(start, intended, stop)
+                try:
+                    self.connection.request('GET', self.path, headers={'If-None-Match': etag} if etag else {})
+                    response = self.connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    # The connection reopens on the next request
+                    self.errors += 1
+                    self.connection.close()
+                    continue
+                etag = response.getheader('ETag') or etag
+                self.statuses[response.status] += 1
+                self.latency.record(int((time.perf_counter() - start - intended) * 1_000_000))
+        finally:
+            self.connection.close()
+
+
+def serve_app():
+    """
+    Serve the Flask app on a free local port in a background thread
+
+    Rate limits are switched off: every poller comes from the same address.
+
+    Returns:
+        (server, base URL); call server.shutdown() when done
+    """
+    from werkzeug.serving import make_server
+    import app as server_app
+
+    server_app.limiter.enabled = False
+    server = make_server('127.0.0.1', 0, server_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def run_load(rate: float, duration: float, pollers: int = 0, poll_rate: float = 1.0,
+             url: Optional[str] = None, path: str = '/results/latest', consumers: bool = True,
+             fleet_size: Optional[int] = None, drain: float = 10.0) -> Dict:
+    """
+    Run a load test and report throughput and latency percentiles
+
+    Args:
+        rate: Meter readings per second (0 for none)
+        duration: Seconds to generate load for
+        pollers: Number of concurrent HTTP pollers
+        poll_rate: Requests per second of each poller
+        url: Server to poll; None serves the app in this process
+        path: Path the pollers request
+        consumers: Run the PV consumers in this process
+        fleet_size: Number of sites (defaults to config.FLEET_SIZE)
+        drain: Seconds to wait after the load for the remaining readings to be written
+
+    Returns:
+        Report with 'meter' and 'http' sections; latencies in milliseconds
+    """
+    fleet_size = fleet_size or config.FLEET_SIZE
+    # Same fleet and queue sharding as the consumers, in this process or the server
+    sites = build_fleet(fleet_size, min(config.PV_CONSUMERS, fleet_size), config.FLEET_SEED)
+
+    manager = None
+    server = None
+    if consumers and rate > 0:
+        manager = SimulationManager()
+        manager.start(fleet_size, meters=False)
+    if pollers and url is None:
+        server, url = serve_app()
+
+    store = get_results_store()
+    store.initialize()
+    stop = threading.Event()
+    wall_start = time.time()
+    start = time.perf_counter()
+    meters = MeterLoad(sites, rate, duration) if rate > 0 else None
+    follower = ResultsFollower(store, wall_start) if meters else None
+    poll = [Poller(url, path, poll_rate, duration, offset=index / (pollers * poll_rate))
+            for index in range(pollers)]
+
+    expected: List[Optional[int]] = [None]
+    deadline = [float('inf')]
+    threads = [threading.Thread(target=poller.run, args=(start, stop), daemon=True) for poller in poll]
+    if meters:
+        threads.append(threading.Thread(target=meters.run, args=(wall_start, start, stop), daemon=True))
+        follow_thread = threading.Thread(target=follower.run, args=(expected, deadline, stop), daemon=True)
+        follow_thread.start()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if meters:
+            deadline[0] = time.perf_counter() + drain
+            expected[0] = meters.sent
+            follow_thread.join()
+    finally:
+        stop.set()
+        if manager is not None:
+            manager.stop()
+        if server is not None:
+            server.shutdown()
+
+    report = {'duration': duration}
+    if meters:
+        report['meter'] = {
+            'target_rate': rate,
+            'sent': meters.sent,
+            'send_rate': round(meters.sent / meters.seconds, 1) if meters.seconds else 0.0,
+            'dropped': meters.dropped,
+            'written': follower.written,
+            'unwritten': max(meters.sent - follower.written, 0),
+            'send_lag_ms': meters.send_lag.summary(),
+            'end_to_end_ms': follower.end_to_end.summary(),
+        }
+    if pollers:
+        latency = Histogram()
+        statuses: Counter = Counter()
+        for poller in poll:
+            latency.merge(poller.latency)
+            statuses.update(poller.statuses)
+        requests = sum(statuses.values())
+        report['http'] = {
+            'url': url + path,
+            'pollers': pollers,
+            'target_rate': pollers * poll_rate,
+            'requests': requests,
+            'rate': round(requests / duration, 1),
+            'status': {str(status): count for status, count in sorted(statuses.items())},
+            'errors': sum(poller.errors for poller in poll),
+            'latency_ms': latency.summary(),
+        }
+    return report
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the load generator's options to a parser (also used by cli.py)"""
+    parser.add_argument('--rate', type=float, default=100.0, help="Meter readings per second (0 for none)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to generate load for")
+    parser.add_argument('--pollers', type=int, default=0, help="Concurrent HTTP pollers")
+    parser.add_argument('--poll-rate', type=float, default=1.0, help="Requests per second of each poller")
+    parser.add_argument('--url', help="Server to poll (default: serve the app in this process)")
+    parser.add_argument('--path', default='/results/latest', help="Path the pollers request")
+    parser.add_argument('--no-consumers', dest='consumers', action='store_false',
+                        help="Leave the readings to a running server's consumers")
+    parser.add_argument('--fleet-size', type=int, help="Number of sites (defaults to FLEET_SIZE)")
+    parser.add_argument('--drain', type=float, default=10.0,
+                        help="Seconds to wait for the remaining readings to be written")
+
+
+def run_from_args(args: argparse.Namespace) -> int:
+    # The server and workers log to stdout, which is where the report goes
+    logging.disable(logging.INFO)
+    report = run_load(args.rate, args.duration, args.pollers, args.poll_rate, args.url, args.path,
+                      args.consumers, args.fleet_size, args.drain)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    sys.exit(run_from_args(parser.parse_args()))
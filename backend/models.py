@@ -2,8 +2,23 @@
 Data validation models for PV Simulator
 """
 from datetime import datetime
+from typing import Dict, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, field_validator
 
+# Inclusive (low, high) bounds in kW, shared by the models and validate_batch
+METER_BOUNDS: Tuple[float, float] = (0.0, 20.0)
+PV_BOUNDS: Tuple[float, float] = (0.0, 10.0)
+NET_BOUNDS: Tuple[float, float] = (-20.0, 10.0)  # Negative when consuming from the grid
+
+FIELD_BOUNDS: Dict[str, Tuple[float, float]] = {
+    'meter': METER_BOUNDS,
+    'pv': PV_BOUNDS,
+    'net': NET_BOUNDS,
+}
+
 
 class MeterReading(BaseModel):
     timestamp: datetime
@@ -12,7 +27,7 @@ class MeterReading(BaseModel):
     @field_validator('meter')
     @classmethod
     def validate_meter(cls, v):
-        if not 0 <= v <= 20:
+        if not METER_BOUNDS[0] <= v <= METER_BOUNDS[1]:
             raise ValueError('Meter value must be between 0 and 20 kW')
         return round(v, 2)
 
@@ -26,13 +41,38 @@ class PVData(BaseModel):
     @field_validator('pv')
     @classmethod
     def validate_pv(cls, v):
-        if not 0 <= v <= 10:
+        if not PV_BOUNDS[0] <= v <= PV_BOUNDS[1]:
             raise ValueError('PV value must be between 0 and 10 kW')
         return round(v, 2)
     
     @field_validator('net')
     @classmethod
     def validate_net(cls, v):
-        if not -20 <= v <= 10:  # Can be negative (consuming from grid) or positive (feeding to grid)
+        if not NET_BOUNDS[0] <= v <= NET_BOUNDS[1]:  # Can be negative (consuming from grid) or positive (feeding to grid)
             raise ValueError('Net value must be between -20 and 10 kW')
         return round(v, 2)
+
+
+def validate_batch(**columns: ArrayLike) -> Dict[str, np.ndarray]:
+    """
+    Vectorized counterpart of the field validators for whole batches
+    
+    The workers use this instead of building a model per message; the models
+    remain for data crossing the REST boundary.
+    
+    Args:
+        columns: Values keyed by field name ('meter', 'pv' or 'net'), as
+            arrays of equal length or scalars
+    
+    Returns:
+        Boolean mask of out-of-range rows (NaN included) for every field
+        that has any, so an empty dict means the batch is valid
+    """
+    violations = {}
+    for field, values in columns.items():
+        low, high = FIELD_BOUNDS[field]
+        values = np.asarray(values, dtype=np.float64)
+        invalid = ~((values >= low) & (values <= high))
+        if invalid.any():
+            violations[field] = invalid
+    return violations
@@ -0,0 +1,182 @@
+"""
+In-memory ring buffer of the most recent results
+"""
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import config
+from storage import ResultsStore, ResultRow, result_records, to_epoch_micros, range_mask
+
+logger = logging.getLogger(__name__)
+
+
+class ResultRingBuffer:
+    """
+    Fixed-capacity buffer of the newest results, held in parallel NumPy arrays
+
+    Rows written through write() are appended to the store and the buffer in
+    one step, so read endpoints can serve recent data without parsing the
+    file. The buffer remembers the store cursor (see ResultsStore.read_since)
+    and ETag it is in sync with; when another process or a backfill has
+    appended to the store, the next read catches up by reading only the new
+    rows. A change that leaves the cursor where it was (late rows for an
+    older partition, retention) reloads the buffer. A capacity of 0
+    disables the buffer and every read returns None.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # ISO timestamps are kept as written so responses match the store
+        self._timestamps = np.empty(capacity, dtype=object)
+        self._micros = np.zeros(capacity, dtype=np.int64)
+        self._meter = np.zeros(capacity, dtype=np.float64)
+        self._pv = np.zeros(capacity, dtype=np.float64)
+        self._net = np.zeros(capacity, dtype=np.float64)
+        self._end = 0  # Slot of the next write
+        self._size = 0
+        self._total_rows = 0
+        self._path: Optional[str] = None
+        self._cursor = 0
+        self._etag: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _clear(self) -> None:
+        self._end = 0
+        self._size = 0
+        self._total_rows = 0
+        self._path = None
+        self._cursor = 0
+        self._etag = None
+
+    def _push(self, rows: List[ResultRow]) -> None:
+        rows = rows[-self.capacity:]
+        if not rows:
+            return
+        timestamps, meter, pv, net = zip(*rows)
+        slots = (self._end + np.arange(len(rows))) % self.capacity
+        self._timestamps[slots] = timestamps
+        self._micros[slots] = to_epoch_micros(timestamps)
+        self._meter[slots] = meter
+        self._pv[slots] = pv
+        self._net[slots] = net
+        self._end = int(slots[-1] + 1) % self.capacity
+        self._size = min(self._size + len(rows), self.capacity)
+
+    def _catch_up(self, store: ResultsStore) -> None:
+        """Bring the buffer in sync with the store (lock must be held)"""
+        end = store.end_cursor()
+        etag = store.etag()
+        if store.path == self._path and end == self._cursor and etag == self._etag:
+            return
+        # The store changed without moving its end: rows were added or removed before it
+        restart = store.path != self._path or end < self._cursor or end == self._cursor
+        if restart:
+            # Different or truncated store: start over from its newest rows
+            self._clear()
+            if not store.exists():
+                return
+            self._path = store.path
+
+        rows, self._cursor = store.read_since(self._cursor, self.capacity)
+        self._etag = etag
+        net_key = 'sum' if rows and 'sum' in rows[0] else 'net'
+        self._push([
+            (r['timestamp'], float(r['meter']), float(r['pv']), float(r[net_key]))
+            for r in rows
+        ])
+        if restart or len(rows) == self.capacity:
+            # Older rows were not read, so take the total from the store
+            self._total_rows = store.count()
+        else:
+            self._total_rows += len(rows)
+        logger.debug(f"Ring buffer caught up with {len(rows)} rows from {store.path}")
+
+    def warm(self, store: ResultsStore) -> None:
+        """Load the newest rows of the store"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._clear()
+            self._catch_up(store)
+        logger.info(f"Ring buffer warmed with {self._size} rows from {store.path}")
+
+    def write(self, store: ResultsStore, rows: Iterable[ResultRow], sync: bool = False) -> int:
+        """
+        Append rows to the store and, if it is in sync, to the buffer
+
+        Returns:
+            Number of bytes appended to the store
+        """
+        rows = list(rows)
+        if not self.enabled:
+            return store.append(rows, sync=sync)
+        with self._lock:
+            in_sync = (store.path == self._path and store.end_cursor() == self._cursor
+                       and store.etag() == self._etag)
+            written = store.append(rows, sync=sync)
+            if in_sync:
+                self._push(rows)
+                self._cursor = store.end_cursor()
+                self._etag = store.etag()
+                self._total_rows += len(rows)
+        return written
+
+    def _records(self, slots: np.ndarray) -> List[Dict]:
+        return result_records(self._timestamps[slots].tolist(), self._meter[slots], self._pv[slots], self._net[slots])
+
+    def _slots(self) -> np.ndarray:
+        """Buffer slots of all held rows, oldest first"""
+        return (self._end - self._size + np.arange(self._size)) % self.capacity
+
+    def latest(self, store: ResultsStore, n: int) -> Optional[List[Dict]]:
+        """
+        The newest n rows of the store, oldest first
+
+        Returns:
+            Records, or None if the buffer cannot answer (disabled or too small)
+        """
+        if not self.enabled or n > self.capacity:
+            return None
+        with self._lock:
+            self._catch_up(store)
+            slots = self._slots()[max(0, self._size - n):]
+            return self._records(slots)
+
+    def read_range(self, store: ResultsStore, start_us: Optional[int] = None,
+                   end_us: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Rows with start_us <= timestamp < end_us, if the buffer holds all of them
+
+        Rows are appended in time order, so the buffer covers the range when it
+        holds the whole store or its oldest row is older than start_us.
+
+        Returns:
+            Records, or None if the range reaches past the buffered rows
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._catch_up(store)
+            slots = self._slots()
+            holds_all = self._size == self._total_rows
+            if not holds_all and (start_us is None or self._size == 0 or self._micros[slots[0]] >= start_us):
+                return None
+            return self._records(slots[range_mask(self._micros[slots], start_us, end_us)])
+
+    def total_rows(self, store: ResultsStore) -> Optional[int]:
+        """Number of rows in the store, or None if the buffer is disabled"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._catch_up(store)
+            return self._total_rows
+
+
+recent_results = ResultRingBuffer(config.RING_BUFFER_SIZE)
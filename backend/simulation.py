@@ -1,23 +1,536 @@
 """
 Simulation management for PV Simulator
 """
-import os
-import csv
 import json
 import time
 import threading
 import logging
-from datetime import datetime
-from typing import List
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
-import pika
 
 from config import config
-from models import MeterReading, PVData
-from utils import get_rabbitmq_connection, pv_profile
+from models import validate_batch
+from numpy.typing import ArrayLike
+from utils import get_rabbitmq_connection, pv_output, pv_output_scalar, fractional_hours, current_profile_table
+from storage import get_results_store, to_epoch_micros, from_epoch_micros, ResultRow, ResultsStore
+from broadcast import broadcaster
+from ring_buffer import recent_results
+from counters import pipeline_counters
+from latency import latency_histograms
+from transport import get_in_process_broker, BackpressureTimeout
+from fleet import build_fleet, shard_queue, sites_by_queue, Site
+from wire import WIRE_FORMATS, CONTENT_TYPE_BINARY, READING_STRUCT, encode_frame, decode_frame, content_type_of, message_properties
 
 logger = logging.getLogger(__name__)
 
+# A decoded meter reading: (ISO timestamp, meter, site PV capacity)
+MeterSample = Tuple[str, float, float]
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def open_connection():
+    """
+    Open a blocking connection on the configured transport (config.TRANSPORT)
+    
+    Both transports expose the same pika-style connection and channel API.
+    """
+    if config.TRANSPORT == 'inprocess':
+        return get_in_process_broker().connect()
+    if config.TRANSPORT != 'amqp':
+        raise ValueError(f"Unknown transport: {config.TRANSPORT}")
+    return get_rabbitmq_connection()
+
+
+def create_meter_messages(sites: Sequence[Site], wire_format: Optional[str] = None,
+                          frame_size: Optional[int] = None,
+                          timestamp: Optional[str] = None) -> List[Tuple[str, Union[str, bytes]]]:
+    """
+    Generate one random household meter reading per site
+    
+    Args:
+        sites: Sites to generate readings for
+        wire_format: 'json' or 'binary' (defaults to config.WIRE_FORMAT)
+        frame_size: Readings per binary frame (defaults to config.WIRE_FRAME_SIZE)
+        timestamp: Naive ISO timestamp of the readings (defaults to now)
+    
+    Returns:
+        (routing key, message) pairs. JSON messages are strings with ISO
+        timestamp, meter value in kW and meter ID; binary messages are bytes
+        frames of readings that share a routing key (see wire.py)
+    """
+    wire_format = wire_format or config.WIRE_FORMAT
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown wire format: {wire_format}")
+    values = np.round(np.random.uniform(0.5, 10.0, size=len(sites)), 2)
+    timestamp = timestamp or datetime.now().isoformat()
+    
+    # Validate data
+    if validate_batch(meter=values):
+        raise ValueError('Meter value must be between 0 and 20 kW')
+    
+    if wire_format == 'binary':
+        return _create_meter_frames(sites, values, timestamp, frame_size or config.WIRE_FRAME_SIZE)
+    
+    messages = []
+    for site, value in zip(sites, values.tolist()):
+        msg = json.dumps({'timestamp': timestamp, 'meter': value, 'meter_id': site.meter_id})
+        messages.append((site.routing_key, msg))
+    return messages
+
+
+def _create_meter_frames(sites: Sequence[Site], values: np.ndarray, timestamp: str,
+                         frame_size: int) -> List[Tuple[str, bytes]]:
+    """Pack readings into binary frames of up to frame_size readings per routing key"""
+    timestamp_us = int(to_epoch_micros([timestamp])[0])
+    meter_ids = np.fromiter((site.meter_id for site in sites), dtype=np.uint32, count=len(sites))
+    positions: Dict[str, List[int]] = {}
+    for position, site in enumerate(sites):
+        positions.setdefault(site.routing_key, []).append(position)
+    
+    messages = []
+    for routing_key, indices in positions.items():
+        for first in range(0, len(indices), frame_size):
+            chunk = indices[first:first + frame_size]
+            messages.append((routing_key, encode_frame(timestamp_us, meter_ids[chunk], values[chunk])))
+    return messages
+
+
+def check_timestamp(timestamp: object) -> str:
+    """
+    Return a reading's timestamp if the batch computation can parse it
+    
+    Raises:
+        ValueError: If it is not a naive ISO-8601 timestamp (see to_epoch_micros)
+    """
+    if not isinstance(timestamp, str) or np.isnat(np.datetime64(timestamp, 'us')):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    return timestamp
+
+
+def decode_meter_message(body: bytes, capacities: Optional[Dict[int, float]] = None) -> MeterSample:
+    """
+    Decode a meter message and look up the PV capacity of its site
+    
+    Args:
+        body: JSON encoded meter reading
+        capacities: PV capacity in kW by meter ID (readings without a known
+            meter ID use the reference household capacity)
+    
+    Returns:
+        (timestamp, meter, capacity) of the reading
+    
+    Raises:
+        ValueError: If the message or its timestamp is malformed
+    """
+    data = json.loads(body)
+    capacity = config.PV_CAPACITY
+    if capacities and 'meter_id' in data:
+        capacity = capacities.get(int(data['meter_id']), config.PV_CAPACITY)
+    return check_timestamp(data['timestamp']), float(data['meter']), capacity
+
+
+def decode_meter_frame(body: bytes, capacities: Optional[Dict[int, float]] = None) -> List[MeterSample]:
+    """
+    Decode a binary meter frame and look up the PV capacity of every site
+    
+    Args:
+        body: Frame of packed readings (see wire.py)
+        capacities: PV capacity in kW by meter ID
+    
+    Returns:
+        (timestamp, meter, capacity) of every reading in the frame
+    """
+    capacities = capacities or {}
+    if len(body) == READING_STRUCT.size:
+        # A single reading is cheaper to unpack without NumPy
+        timestamp_us, meter_id, meter = READING_STRUCT.unpack(body)
+        timestamp = (EPOCH + timedelta(microseconds=timestamp_us)).isoformat()
+        return [(timestamp, round(meter, 2), capacities.get(meter_id, config.PV_CAPACITY))]
+    
+    records = decode_frame(body)
+    timestamps = from_epoch_micros(records['timestamp']).tolist()
+    # Undo the float32 rounding of the 2-decimal meter values
+    meter = np.round(records['meter'].astype(np.float64), 2).tolist()
+    capacity = [capacities.get(meter_id, config.PV_CAPACITY) for meter_id in records['meter_id'].tolist()]
+    return list(zip(timestamps, meter, capacity))
+
+
+def decode_meter_samples(body: bytes, content_type: Optional[str],
+                         capacities: Optional[Dict[int, float]] = None) -> List[MeterSample]:
+    """Decode a meter message in the format given by its content type (JSON by default)"""
+    if content_type == CONTENT_TYPE_BINARY:
+        return decode_meter_frame(body, capacities)
+    return [decode_meter_message(body, capacities)]
+
+
+def _record_dwell(samples: Sequence[MeterSample]) -> None:
+    """Record the age of a decoded message (the readings of a frame share a timestamp)"""
+    if samples:
+        latency_histograms.record_age('dwell', samples[0][0])
+
+
+class RejectedReading(ValueError):
+    """A reading whose PV or net value failed validation"""
+
+
+def process_meter_message(body: bytes, capacities: Optional[Dict[int, float]] = None) -> ResultRow:
+    """
+    Decode a meter message and calculate the PV and net values for it
+    
+    Args:
+        body: JSON encoded meter reading
+        capacities: PV capacity in kW by meter ID
+    
+    Returns:
+        Validated (timestamp, meter, pv, net) result row
+    
+    Raises:
+        RejectedReading: If the PV or net value is out of range
+    """
+    timer = latency_histograms.start()
+    timestamp, meter, capacity = decode_meter_message(body, capacities)
+    timer = latency_histograms.lap('decode', timer)
+    
+    # Calculate PV based on current time
+    current_time = datetime.fromisoformat(timestamp)
+    hour = current_time.hour
+    minute = current_time.minute
+    pv = round(pv_output_scalar(hour, minute, capacity), 2)
+    
+    # Calculate net power (PV production - meter consumption)
+    # This represents net power fed back to grid (positive) or drawn from grid (negative)
+    total = round(pv - meter, 2)
+    timer = latency_histograms.lap('compute', timer)
+    
+    # Validate data
+    violations = validate_batch(pv=pv, net=total)
+    latency_histograms.lap('validate', timer)
+    latency_histograms.record_age('dwell', timestamp)
+    if violations:
+        raise RejectedReading(f"Out of range: {', '.join(violations)} (pv={pv}, net={total})")
+    
+    return timestamp, meter, pv, total
+
+
+def compute_results(timestamps: Sequence[str], meter: np.ndarray,
+                    capacity: Optional[ArrayLike] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized PV and net calculation for a batch of readings
+    
+    Args:
+        timestamps: ISO timestamps of the readings
+        meter: Meter values in kW
+        capacity: PV capacity in kW, scalar or one value per reading
+            (defaults to the reference household)
+    
+    Returns:
+        Rounded (pv, net) arrays
+    """
+    hours = fractional_hours(to_epoch_micros(timestamps))
+    pv = np.round(pv_output(hours, config.PV_CAPACITY if capacity is None else capacity), 2)
+    net = np.round(pv - meter, 2)
+    return pv, net
+
+
+def compute_result_rows(readings: Sequence[MeterSample]) -> List[Optional[ResultRow]]:
+    """
+    Compute and validate the result rows for a batch of decoded readings
+    
+    Args:
+        readings: (timestamp, meter, capacity) readings
+    
+    Returns:
+        One (timestamp, meter, pv, net) row per reading, or None where the
+        reading or its result failed validation
+    """
+    if not readings:
+        return []
+    timer = latency_histograms.start()
+    timestamps, meter, capacity = zip(*readings)
+    meter = np.asarray(meter, dtype=np.float64)
+    try:
+        pv, net = compute_results(timestamps, meter, np.asarray(capacity, dtype=np.float64))
+    except ValueError:
+        # One malformed timestamp fails the whole batch: reject only the readings that have one
+        return _compute_valid_rows(readings)
+    
+    rows: List[Optional[ResultRow]] = list(zip(timestamps, meter.tolist(), pv.tolist(), net.tolist()))
+    timer = latency_histograms.lap('compute', timer)
+    
+    # Validate the whole batch at once and drop the out-of-range rows
+    violations = validate_batch(pv=pv, net=net)
+    if violations:
+        invalid = np.logical_or.reduce(list(violations.values()))
+        for index in np.flatnonzero(invalid).tolist():
+            fields = [field for field, mask in violations.items() if mask[index]]
+            timestamp, meter_value, pv_value, net_value = rows[index]
+            logger.error(f"Rejected reading at {timestamp}: {', '.join(fields)} out of range "
+                         f"(meter={meter_value}, pv={pv_value}, net={net_value})")
+            rows[index] = None
+    latency_histograms.lap('validate', timer)
+    return rows
+
+
+def _compute_valid_rows(readings: Sequence[MeterSample]) -> List[Optional[ResultRow]]:
+    """compute_result_rows for a batch with malformed timestamps, which get None"""
+    valid = []
+    for index, reading in enumerate(readings):
+        try:
+            check_timestamp(reading[0])
+            valid.append(index)
+        except ValueError:
+            logger.error(f"Rejected reading with invalid timestamp {reading[0]!r}")
+    if len(valid) == len(readings):
+        raise ValueError("Batch failed although every timestamp is valid")
+    rows: List[Optional[ResultRow]] = [None] * len(readings)
+    for index, row in zip(valid, compute_result_rows([readings[index] for index in valid])):
+        rows[index] = row
+    return rows
+
+
+class BatchWriter:
+    """
+    Buffers decoded readings and writes their results to the store in batches
+    
+    PV and net values are computed for the whole batch at once. A batch is
+    written with a single append and fsync, then every message in it is
+    acknowledged with one multi-message ack. All readings of a multi-reading
+    message go into the same batch, so each message is settled exactly once.
+    """
+    
+    def __init__(self, store: ResultsStore, channel, batch_size: int, linger: float):
+        self._store = store
+        self._channel = channel
+        self._batch_size = batch_size
+        self._linger = linger
+        self._readings: List[MeterSample] = []
+        self._tags: List[int] = []
+        self._first_added = 0.0
+    
+    def add(self, reading: MeterSample, delivery_tag: int) -> None:
+        """Buffer a reading, writing the batch once it is full"""
+        self.add_all([reading], delivery_tag)
+    
+    def add_all(self, readings: Sequence[MeterSample], delivery_tag: int) -> None:
+        """Buffer all readings of one message, writing the batch once it is full"""
+        if not self._readings:
+            self._first_added = time.monotonic()
+        self._readings.extend(readings)
+        self._tags.extend([delivery_tag] * len(readings))
+        if len(self._readings) >= self._batch_size:
+            self.flush()
+    
+    def flush_if_due(self) -> None:
+        """Write the batch if its oldest reading has waited longer than the linger time"""
+        if self._readings and time.monotonic() - self._first_added >= self._linger:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Compute, write and acknowledge all buffered readings"""
+        if not self._readings:
+            return
+        readings, tags = self._readings, self._tags
+        self._readings, self._tags = [], []
+        self._commit(tags, compute_result_rows(readings))
+    
+    def close(self) -> None:
+        """Write everything still buffered before the consumer stops"""
+        self.flush()
+    
+    def _commit(self, tags: List[int], results: List[Optional[ResultRow]]) -> None:
+        """
+        Write the valid rows of a batch, then acknowledge its messages
+        
+        A message is rejected only if none of its readings is valid; invalid
+        readings in a frame with valid ones are dropped.
+        """
+        rows: List[ResultRow] = []
+        accepted = set()
+        last_tag = None
+        for tag, row in zip(tags, results):
+            if row is not None:
+                rows.append(row)
+                accepted.add(tag)
+                last_tag = tag
+        messages = list(dict.fromkeys(tags))
+        for tag in messages:
+            if tag not in accepted:
+                self._channel.basic_nack(delivery_tag=tag, requeue=False)
+        failures = len(results) - len(rows)
+        if not rows:
+            pipeline_counters.add(messages_consumed=len(messages), messages_nacked=len(messages),
+                                  validation_failures=failures)
+            return
+        
+        timer = latency_histograms.start()
+        try:
+            written = recent_results.write(self._store, rows, sync=True)
+        except Exception as e:
+            # The messages are valid, so hand them back to the broker for redelivery
+            logger.error(f"Error writing batch of {len(rows)} rows: {e}")
+            self._channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+            pipeline_counters.add(messages_consumed=len(messages), messages_nacked=len(messages),
+                                  validation_failures=failures)
+            return
+        timer = latency_histograms.lap('write', timer)
+        self._channel.basic_ack(delivery_tag=last_tag, multiple=True)
+        latency_histograms.lap('ack', timer)
+        pipeline_counters.record_write(len(rows), written)
+        pipeline_counters.add(messages_consumed=len(messages), messages_acked=len(accepted),
+                              messages_nacked=len(messages) - len(accepted), validation_failures=failures)
+        broadcaster.publish(rows)
+        logger.debug(f"Wrote batch of {len(rows)} rows")
+
+
+# PV capacity by meter ID of the current fleet, in a PV pool process
+_pool_capacities: Dict[int, float] = {}
+
+
+def _init_pv_process(settings: Dict[str, object], capacities: Dict[int, float]) -> None:
+    """Process pool initializer: adopt the server's settings and fleet"""
+    global _pool_capacities
+    for name, value in settings.items():
+        setattr(config, name, value)
+    _pool_capacities = capacities
+    current_profile_table()
+
+
+def create_pv_pool(processes: int, capacities: Dict[int, float]) -> ProcessPoolExecutor:
+    """
+    Start a pool of processes for decoding, computing and validating batches
+    
+    Pool processes are spawned rather than forked, so they do not inherit the
+    server's threads and locks.
+    
+    Args:
+        processes: Number of pool processes
+        capacities: PV capacity in kW by meter ID
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_pv_process,
+        initargs=(dict(vars(config)), capacities),
+    )
+
+
+def compute_message_rows(messages: Sequence[Tuple[bytes, Optional[str]]]) -> List[List[Optional[ResultRow]]]:
+    """
+    Decode, compute and validate a batch of raw meter messages in a pool process
+    
+    Args:
+        messages: (body, content type) of each meter message
+    
+    Returns:
+        The (timestamp, meter, pv, net) rows of each message, with None where
+        a reading failed validation; a message that could not be decoded
+        gets a single None
+    """
+    timer = latency_histograms.start()
+    readings: List[MeterSample] = []
+    counts: List[int] = []
+    for body, content_type in messages:
+        try:
+            # Decoding checks the timestamps, so a malformed one only rejects its own message
+            samples = decode_meter_samples(body, content_type, _pool_capacities)
+            _record_dwell(samples)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Error decoding message: {e}")
+            samples = []
+        readings.extend(samples)
+        counts.append(len(samples))
+    latency_histograms.lap('decode', timer)
+    
+    rows = iter(compute_result_rows(readings))
+    results = [[next(rows) for _ in range(count)] if count else [None] for count in counts]
+    # Pool processes have no later chance to share what they recorded
+    latency_histograms.flush()
+    return results
+
+
+class ProcessBatchWriter(BatchWriter):
+    """
+    BatchWriter that decodes, computes and validates its batches in a process pool
+    
+    Raw messages are buffered, and every full (or lingering) batch is
+    handed to a pool process, so JSON decoding and validation run on all
+    cores instead of under the GIL. The consumer thread stays the single
+    writer: finished batches are written and acknowledged in the order they
+    were submitted, so the store keeps delivery order. Once more than
+    max_pending batches are in flight the consumer waits for the oldest one.
+    
+    Args:
+        pool: Pool created by create_pv_pool
+        max_pending: Batches that may be in flight before the consumer blocks
+    """
+    
+    def __init__(self, store: ResultsStore, channel, batch_size: int, linger: float,
+                 pool: ProcessPoolExecutor, max_pending: int):
+        super().__init__(store, channel, batch_size, linger)
+        self._pool = pool
+        self._max_pending = max_pending
+        self._pending: Deque[Tuple[Future, List[int]]] = deque()
+    
+    def flush(self) -> None:
+        """Submit the buffered messages to the pool and write any finished batches"""
+        if self._readings:
+            bodies, tags = self._readings, self._tags
+            self._readings, self._tags = [], []
+            self._pending.append((self._pool.submit(compute_message_rows, bodies), tags))
+        self._drain(self._max_pending)
+    
+    def flush_if_due(self) -> None:
+        super().flush_if_due()
+        self._drain(self._max_pending)
+    
+    def close(self) -> None:
+        """Submit the buffered messages and wait until every batch is written"""
+        self.flush()
+        self._drain(0)
+    
+    def _drain(self, keep: int) -> None:
+        """Write finished batches in submission order, waiting until at most keep are in flight"""
+        while self._pending and (len(self._pending) > keep or self._pending[0][0].done()):
+            future, tags = self._pending.popleft()
+            try:
+                results = future.result()
+            except Exception as e:
+                # The pool failed rather than the messages, so let the broker redeliver them
+                logger.error(f"Error computing batch of {len(tags)} messages: {e}")
+                self._channel.basic_nack(delivery_tag=tags[-1], multiple=True, requeue=True)
+                pipeline_counters.add(messages_consumed=len(tags), messages_nacked=len(tags))
+                continue
+            self._commit(
+                [tag for tag, rows in zip(tags, results) for _ in rows],
+                [row for rows in results for row in rows]
+            )
+
+
+class ConsumerStats:
+    """Throughput counters of a single PV consumer"""
+    
+    def __init__(self, index: int, queue: str, sites: int):
+        self.index = index
+        self.queue = queue
+        self.sites = sites
+        self.messages = 0
+        self.started = time.monotonic()
+    
+    def as_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            'consumer': self.index,
+            'queue': self.queue,
+            'sites': self.sites,
+            'messages': self.messages,
+            'messages_per_second': round(self.messages / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
 
 class SimulationManager:
     """Manages the PV simulation with thread-safe operations"""
@@ -27,10 +540,22 @@ class SimulationManager:
         self._shutdown = threading.Event()
         self._threads: List[threading.Thread] = []
         self._lock = threading.Lock()
-        
-    def start(self) -> bool:
+        self._sites: List[Site] = []
+        self._capacities: Dict[int, float] = {}
+        self._consumer_stats: List[ConsumerStats] = []
+        self._pv_pool: Optional[ProcessPoolExecutor] = None
+    
+    def start(self, fleet_size: Optional[int] = None, consumers: Optional[int] = None,
+              meters: bool = True) -> bool:
         """
-        Start the simulation with meter and PV worker threads
+        Start the simulation with a meter thread and a pool of PV worker threads
+        
+        Args:
+            fleet_size: Number of simulated sites (defaults to config.FLEET_SIZE)
+            consumers: Number of PV consumer workers (defaults to config.PV_CONSUMERS,
+                capped at the fleet size)
+            meters: Whether to run the meter thread; without it the PV workers
+                consume readings published by someone else (e.g. loadgen.py)
         
         Returns:
             True if simulation started successfully, False if already running
@@ -39,19 +564,39 @@ class SimulationManager:
             if self._running.is_set():
                 return False
             
+            # Build the PV lookup table (if enabled) before the workers need it
+            current_profile_table()
+            
+            fleet_size = fleet_size or config.FLEET_SIZE
+            consumers = min(consumers or config.PV_CONSUMERS, fleet_size)
+            self._sites = build_fleet(fleet_size, consumers, config.FLEET_SEED)
+            self._capacities = {site.meter_id: site.capacity_kw for site in self._sites}
+            groups = sites_by_queue(self._sites)
+            queues = [shard_queue(index, consumers) for index in range(consumers)]
+            self._consumer_stats = [
+                ConsumerStats(index, queue, len(groups.get(queue, [])))
+                for index, queue in enumerate(queues)
+            ]
+            
+            if config.BATCH_MODE and config.PV_PROCESSES > 0:
+                self._pv_pool = create_pv_pool(config.PV_PROCESSES, self._capacities)
+            
             self._running.set()
             self._shutdown.clear()
             
             # Start threads
             meter_thread = threading.Thread(target=self._meter_worker, daemon=False)
-            pv_thread = threading.Thread(target=self._pv_worker, daemon=False)
+            pv_threads = [
+                threading.Thread(target=self._pv_worker, args=(stats,), daemon=False)
+                for stats in self._consumer_stats
+            ]
             
-            self._threads = [meter_thread, pv_thread]
+            self._threads = [meter_thread, *pv_threads] if meters else pv_threads
             
             for thread in self._threads:
                 thread.start()
             
-            logger.info("Simulation started successfully")
+            logger.info(f"Simulation started successfully ({fleet_size} sites, {consumers} consumers)")
             return True
     
     def stop(self) -> bool:
@@ -73,6 +618,9 @@ class SimulationManager:
                 thread.join(timeout=10)
             
             self._threads.clear()
+            if self._pv_pool is not None:
+                self._pv_pool.shutdown(wait=True)
+                self._pv_pool = None
             logger.info("Simulation stopped successfully")
             return True
     
@@ -81,104 +629,201 @@ class SimulationManager:
         """Check if simulation is currently running"""
         return self._running.is_set()
     
+    @property
+    def fleet_size(self) -> int:
+        """Number of sites in the current (or last) simulation run"""
+        return len(self._sites)
+    
+    def throughput(self) -> List[dict]:
+        """Messages processed and messages/s for each PV consumer"""
+        return [stats.as_dict() for stats in self._consumer_stats]
+    
     def _meter_worker(self):
-        """Meter thread: sends random values to RabbitMQ"""
+        """Meter thread: sends random values to the message transport"""
         try:
-            connection = get_rabbitmq_connection()
+            connection = open_connection()
             channel = connection.channel()
-            channel.queue_declare(queue=config.METER_QUEUE, durable=True)
+            for queue in sorted({site.routing_key for site in self._sites}):
+                channel.queue_declare(queue=queue, durable=True)
+            
+            batching = config.BATCH_MODE
+            if batching:
+                # One transaction per burst: the broker confirms it with a single round trip
+                channel.tx_select()
+            
+            logger.info(f"Meter worker started (batch mode: {batching})")
             
-            logger.info("Meter worker started")
+            pending: List[Tuple[str, str]] = []
+            first_pending = 0.0
+            next_reading = time.monotonic()
             
             while self._running.is_set():
                 try:
-                    value = round(np.random.uniform(0.5, 10.0), 2)
-                    timestamp = datetime.now().isoformat()
+                    now = time.monotonic()
+                    if now >= next_reading:
+                        if not pending:
+                            first_pending = now
+                        pending.extend(create_meter_messages(self._sites))
+                        next_reading = max(next_reading + config.METER_INTERVAL, now)
                     
-                    # Validate data
-                    reading = MeterReading(timestamp=datetime.fromisoformat(timestamp), meter=value)
-                    
-                    msg = json.dumps({'timestamp': timestamp, 'meter': value})
-                    channel.basic_publish(
-                        exchange='', 
-                        routing_key=config.METER_QUEUE, 
-                        body=msg, 
-                        properties=pika.BasicProperties(delivery_mode=2)
-                    )
-                    
-                    logger.debug(f"Sent meter reading: {value} kW")
-                    time.sleep(config.METER_INTERVAL)
+                    if pending and (
+                        not batching
+                        or len(pending) >= config.BATCH_SIZE
+                        or now - first_pending >= config.BATCH_LINGER
+                    ):
+                        self._publish(channel, pending, transactional=batching)
+                        pending = []
                     
+                    wake_at = next_reading
+                    if pending:
+                        wake_at = min(wake_at, first_pending + config.BATCH_LINGER)
+                    self._shutdown.wait(max(0.0, wake_at - time.monotonic()))
+                
+                except BackpressureTimeout as e:
+                    # The publish already waited for the consumers; pending holds only the unsent readings
+                    logger.warning(f"Meter readings held back, {len(pending)} pending: {e}")
                 except Exception as e:
                     logger.error(f"Error in meter worker: {e}")
                     time.sleep(1)
-                    
+            
+            latency_histograms.flush()
             connection.close()
             logger.info("Meter worker stopped")
         except Exception as e:
             logger.error(f"Meter worker error: {e}")
     
-    def _pv_worker(self):
+    @staticmethod
+    def _publish(channel, messages: List[Tuple[str, Union[str, bytes]]], transactional: bool = False) -> None:
+        """
+        Publish a burst of persistent meter messages, tagged with their content type
+        
+        With transactional set (tx_select on the channel) the burst is
+        committed as one transaction, which costs one round trip to the
+        broker instead of one per message, and the messages are removed from
+        the list once committed. The in-process broker has no transactions
+        and accepts each message as it is published: when it pushes back,
+        the accepted ones are removed, so the list holds only the messages
+        still to be sent and none is sent twice.
+        """
+        timer = latency_histograms.start()
+        sent = 0
+        try:
+            for routing_key, msg in messages:
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=routing_key,
+                    body=msg,
+                    properties=message_properties(msg)
+                )
+                sent += 1
+                timer = latency_histograms.lap('publish', timer)
+            if transactional:
+                channel.tx_commit()
+        except BackpressureTimeout:
+            del messages[:sent]
+            raise
+        except Exception:
+            if transactional and channel.is_open:
+                # Discard the uncommitted part of the burst, which is sent again in full
+                channel.tx_rollback()
+            raise
+        del messages[:]
+        logger.debug(f"Sent {sent} meter readings")
+    
+    def _pv_worker(self, stats: ConsumerStats):
         """PV Simulator thread: listens for meter values, calculates PV, writes results"""
         try:
-            connection = get_rabbitmq_connection()
+            connection = open_connection()
             channel = connection.channel()
-            channel.queue_declare(queue=config.METER_QUEUE, durable=True)
+            channel.queue_declare(queue=stats.queue, durable=True)
             
-            # Initialize CSV file with headers if not exists
-            if not os.path.exists(config.RESULTS_FILE):
-                with open(config.RESULTS_FILE, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['timestamp', 'meter', 'pv', 'sum'])
-                logger.info("Created new results CSV file")
+            # Initialize results store (CSV file with headers) if not exists
+            store = get_results_store()
+            store.initialize()
+            pipeline_counters.open()
             
-            logger.info("PV worker started")
+            batch_writer = None
+            pool = self._pv_pool
+            if config.BATCH_MODE:
+                channel.basic_qos(prefetch_count=config.PREFETCH_COUNT)
+                if pool is not None:
+                    batch_writer = ProcessBatchWriter(store, channel, config.BATCH_SIZE, config.BATCH_LINGER,
+                                                      pool, max_pending=2 * config.PV_PROCESSES)
+                else:
+                    batch_writer = BatchWriter(store, channel, config.BATCH_SIZE, config.BATCH_LINGER)
+            
+            logger.info(f"PV worker {stats.index} started on {stats.queue} (batch mode: {batch_writer is not None})")
             
             def callback(ch, method, properties, body):
                 if not self._running.is_set():
                     return
-                    
+                
+                failures = 0
                 try:
-                    data = json.loads(body)
-                    timestamp = data['timestamp']
-                    meter = float(data['meter'])
-                    
-                    # Calculate PV based on current time
-                    current_time = datetime.fromisoformat(timestamp)
-                    hour = current_time.hour
-                    minute = current_time.minute
-                    pv = round(pv_profile(hour, minute), 2)
+                    content_type = content_type_of(properties)
+                    if batch_writer is not None:
+                        if pool is not None:
+                            # Pool processes decode the raw message themselves
+                            batch_writer.add((body, content_type), method.delivery_tag)
+                        else:
+                            timer = latency_histograms.start()
+                            samples = decode_meter_samples(body, content_type, self._capacities)
+                            latency_histograms.lap('decode', timer)
+                            _record_dwell(samples)
+                            batch_writer.add_all(samples, method.delivery_tag)
+                        stats.messages += 1
+                        return
                     
-                    # Calculate net power (PV production - meter consumption)
-                    # This represents net power fed back to grid (positive) or drawn from grid (negative)
-                    total = round(pv - meter, 2)
+                    if content_type == CONTENT_TYPE_BINARY:
+                        timer = latency_histograms.start()
+                        samples = decode_meter_frame(body, self._capacities)
+                        latency_histograms.lap('decode', timer)
+                        _record_dwell(samples)
+                        results = compute_result_rows(samples)
+                        rows = [row for row in results if row is not None]
+                        failures = len(results) - len(rows)
+                        if not rows:
+                            raise RejectedReading("No valid readings in meter frame")
+                    else:
+                        try:
+                            rows = [process_meter_message(body, self._capacities)]
+                        except RejectedReading:
+                            failures = 1
+                            raise
+                    stats.messages += 1
                     
-                    # Validate data
-                    pv_data = PVData(
-                        timestamp=current_time,
-                        meter=meter,
-                        pv=pv,
-                        net=total
-                    )
+                    # Write to the configured results store
+                    timer = latency_histograms.start()
+                    written = recent_results.write(store, rows)
+                    latency_histograms.lap('write', timer)
+                    broadcaster.publish(rows)
                     
-                    # Write to CSV with file locking
-                    with open(config.RESULTS_FILE, 'a', newline='') as f:
-                        writer = csv.writer(f)
-                        writer.writerow([timestamp, meter, pv, total])
-                    
-                    logger.debug(f"Processed: meter={meter}, pv={pv}, sum={total}")
+                    row = rows[-1]
+                    logger.debug(f"Processed: meter={row[1]}, pv={row[2]}, sum={row[3]}")
+                    timer = latency_histograms.start()
                     ch.basic_ack(delivery_tag=method.delivery_tag)
-                    
+                    latency_histograms.lap('ack', timer)
+                    pipeline_counters.record_write(len(rows), written)
+                    pipeline_counters.add(messages_consumed=1, messages_acked=1, validation_failures=failures)
+                
                 except Exception as e:
                     logger.error(f"Error processing message: {e}")
                     ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    pipeline_counters.add(messages_consumed=1, messages_nacked=1, validation_failures=failures)
             
-            channel.basic_consume(queue=config.METER_QUEUE, on_message_callback=callback)
+            channel.basic_consume(queue=stats.queue, on_message_callback=callback)
             
+            time_limit = min(1, config.BATCH_LINGER) if batch_writer is not None else 1
             while self._running.is_set():
-                connection.process_data_events(time_limit=1)
-                
+                connection.process_data_events(time_limit=time_limit)
+                if batch_writer is not None:
+                    batch_writer.flush_if_due()
+            
+            if batch_writer is not None:
+                batch_writer.close()
+            latency_histograms.flush()
+            
             connection.close()
-            logger.info("PV worker stopped")
+            logger.info(f"PV worker {stats.index} stopped")
         except Exception as e:
             logger.error(f"PV worker error: {e}")
@@ -0,0 +1,1471 @@
+"""
+Results storage for PV Simulator
+"""
+import csv
+import fcntl
+import os
+import struct
+import zlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per backwards seek when tailing the results file
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Rows per chunk when streaming a store in column form
+CHUNK_ROWS = 100_000
+# Rows per chunk when streaming a store as records (e.g. to an HTTP response)
+RECORD_CHUNK_ROWS = 1000
+
+# Minimum bytes read by CsvResultsStore.read_since when a cursor is far behind
+SINCE_MIN_READ = TAIL_BLOCK_SIZE
+# Upper estimate of bytes per CSV row, used to bound read_since for larger limits
+SINCE_BYTES_PER_ROW = 128
+
+CSV_HEADER = ['timestamp', 'meter', 'pv', 'sum']
+
+# Sparse time index over the CSV results file: one entry every INDEX_STRIDE rows
+INDEX_STRIDE = 4096
+INDEX_SUFFIX = '.idx'
+INDEX_SCAN_BLOCK = 4 * 1024 * 1024
+INDEX_ENTRY_DTYPE = np.dtype([('timestamp', '<i8'), ('offset', '<i8')])
+INDEX_MAGIC = b'PVIDX001'
+INDEX_HEADER_SIZE = 16  # Magic plus int64 stride
+
+# Fixed-width binary record: epoch-micros timestamp and float32 readings (20 bytes)
+RESULT_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('meter', '<f4'),
+    ('pv', '<f4'),
+    ('net', '<f4'),
+])
+BINARY_MAGIC = b'PVRES001'
+BINARY_HEADER_SIZE = 16
+
+# Partitioned store: one binary segment per day, compacted once a later day is written
+PARTITION_PREFIX = 'results-'
+PARTITION_SUFFIX = '.bin'
+COMPACTED_SUFFIX = '.pvc'
+# Flocked by appends, compactions and retention in every process writing the directory.
+# It also holds a generation counter, bumped by changes the ETag would not see otherwise.
+PARTITION_LOCK_FILE = '.lock'
+GENERATION = struct.Struct('<q')
+DAY_MICROS = 86_400_000_000
+# Partitioned read_since cursors are day * CURSOR_DAY_SPAN + rows of that day already read
+CURSOR_DAY_SPAN = 1 << 32
+
+# Compacted partition: header, zlib-compressed column blocks, block index, trailer
+COMPACTED_MAGIC = b'PVCMP001'
+COMPACTED_HEADER_SIZE = 16
+COMPACTED_BLOCK_ROWS = 65536
+COMPACTED_LEVEL = 6
+COMPACTED_BLOCK_DTYPE = np.dtype([
+    ('first', '<i8'),  # First and last timestamp in the block
+    ('last', '<i8'),
+    ('offset', '<i8'),  # Position and compressed size of the block
+    ('size', '<i8'),
+    ('rows', '<i8'),
+])
+# Index offset, block count, id and row count of the segment compacted into the file, magic
+COMPACTED_TRAILER = struct.Struct('<qq8sq8s')
+
+# A result row as produced by the PV worker: (ISO timestamp, meter, pv, net)
+ResultRow = Tuple[str, float, float, float]
+Columns = Dict[str, np.ndarray]
+
+
+def read_header(path: str) -> List[str]:
+    """
+    Read the CSV header row of a results file
+
+    Args:
+        path: Path to the results CSV file
+
+    Returns:
+        Column names, or an empty list if the file is empty
+    """
+    with open(path, 'r', newline='') as f:
+        line = f.readline()
+    return next(csv.reader([line]), [])
+
+
+def tail_lines(path: str, n: int, block_size: int = TAIL_BLOCK_SIZE) -> List[bytes]:
+    """
+    Return the last n complete data lines of a CSV file
+
+    Reads backwards from EOF in blocks until n complete lines are buffered,
+    so the cost depends on n rather than on the size of the file. The header
+    line is never returned, and a trailing line without a newline (a row
+    still being written) is ignored.
+
+    Args:
+        path: Path to the results CSV file
+        n: Number of lines to return
+        block_size: Bytes read per backwards seek
+
+    Returns:
+        Raw lines without their line terminator, oldest first
+    """
+    if n <= 0:
+        return []
+
+    with open(path, 'rb') as f:
+        header_end = len(f.readline())
+        pos = f.seek(0, os.SEEK_END)
+        buf = b''
+        while pos > header_end and buf.count(b'\n') <= n:
+            read_size = min(block_size, pos - header_end)
+            pos -= read_size
+            f.seek(pos)
+            buf = f.read(read_size) + buf
+
+    lines = buf.split(b'\n')
+    # Last element is either empty (file ends with a newline) or a partial row
+    lines.pop()
+    # First element may start mid-line unless we reached the header
+    if pos > header_end and lines:
+        lines.pop(0)
+    lines = [line.rstrip(b'\r') for line in lines if line.strip()]
+    return lines[-n:]
+
+
+def tail_csv(path: str, n: int, block_size: int = TAIL_BLOCK_SIZE) -> List[Dict[str, str]]:
+    """
+    Return the last n rows of a results CSV file as dictionaries
+
+    Args:
+        path: Path to the results CSV file
+        n: Number of rows to return
+        block_size: Bytes read per backwards seek
+
+    Returns:
+        Rows keyed by the header columns, oldest first
+    """
+    header = read_header(path)
+    if not header:
+        return []
+    lines = [line.decode('utf-8') for line in tail_lines(path, n, block_size)]
+    return list(csv.DictReader(lines, fieldnames=header))
+
+
+def to_epoch_micros(timestamps: Sequence[str]) -> np.ndarray:
+    """Parse naive ISO-8601 timestamps into int64 microseconds since the epoch"""
+    return np.array(timestamps, dtype='datetime64[us]').astype(np.int64)
+
+
+def from_epoch_micros(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Format int64 epoch microseconds as ISO-8601 timestamp strings
+
+    Microseconds are included only when non-zero, as datetime.isoformat()
+    writes them, so timestamps read back from any backend look the same as
+    the ones the simulation wrote.
+    """
+    times = np.asarray(timestamps, dtype=np.int64).astype('datetime64[us]')
+    strings = np.datetime_as_string(times)
+    whole = times.astype(np.int64) % 1_000_000 == 0
+    if whole.any():
+        strings[whole] = np.datetime_as_string(times[whole], unit='s')
+    return strings
+
+
+def result_records(timestamps: Sequence[str], meter: ArrayLike, pv: ArrayLike, net: ArrayLike) -> List[Dict]:
+    """
+    Build records in the shape every results endpoint returns
+
+    Values are floats rounded to 2 decimals. The net value appears under both
+    'sum' (the CSV column the dashboard reads) and 'net'. Timestamps keep a
+    fractional part only when it is non-zero. Rows from the ring buffer, the
+    CSV file and the column backends all go through here, so a response does
+    not depend on which of them answered.
+    """
+    meter = np.round(np.asarray(meter, dtype=np.float64), 2).tolist()
+    pv = np.round(np.asarray(pv, dtype=np.float64), 2).tolist()
+    net = np.round(np.asarray(net, dtype=np.float64), 2).tolist()
+    return [
+        {'timestamp': t[:-7] if t.endswith('.000000') else t, 'meter': m, 'pv': p, 'sum': s, 'net': s}
+        for t, m, p, s in zip(timestamps, meter, pv, net)
+    ]
+
+
+def columns_to_records(columns: Columns) -> List[Dict]:
+    """Convert column arrays to the list-of-dicts shape served by the API"""
+    return result_records(from_epoch_micros(columns['timestamp']).tolist(),
+                          columns['meter'], columns['pv'], columns['net'])
+
+
+def _fsync(f) -> None:
+    """Flush a file object and force its contents to disk"""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(path: str) -> threading.Lock:
+    """Lock shared by every store instance writing to the same file"""
+    key = os.path.abspath(path)
+    with _write_locks_guard:
+        return _write_locks.setdefault(key, threading.Lock())
+
+
+def range_mask(timestamps: np.ndarray, start_us: Optional[int], end_us: Optional[int]) -> np.ndarray:
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start_us is not None:
+        mask &= timestamps >= start_us
+    if end_us is not None:
+        mask &= timestamps < end_us
+    return mask
+
+
+def empty_columns() -> Columns:
+    return {name: np.empty(0, dtype=RESULT_DTYPE[name]) for name in RESULT_DTYPE.names}
+
+
+def concat_columns(chunks: Sequence[Columns]) -> Columns:
+    """Concatenate column chunks into a single set of column arrays"""
+    if not chunks:
+        return empty_columns()
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in RESULT_DTYPE.names}
+
+
+def _lines_until(f, limit: int) -> Iterator[str]:
+    """Decoded lines of a binary file from its current position, up to limit bytes"""
+    for line in f:
+        if limit <= 0:
+            return
+        limit -= len(line)
+        yield line.decode('utf-8')
+
+
+def _rows_to_columns(rows: Sequence[ResultRow]) -> Columns:
+    """Convert result rows to column arrays"""
+    timestamps, meter, pv, net = zip(*rows)
+    return {
+        'timestamp': to_epoch_micros(timestamps),
+        'meter': np.asarray(meter),
+        'pv': np.asarray(pv),
+        'net': np.asarray(net),
+    }
+
+
+def _records_in_range(records: np.ndarray, start_us: Optional[int], end_us: Optional[int]) -> np.ndarray:
+    """Slice of time-ordered RESULT_DTYPE records with start_us <= timestamp < end_us"""
+    timestamps = records['timestamp']
+    lo = 0 if start_us is None else int(np.searchsorted(timestamps, start_us, side='left'))
+    hi = len(records) if end_us is None else int(np.searchsorted(timestamps, end_us, side='left'))
+    return records[lo:max(lo, hi)]
+
+
+def _csv_rows_to_columns(rows: Sequence[Dict[str, str]], net_key: str) -> Columns:
+    """Convert parsed CSV rows to column arrays"""
+    return {
+        'timestamp': to_epoch_micros([r['timestamp'] for r in rows]),
+        'meter': np.array([r['meter'] for r in rows], dtype=np.float64),
+        'pv': np.array([r['pv'] for r in rows], dtype=np.float64),
+        'net': np.array([r[net_key] for r in rows], dtype=np.float64),
+    }
+
+
+class SparseTimeIndex:
+    """
+    Sparse timestamp -> byte offset index for a CSV results file
+
+    Every `stride`-th data row gets an entry holding its timestamp and the
+    byte offset where its line starts. Entries are extended incrementally:
+    each sync only scans the bytes appended since the previous one. The
+    process appending to the CSV file persists them next to it
+    (`<results file>.idx`), replacing the whole file, so other processes
+    start from there. A missing, stale or inconsistent index is rebuilt
+    automatically.
+
+    Range lookups binary-search the entries, so a time-range query reads at
+    most `stride` rows beyond the matching ones. Rows are assumed to be
+    appended in time order.
+    """
+
+    def __init__(self, csv_path: str, stride: int = INDEX_STRIDE):
+        self.csv_path = csv_path
+        self.path = csv_path + INDEX_SUFFIX
+        self.stride = stride
+        self.entries = np.empty(0, dtype=INDEX_ENTRY_DTYPE)
+        self.rows = 0  # Complete data rows covered by the last sync
+        self.synced_size = 0  # Byte offset just past the last covered row
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def sync(self, persist: bool = False) -> None:
+        """
+        Bring the index up to date with the CSV file
+
+        Args:
+            persist: Write the entries to the index file if they changed; only
+                the writer of the CSV file does, so readers never race it
+        """
+        with self._lock:
+            if not os.path.exists(self.csv_path):
+                self._reset()
+                return
+            if not self._loaded:
+                self._load()
+            size = os.path.getsize(self.csv_path)
+            if size == self.synced_size:
+                return
+            entries = len(self.entries)
+            if size < self.synced_size or not self._last_entry_valid(size):
+                logger.info(f"Rebuilding results index {self.path}")
+                self._reset()
+                entries = -1
+            self._scan()
+            if persist and len(self.entries) != entries:
+                self._persist()
+
+    def byte_range(self, start_us: Optional[int], end_us: Optional[int]) -> Tuple[int, int]:
+        """
+        Byte range of the CSV file that contains every row in [start_us, end_us)
+
+        The range may include up to `stride` rows outside the time range on
+        either side, which callers filter out after parsing.
+        """
+        if len(self.entries) == 0:
+            return 0, 0
+        timestamps = self.entries['timestamp']
+        lo = 0
+        if start_us is not None:
+            lo = max(int(np.searchsorted(timestamps, start_us, side='right')) - 1, 0)
+        hi = self.synced_size
+        if end_us is not None:
+            upper = int(np.searchsorted(timestamps, end_us, side='left'))
+            if upper < len(self.entries):
+                hi = int(self.entries[upper]['offset'])
+        return int(self.entries[lo]['offset']), max(hi, int(self.entries[lo]['offset']))
+
+    def _reset(self) -> None:
+        self.entries = np.empty(0, dtype=INDEX_ENTRY_DTYPE)
+        self.rows = 0
+        self.synced_size = 0
+
+    def _header(self) -> bytes:
+        return INDEX_MAGIC + np.int64(self.stride).tobytes()
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self.path, 'rb') as f:
+                if f.read(INDEX_HEADER_SIZE) != self._header():
+                    # Written by another version or with another stride
+                    return
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) % INDEX_ENTRY_DTYPE.itemsize:
+            logger.info(f"Ignoring truncated results index {self.path}")
+            return
+        entries = np.frombuffer(data, dtype=INDEX_ENTRY_DTYPE)
+        if len(entries) and self._consistent(entries):
+            self.entries = entries
+            # Resume scanning from the last entry, whose position is known
+            self.rows = (len(entries) - 1) * self.stride
+            self.synced_size = int(entries[-1]['offset'])
+
+    def _consistent(self, entries: np.ndarray) -> bool:
+        """Check loaded entries start at the first row, are ordered and lie within the CSV file"""
+        offsets = entries['offset']
+        with open(self.csv_path, 'rb') as f:
+            first_row = len(f.readline())
+            size = f.seek(0, os.SEEK_END)
+        consistent = (
+            int(offsets[0]) == first_row
+            and bool(np.all(np.diff(offsets) > 0))
+            and bool(np.all(np.diff(entries['timestamp']) >= 0))
+            and int(offsets[-1]) < size
+        )
+        if not consistent:
+            logger.info(f"Ignoring inconsistent results index {self.path}")
+        return consistent
+
+    def _persist(self) -> None:
+        """Replace the index file with the current entries"""
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            # The flock on the CSV file orders concurrent writers of the index
+            with open(self.csv_path, 'rb') as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                with open(temp_path, 'wb') as f:
+                    f.write(self._header())
+                    f.write(self.entries.tobytes())
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist results index {self.path}: {e}")
+
+    def _last_entry_valid(self, size: int) -> bool:
+        """Check the last entry still points at a row with its timestamp"""
+        if len(self.entries) == 0:
+            return True
+        offset = int(self.entries[-1]['offset'])
+        if offset >= size:
+            return False
+        with open(self.csv_path, 'rb') as f:
+            f.seek(offset)
+            line = f.readline()
+        try:
+            return self._timestamp_at(line) == int(self.entries[-1]['timestamp'])
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _timestamp_at(line: bytes) -> int:
+        return int(to_epoch_micros([line.split(b',', 1)[0].decode('utf-8')])[0])
+
+    def _scan(self) -> None:
+        """Scan from the last covered row to EOF, adding entries for new rows"""
+        with open(self.csv_path, 'rb') as f:
+            if self.synced_size == 0:
+                self.synced_size = len(f.readline())
+            row, line_start = self.rows, self.synced_size
+            f.seek(line_start)
+            block_start = line_start
+            new_offsets = []
+            while True:
+                block = f.read(INDEX_SCAN_BLOCK)
+                if not block:
+                    break
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n')) + block_start
+                if len(newlines):
+                    starts = np.concatenate(([line_start], newlines[:-1] + 1))
+                    numbers = np.arange(row, row + len(newlines))
+                    wanted = (numbers % self.stride == 0) & (numbers >= len(self.entries) * self.stride)
+                    new_offsets.extend(starts[wanted].tolist())
+                    row += len(newlines)
+                    line_start = int(newlines[-1]) + 1
+                block_start += len(block)
+
+            new_entries = np.empty(len(new_offsets), dtype=INDEX_ENTRY_DTYPE)
+            for i, offset in enumerate(new_offsets):
+                f.seek(offset)
+                new_entries[i] = (self._timestamp_at(f.readline()), offset)
+
+        self.rows, self.synced_size = row, line_start
+        if len(new_entries):
+            self.entries = np.concatenate((self.entries, new_entries))
+
+
+_indexes: Dict[str, SparseTimeIndex] = {}
+
+
+def _sparse_index(path: str) -> SparseTimeIndex:
+    """Index shared by every store instance reading the same CSV file"""
+    key = os.path.abspath(path)
+    with _write_locks_guard:
+        return _indexes.setdefault(key, SparseTimeIndex(path))
+
+
+
+class ResultsStore(ABC):
+    """Base class for results storage backends"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = _write_lock(path)
+
+    def exists(self) -> bool:
+        """Check if the backing file exists"""
+        return os.path.exists(self.path)
+
+    def size_bytes(self) -> int:
+        """Size of the backing file in bytes"""
+        return os.path.getsize(self.path) if self.exists() else 0
+
+    def etag(self) -> Optional[str]:
+        """
+        Strong validator for the current contents of the store
+
+        Derived from the file size and modification time, so checking it
+        costs a single stat call.
+
+        Returns:
+            ETag value without quotes, or None if the file does not exist
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    def end_cursor(self) -> int:
+        """Cursor just past the last row, as read_since would return it (see read_since)"""
+        return self.size_bytes()
+
+    @abstractmethod
+    def initialize(self) -> None:
+        """Create the backing file if it does not exist"""
+
+    @abstractmethod
+    def append(self, rows: Iterable[ResultRow], sync: bool = False) -> int:
+        """
+        Append result rows to the store, optionally fsyncing the file
+
+        Returns:
+            Number of bytes appended
+        """
+
+    @abstractmethod
+    def append_columns(self, columns: Columns, sync: bool = False) -> int:
+        """Append result rows given as column arrays to the store (returns bytes appended)"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of result rows in the store"""
+
+    @abstractmethod
+    def read_all(self) -> List[Dict]:
+        """Read every result row"""
+
+    @abstractmethod
+    def tail(self, n: int) -> List[Dict]:
+        """Read the last n result rows, oldest first"""
+
+    @abstractmethod
+    def read_since(self, cursor: int, limit: int) -> Tuple[List[Dict], int]:
+        """
+        Read the rows appended after a cursor
+
+        Cursors are byte offsets just past the last complete row returned by
+        a previous call. A cursor that does not point into the file (e.g. 0,
+        or one from a file that has since been replaced) starts from the
+        first row.
+
+        Args:
+            cursor: Cursor returned by a previous call
+            limit: Maximum number of rows to return; older rows are skipped
+
+        Returns:
+            (rows oldest first, cursor for the next call)
+        """
+
+    @abstractmethod
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """Iterate over the store in column chunks of at most chunk_rows rows"""
+
+    @abstractmethod
+    def iter_records(self, offset: int = 0, limit: Optional[int] = None,
+                     chunk_rows: int = RECORD_CHUNK_ROWS) -> Iterator[List[Dict]]:
+        """
+        Iterate over the rows of the store as records, a chunk at a time
+
+        Args:
+            offset: Number of leading rows to skip
+            limit: Maximum number of rows to return (None for all)
+            chunk_rows: Maximum rows per chunk
+        """
+
+    def iter_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                   chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """
+        Iterate over the rows with start_us <= timestamp < end_us in column chunks
+
+        Memory use is bounded by chunk_rows however large the range is.
+
+        Args:
+            start_us: Inclusive lower bound in epoch microseconds (None for no bound)
+            end_us: Exclusive upper bound in epoch microseconds (None for no bound)
+            chunk_rows: Maximum rows per chunk
+        """
+        for columns in self.iter_chunks(chunk_rows):
+            mask = range_mask(columns['timestamp'], start_us, end_us)
+            if mask.any():
+                yield {name: values[mask] for name, values in columns.items()}
+
+    def read_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> Columns:
+        """
+        Read the rows with start_us <= timestamp < end_us as column arrays
+
+        Args:
+            start_us: Inclusive lower bound in epoch microseconds (None for no bound)
+            end_us: Exclusive upper bound in epoch microseconds (None for no bound)
+        """
+        return concat_columns(list(self.iter_range(start_us, end_us)))
+
+
+class CsvResultsStore(ResultsStore):
+    """Append-only CSV results file"""
+
+    def initialize(self) -> None:
+        if not self.exists():
+            with open(self.path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+            logger.info("Created new results CSV file")
+
+    @property
+    def index(self) -> SparseTimeIndex:
+        """Sparse time index of this file"""
+        return _sparse_index(self.path)
+
+    def append(self, rows: Iterable[ResultRow], sync: bool = False) -> int:
+        with self._write_lock:
+            with open(self.path, 'a', newline='') as f:
+                start = f.tell()
+                writer = csv.writer(f)
+                writer.writerows(rows)
+                if sync:
+                    _fsync(f)
+                written = f.tell() - start
+            self.index.sync(persist=True)
+        return written
+
+    def append_columns(self, columns: Columns, sync: bool = False) -> int:
+        return self.append(zip(
+            from_epoch_micros(columns['timestamp']).tolist(),
+            *(np.round(columns[name].astype(np.float64), 2).tolist() for name in ('meter', 'pv', 'net'))
+        ), sync=sync)
+
+    def count(self) -> int:
+        if not self.exists():
+            return 0
+        index = self.index
+        index.sync()
+        return index.rows
+
+    def read_all(self) -> List[Dict]:
+        with open(self.path, 'r') as f:
+            return list(csv.DictReader(f))
+
+    def tail(self, n: int) -> List[Dict]:
+        return tail_csv(self.path, n)
+
+    def read_since(self, cursor: int, limit: int) -> Tuple[List[Dict], int]:
+        with open(self.path, 'rb') as f:
+            header_line = f.readline()
+            header_end = len(header_line)
+            size = f.seek(0, os.SEEK_END)
+            if cursor < header_end or cursor > size:
+                cursor = header_end
+            if limit <= 0 or cursor == size:
+                return [], cursor
+
+            # Only the newest limit rows are returned, so a cursor far behind EOF
+            # does not need to be read from
+            start = max(cursor, size - max(SINCE_MIN_READ, limit * SINCE_BYTES_PER_ROW))
+            if start > cursor:
+                # Back up one byte and skip to the end of the line we landed in
+                f.seek(start - 1)
+                buf = f.read(size - start + 1)
+                skip = buf.find(b'\n') + 1
+                start, buf = start - 1 + skip, buf[skip:]
+            else:
+                f.seek(start)
+                buf = f.read(size - start)
+
+        # A trailing row without a newline is still being written
+        end = buf.rfind(b'\n') + 1
+        if end == 0:
+            return [], start
+        header = next(csv.reader([header_line.decode('utf-8')]), [])
+        lines = buf[:end].decode('utf-8').splitlines()
+        rows = list(csv.DictReader([line for line in lines if line.strip()], fieldnames=header))
+        return rows[-limit:], start + end
+
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        with open(self.path, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            net_key = 'sum' if reader.fieldnames and 'sum' in reader.fieldnames else 'net'
+            while True:
+                rows = list(islice(reader, chunk_rows))
+                if not rows:
+                    return
+                yield _csv_rows_to_columns(rows, net_key)
+
+    def iter_records(self, offset: int = 0, limit: Optional[int] = None,
+                     chunk_rows: int = RECORD_CHUNK_ROWS) -> Iterator[List[Dict]]:
+        """
+        Rows as read from the CSV file (string values), a chunk at a time
+
+        The sparse index is used to seek close to offset, and iteration stops
+        at the last complete row, so a row being appended is never returned.
+        """
+        if not self.exists():
+            return
+        index = self.index
+        index.sync()
+        remaining = index.rows - offset
+        if limit is not None:
+            remaining = min(remaining, limit)
+        if remaining <= 0:
+            return
+
+        entry = offset // index.stride
+        header = read_header(self.path)
+        with open(self.path, 'r', newline='') as f:
+            f.seek(int(index.entries[entry]['offset']))
+            reader = csv.DictReader(f, fieldnames=header)
+            for _ in islice(reader, offset - entry * index.stride):
+                pass
+            while remaining > 0:
+                rows = list(islice(reader, min(chunk_rows, remaining)))
+                if not rows:
+                    return
+                remaining -= len(rows)
+                yield rows
+
+    def iter_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                   chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """Only the byte range located by the sparse index is read, up to the last complete row"""
+        if not self.exists():
+            return
+        index = self.index
+        index.sync()
+        lo, hi = index.byte_range(start_us, end_us)
+        if hi <= lo:
+            return
+
+        header = read_header(self.path)
+        net_key = 'sum' if 'sum' in header else 'net'
+        with open(self.path, 'rb') as f:
+            f.seek(lo)
+            reader = csv.DictReader(_lines_until(f, hi - lo), fieldnames=header)
+            while True:
+                rows = list(islice(reader, chunk_rows))
+                if not rows:
+                    return
+                columns = _csv_rows_to_columns(rows, net_key)
+                mask = range_mask(columns['timestamp'], start_us, end_us)
+                if mask.any():
+                    yield {name: values[mask] for name, values in columns.items()}
+
+
+class BinaryResultsStore(ResultsStore):
+    """
+    Fixed-width binary results file read through numpy.memmap
+
+    The file starts with a 16 byte header (magic plus reserved space),
+    followed by packed RESULT_DTYPE records. Row counts are derived from the
+    file size and reads are zero-copy slices of the memory map.
+    """
+
+    def initialize(self) -> None:
+        if not self.exists():
+            with open(self.path, 'wb') as f:
+                f.write(BINARY_MAGIC.ljust(BINARY_HEADER_SIZE, b'\0'))
+            logger.info("Created new binary results file")
+
+    def append(self, rows: Iterable[ResultRow], sync: bool = False) -> int:
+        rows = list(rows)
+        return self.append_columns(_rows_to_columns(rows), sync=sync) if rows else 0
+
+    def append_columns(self, columns: Columns, sync: bool = False) -> int:
+        records = np.empty(len(columns['timestamp']), dtype=RESULT_DTYPE)
+        for name in RESULT_DTYPE.names:
+            records[name] = columns[name]
+        with self._write_lock, open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+            if sync:
+                _fsync(f)
+        return records.nbytes
+
+    def count(self) -> int:
+        size = self.size_bytes()
+        if size <= BINARY_HEADER_SIZE:
+            return 0
+        # A partially written trailing record is not counted
+        return (size - BINARY_HEADER_SIZE) // RESULT_DTYPE.itemsize
+
+    def records(self) -> np.ndarray:
+        """Memory-map all complete records (empty array if there are none)"""
+        count = self.count()
+        if count == 0:
+            return np.empty(0, dtype=RESULT_DTYPE)
+        return np.memmap(self.path, dtype=RESULT_DTYPE, mode='r',
+                         offset=BINARY_HEADER_SIZE, shape=(count,))
+
+    @staticmethod
+    def _columns(records: np.ndarray) -> Columns:
+        return {name: records[name] for name in RESULT_DTYPE.names}
+
+    def read_all(self) -> List[Dict]:
+        return columns_to_records(self._columns(self.records()))
+
+    def tail(self, n: int) -> List[Dict]:
+        if n <= 0:
+            return []
+        return columns_to_records(self._columns(self.records()[-n:]))
+
+    def read_since(self, cursor: int, limit: int) -> Tuple[List[Dict], int]:
+        records = self.records()
+        end = BINARY_HEADER_SIZE + len(records) * RESULT_DTYPE.itemsize
+        if cursor < BINARY_HEADER_SIZE or cursor > end or (cursor - BINARY_HEADER_SIZE) % RESULT_DTYPE.itemsize:
+            cursor = BINARY_HEADER_SIZE
+        if limit <= 0:
+            return [], cursor
+        first = max((cursor - BINARY_HEADER_SIZE) // RESULT_DTYPE.itemsize, len(records) - limit)
+        return columns_to_records(self._columns(records[first:])), end
+
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        records = self.records()
+        for start in range(0, len(records), chunk_rows):
+            yield self._columns(records[start:start + chunk_rows])
+
+    def iter_records(self, offset: int = 0, limit: Optional[int] = None,
+                     chunk_rows: int = RECORD_CHUNK_ROWS) -> Iterator[List[Dict]]:
+        records = self.records()[offset:]
+        if limit is not None:
+            records = records[:limit]
+        for start in range(0, len(records), chunk_rows):
+            yield columns_to_records(self._columns(records[start:start + chunk_rows]))
+
+    def _range_records(self, start_us: Optional[int], end_us: Optional[int]) -> np.ndarray:
+        # Records are appended in time order, so the range is found by binary search
+        return _records_in_range(self.records(), start_us, end_us)
+
+    def iter_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                   chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        records = self._range_records(start_us, end_us)
+        for start in range(0, len(records), chunk_rows):
+            yield self._columns(records[start:start + chunk_rows])
+
+    def read_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> Columns:
+        return self._columns(self._range_records(start_us, end_us))
+
+
+def _day_label(day: int) -> str:
+    """ISO date of a day number (days since the epoch)"""
+    return str(np.datetime64(day, 'D'))
+
+
+def _today() -> int:
+    """Day number of the current local date, which naive result timestamps use"""
+    return int(np.datetime64(datetime.now().date(), 'D').astype(np.int64))
+
+
+def _partition_path(directory: str, day: int, suffix: str) -> str:
+    return os.path.join(directory, PARTITION_PREFIX + _day_label(day) + suffix)
+
+
+def _split_chunks(columns: Columns, chunk_rows: int) -> Iterator[Columns]:
+    """Split column arrays into chunks of at most chunk_rows rows"""
+    for start in range(0, len(columns['timestamp']), chunk_rows):
+        yield {name: values[start:start + chunk_rows] for name, values in columns.items()}
+
+
+def _segment_id(path: str) -> bytes:
+    """Random id a partition segment keeps in the reserved space of its header"""
+    with open(path, 'rb') as f:
+        return f.read(BINARY_HEADER_SIZE)[len(BINARY_MAGIC):]
+
+
+def _encode_block(columns: Columns) -> bytes:
+    # Delta-encoded timestamps of regular readings compress to almost nothing
+    timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+    parts = [np.diff(timestamps, prepend=np.int64(0)).astype('<i8').tobytes()]
+    parts.extend(np.asarray(columns[name], dtype='<f4').tobytes() for name in ('meter', 'pv', 'net'))
+    return zlib.compress(b''.join(parts), COMPACTED_LEVEL)
+
+
+def _decode_block(data: bytes, rows: int) -> Columns:
+    buffer = zlib.decompress(data)
+    columns = {'timestamp': np.cumsum(np.frombuffer(buffer, dtype='<i8', count=rows))}
+    offset = rows * 8
+    for name in ('meter', 'pv', 'net'):
+        columns[name] = np.frombuffer(buffer, dtype='<f4', count=rows, offset=offset)
+        offset += rows * 4
+    return columns
+
+
+def write_compacted(path: str, chunks: Iterable[Columns], source_id: bytes = bytes(8),
+                    source_rows: int = 0) -> int:
+    """
+    Write column chunks to a compacted partition file, one compressed block per chunk
+
+    Args:
+        path: File to create (overwritten if it exists)
+        chunks: Column chunks in time order
+        source_id: Id of the partition segment being compacted
+        source_rows: Number of rows of that segment included in the chunks
+
+    Returns:
+        Number of rows written
+    """
+    blocks = []
+    with open(path, 'wb') as f:
+        f.write(COMPACTED_MAGIC.ljust(COMPACTED_HEADER_SIZE, b'\0'))
+        for columns in chunks:
+            rows = len(columns['timestamp'])
+            if rows == 0:
+                continue
+            data = _encode_block(columns)
+            blocks.append((columns['timestamp'][0], columns['timestamp'][-1], f.tell(), len(data), rows))
+            f.write(data)
+        index = np.array(blocks, dtype=COMPACTED_BLOCK_DTYPE)
+        index_offset = f.tell()
+        f.write(index.tobytes())
+        f.write(COMPACTED_TRAILER.pack(index_offset, len(index), source_id, source_rows, COMPACTED_MAGIC))
+        _fsync(f)
+    return int(index['rows'].sum())
+
+
+class CompactedSegment:
+    """
+    A compacted partition file: zlib-compressed column blocks with a block index
+
+    The index holds the first and last timestamp and the row count of every
+    block, so reads decompress only the blocks holding the requested rows or
+    overlapping the requested time range. The trailer records which segment
+    (and how many of its rows) the file was compacted from.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(len(COMPACTED_MAGIC))
+            f.seek(-COMPACTED_TRAILER.size, os.SEEK_END)
+            index_offset, count, self.source_id, self.source_rows, trailer_magic = \
+                COMPACTED_TRAILER.unpack(f.read(COMPACTED_TRAILER.size))
+            if magic != COMPACTED_MAGIC or trailer_magic != COMPACTED_MAGIC:
+                raise ValueError(f"{path} is not a compacted results partition")
+            f.seek(index_offset)
+            self.blocks = np.frombuffer(f.read(count * COMPACTED_BLOCK_DTYPE.itemsize), dtype=COMPACTED_BLOCK_DTYPE)
+        self.starts = np.concatenate(([0], np.cumsum(self.blocks['rows'])))
+        self.rows = int(self.starts[-1])
+
+    def _read_blocks(self, indices: Iterable[int]) -> Iterator[Tuple[int, Columns]]:
+        with open(self.path, 'rb') as f:
+            for i in indices:
+                block = self.blocks[i]
+                f.seek(int(block['offset']))
+                yield i, _decode_block(f.read(int(block['size'])), int(block['rows']))
+
+    def iter_rows(self, first: int, last: int) -> Iterator[Columns]:
+        """Rows first <= row < last, a block at a time"""
+        if last <= first:
+            return
+        lo = int(np.searchsorted(self.starts, first, side='right')) - 1
+        hi = min(int(np.searchsorted(self.starts, last, side='left')), len(self.blocks))
+        for i, columns in self._read_blocks(range(lo, hi)):
+            start = int(self.starts[i])
+            yield {name: values[max(first - start, 0):last - start] for name, values in columns.items()}
+
+    def iter_range(self, start_us: Optional[int], end_us: Optional[int]) -> Iterator[Columns]:
+        """Rows with start_us <= timestamp < end_us, a block at a time"""
+        overlapping = np.ones(len(self.blocks), dtype=bool)
+        if start_us is not None:
+            overlapping &= self.blocks['last'] >= start_us
+        if end_us is not None:
+            overlapping &= self.blocks['first'] < end_us
+        for _, columns in self._read_blocks(np.flatnonzero(overlapping).tolist()):
+            mask = range_mask(columns['timestamp'], start_us, end_us)
+            if mask.any():
+                yield {name: values[mask] for name, values in columns.items()}
+
+
+@lru_cache(maxsize=1024)
+def _load_compacted(path: str, mtime_ns: int, size: int) -> CompactedSegment:
+    return CompactedSegment(path)
+
+
+def _open_compacted(path: str) -> Optional[CompactedSegment]:
+    """Compacted file at path, with its index cached until the file changes (None if missing)"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _load_compacted(path, st.st_mtime_ns, st.st_size)
+
+
+def _partition_rows(directory: str, day: int) -> int:
+    """Rows of one day of a PartitionedResultsStore, from file sizes and the cached block index"""
+    segment_path = _partition_path(directory, day, PARTITION_SUFFIX)
+    compacted_path = _partition_path(directory, day, COMPACTED_SUFFIX)
+    compacted = _open_compacted(compacted_path)
+    try:
+        segment = os.stat(segment_path)
+        segment_id = _segment_id(segment_path) if compacted is not None else None
+    except FileNotFoundError:
+        # Removed by a compaction after the compacted file was looked up
+        compacted = _open_compacted(compacted_path)
+        return compacted.rows if compacted is not None else 0
+    rows = max(segment.st_size - BINARY_HEADER_SIZE, 0) // RESULT_DTYPE.itemsize
+    if compacted is not None:
+        rows += compacted.rows - (compacted.source_rows if compacted.source_id == segment_id else 0)
+    return rows
+
+
+class DayPartition:
+    """
+    Snapshot of one day of a PartitionedResultsStore
+
+    A day has a binary segment while it is being written, a compacted file
+    once it is closed, or both when rows for a compacted day arrive late.
+    Segment rows already copied into the compacted file (a compaction that
+    has not removed the segment yet) are skipped, so no row is seen twice.
+    """
+
+    def __init__(self, directory: str, day: int):
+        self.day = day
+        self.segment_path = _partition_path(directory, day, PARTITION_SUFFIX)
+        self.compacted_path = _partition_path(directory, day, COMPACTED_SUFFIX)
+        self.compacted = _open_compacted(self.compacted_path)
+        self.segment_id: Optional[bytes] = None
+        self.segment_rows = 0
+        self.segment_records = np.empty(0, dtype=RESULT_DTYPE)
+        try:
+            self.segment_id = _segment_id(self.segment_path)
+            records = BinaryResultsStore(self.segment_path).records()
+        except FileNotFoundError:
+            # Removed by a compaction after the compacted file was looked up
+            self.segment_id = None
+            self.compacted = _open_compacted(self.compacted_path)
+            return
+        self.segment_rows = len(records)
+        skip = 0
+        if self.compacted is not None and self.compacted.source_id == self.segment_id:
+            skip = self.compacted.source_rows
+        self.segment_records = records[skip:]
+
+    @property
+    def compacted_rows(self) -> int:
+        return self.compacted.rows if self.compacted is not None else 0
+
+    @property
+    def rows(self) -> int:
+        return self.compacted_rows + len(self.segment_records)
+
+    def iter_rows(self, first: int, last: int, chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """Rows first <= row < last of the day in column chunks"""
+        split = self.compacted_rows
+        if first < split:
+            for columns in self.compacted.iter_rows(first, min(last, split)):
+                yield from _split_chunks(columns, chunk_rows)
+        records = self.segment_records[max(first - split, 0):max(last - split, 0)]
+        for start in range(0, len(records), chunk_rows):
+            yield BinaryResultsStore._columns(records[start:start + chunk_rows])
+
+    def iter_range(self, start_us: Optional[int], end_us: Optional[int],
+                   chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """Rows of the day with start_us <= timestamp < end_us in column chunks"""
+        if self.compacted is not None:
+            for columns in self.compacted.iter_range(start_us, end_us):
+                yield from _split_chunks(columns, chunk_rows)
+        records = _records_in_range(self.segment_records, start_us, end_us)
+        for start in range(0, len(records), chunk_rows):
+            yield BinaryResultsStore._columns(records[start:start + chunk_rows])
+
+
+class _Compactor:
+    """Background thread compacting a partitioned store whenever a new day starts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()  # Serializes compactions of the directory
+        self._requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def request(self) -> None:
+        self._requested.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='results-compactor', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                PartitionedResultsStore(self.path).compact()
+            except Exception as e:
+                logger.error(f"Error compacting results partitions in {self.path}: {e}")
+
+
+_compactors: Dict[str, _Compactor] = {}
+_newest_days: Dict[str, int] = {}
+
+
+def _compactor(path: str) -> _Compactor:
+    key = os.path.abspath(path)
+    with _write_locks_guard:
+        return _compactors.setdefault(key, _Compactor(key))
+
+
+class PartitionedResultsStore(ResultsStore):
+    """
+    Results split into one partition per day under a directory
+
+    Rows are appended to the binary segment of the day their timestamp falls
+    on (`results-YYYY-MM-DD.bin`, in the BinaryResultsStore layout). When a
+    process writes a day later than any it has written before, the earlier
+    days are closed: compact() rewrites them as compressed column blocks
+    (`results-YYYY-MM-DD.pvc`) in a background thread and applies the
+    retention policy (unless config.RESULTS_AUTO_COMPACT is off, in which
+    case it is left to `cli.py compact`). Range reads open only the partitions that overlap the
+    range, and row counts come from segment sizes and block indexes.
+
+    Rows are assumed to be appended in time order within a day. read_since
+    cursors encode a day and the rows of it already read, so they survive
+    rotation, compaction and retention.
+    """
+
+    def initialize(self) -> None:
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+            logger.info(f"Created results partition directory {self.path}")
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def days(self) -> List[int]:
+        """Day numbers (days since the epoch) that have a partition, oldest first"""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        days = set()
+        for name in names:
+            stem, suffix = os.path.splitext(name)
+            if suffix not in (PARTITION_SUFFIX, COMPACTED_SUFFIX) or not stem.startswith(PARTITION_PREFIX):
+                continue
+            try:
+                days.add(int(np.datetime64(stem[len(PARTITION_PREFIX):], 'D').astype(np.int64)))
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def partitions(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> List[DayPartition]:
+        """Partitions of the days overlapping [start_us, end_us), oldest first"""
+        days = self.days()
+        if start_us is not None:
+            days = [day for day in days if day >= start_us // DAY_MICROS]
+        if end_us is not None:
+            days = [day for day in days if day * DAY_MICROS < end_us]
+        return [DayPartition(self.path, day) for day in days]
+
+    def size_bytes(self) -> int:
+        try:
+            with os.scandir(self.path) as entries:
+                return sum(entry.stat().st_size for entry in entries if entry.name.startswith(PARTITION_PREFIX))
+        except FileNotFoundError:
+            return 0
+
+    def _newest_partition(self) -> Optional[str]:
+        """File name of the newest day's partition, its segment if it has one"""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return None
+        # Day labels sort chronologically, so names compare without parsing dates
+        names = [
+            name for name in names
+            if name.startswith(PARTITION_PREFIX) and name.endswith((PARTITION_SUFFIX, COMPACTED_SUFFIX))
+        ]
+        if not names:
+            return None
+        return max(names, key=lambda name: (os.path.splitext(name)[0], name.endswith(PARTITION_SUFFIX)))
+
+    def _generation(self) -> int:
+        """Counter bumped by late appends to older days and by retention"""
+        try:
+            with open(os.path.join(self.path, PARTITION_LOCK_FILE), 'rb') as f:
+                data = f.read(GENERATION.size)
+        except FileNotFoundError:
+            return 0
+        return GENERATION.unpack(data)[0] if len(data) == GENERATION.size else 0
+
+    def end_cursor(self) -> int:
+        name = self._newest_partition()
+        if name is None:
+            return 0
+        day = int(np.datetime64(os.path.splitext(name)[0][len(PARTITION_PREFIX):], 'D').astype(np.int64))
+        return day * CURSOR_DAY_SPAN + _partition_rows(self.path, day)
+
+    def etag(self) -> Optional[str]:
+        """
+        Derived from the directory's mtime, the newest partition's size and
+        mtime and the generation counter
+
+        New days, compactions and retention change the directory. Appends
+        to the newest day change its segment, and late appends to older days
+        bump the counter, so a few stat calls and one small read cover every
+        change without opening a partition.
+        """
+        while True:
+            name = self._newest_partition()
+            if name is None:
+                return None
+            try:
+                directory = os.stat(self.path)
+                newest = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                # Compacted or removed since the listing, which changed the directory
+                continue
+            return f"{directory.st_mtime_ns:x}-{newest.st_size:x}-{newest.st_mtime_ns:x}-{self._generation():x}"
+
+    def _directory_lock(self) -> IO[bytes]:
+        """
+        Open the directory's lock file with an exclusive flock
+
+        The write lock only orders the threads of one process; the flock
+        keeps a compaction or retention run in another process (`cli.py
+        compact` from cron) from deleting a segment between an append to it
+        and its removal. Closing the returned file releases the lock.
+        """
+        fd = os.open(os.path.join(self.path, PARTITION_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        lock = os.fdopen(fd, 'r+b')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            lock.close()
+            raise
+        return lock
+
+    @staticmethod
+    def _bump_generation(lock: IO[bytes]) -> None:
+        """Increment the generation counter in the lock file (directory lock held)"""
+        lock.seek(0)
+        data = lock.read(GENERATION.size)
+        generation = GENERATION.unpack(data)[0] if len(data) == GENERATION.size else 0
+        lock.seek(0)
+        lock.write(GENERATION.pack(generation + 1))
+        lock.flush()
+
+    def _segment(self, day: int) -> BinaryResultsStore:
+        """Binary segment of a day, created with a random id if needed (directory lock held)"""
+        segment = BinaryResultsStore(_partition_path(self.path, day, PARTITION_SUFFIX))
+        if not segment.exists():
+            with open(segment.path, 'wb') as f:
+                f.write(BINARY_MAGIC + os.urandom(BINARY_HEADER_SIZE - len(BINARY_MAGIC)))
+        return segment
+
+    def append(self, rows: Iterable[ResultRow], sync: bool = False) -> int:
+        rows = list(rows)
+        return self.append_columns(_rows_to_columns(rows), sync=sync) if rows else 0
+
+    def append_columns(self, columns: Columns, sync: bool = False) -> int:
+        timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+        if len(timestamps) == 0:
+            return 0
+        days = timestamps // DAY_MICROS
+        written = 0
+        self.initialize()
+        with self._write_lock, self._directory_lock() as lock:
+            for day in np.unique(days).tolist():
+                selected = days == day
+                written += self._segment(day).append_columns(
+                    {name: np.asarray(columns[name])[selected] for name in RESULT_DTYPE.names}, sync=sync)
+            # Rows for a day before the newest change neither the directory nor the newest segment
+            if PARTITION_PREFIX + _day_label(int(days.min())) < os.path.splitext(self._newest_partition())[0]:
+                self._bump_generation(lock)
+        self._rotate(int(days.max()))
+        return written
+
+    def _rotate(self, day: int) -> None:
+        """Request a compaction when this process starts writing a new day"""
+        if not config.RESULTS_AUTO_COMPACT:
+            return
+        key = os.path.abspath(self.path)
+        with _write_locks_guard:
+            if _newest_days.get(key, day - 1) >= day:
+                return
+            _newest_days[key] = day
+        _compactor(self.path).request()
+
+    def count(self) -> int:
+        return sum(partition.rows for partition in self.partitions())
+
+    def read_all(self) -> List[Dict]:
+        return columns_to_records(concat_columns(list(self.iter_chunks())))
+
+    def tail(self, n: int) -> List[Dict]:
+        if n <= 0:
+            return []
+        return self.read_since(0, n)[0]
+
+    def read_since(self, cursor: int, limit: int) -> Tuple[List[Dict], int]:
+        partitions = self.partitions()
+        if not partitions:
+            return [], 0
+        end = partitions[-1].day * CURSOR_DAY_SPAN + partitions[-1].rows
+        if cursor > end:
+            cursor = 0
+        if limit <= 0:
+            return [], cursor
+        day, read = divmod(cursor, CURSOR_DAY_SPAN)
+
+        # Newest rows first, so days far behind the cursor are never opened
+        pieces: List[List[Columns]] = []
+        wanted = limit
+        for partition in reversed(partitions):
+            if partition.day < day or wanted == 0:
+                break
+            first = read if partition.day == day and read <= partition.rows else 0
+            first = max(first, partition.rows - wanted)
+            pieces.append(list(partition.iter_rows(first, partition.rows)))
+            wanted -= partition.rows - first
+        chunks = [columns for piece in reversed(pieces) for columns in piece]
+        return columns_to_records(concat_columns(chunks)), end
+
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        for partition in self.partitions():
+            yield from partition.iter_rows(0, partition.rows, chunk_rows)
+
+    def iter_records(self, offset: int = 0, limit: Optional[int] = None,
+                     chunk_rows: int = RECORD_CHUNK_ROWS) -> Iterator[List[Dict]]:
+        """Whole partitions before offset are skipped using their row counts"""
+        for partition in self.partitions():
+            if limit is not None and limit <= 0:
+                return
+            if offset >= partition.rows:
+                offset -= partition.rows
+                continue
+            last = partition.rows if limit is None else min(partition.rows, offset + limit)
+            for columns in partition.iter_rows(offset, last, chunk_rows):
+                yield columns_to_records(columns)
+            if limit is not None:
+                limit -= last - offset
+            offset = 0
+
+    def iter_range(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                   chunk_rows: int = CHUNK_ROWS) -> Iterator[Columns]:
+        """Only the partitions of days overlapping the range are opened"""
+        for partition in self.partitions(start_us, end_us):
+            yield from partition.iter_range(start_us, end_us, chunk_rows)
+
+    def compact(self, today: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Compact closed partitions and remove those past the retention period
+
+        Every day except the newest is closed. Its segment, merged with an
+        earlier compacted file if rows arrived late, is rewritten as a
+        compacted file and removed. With config.RESULTS_RETENTION_DAYS set,
+        partitions of days before the last RESULTS_RETENTION_DAYS days
+        (counting today) are deleted.
+
+        Args:
+            today: Day number the retention period ends on (defaults to the current date)
+
+        Returns:
+            (partitions compacted, partitions removed)
+        """
+        with _compactor(self.path).lock:
+            days = self.days()
+            removed = 0
+            if config.RESULTS_RETENTION_DAYS > 0:
+                cutoff = (_today() if today is None else today) - config.RESULTS_RETENTION_DAYS + 1
+                for day in [day for day in days if day < cutoff]:
+                    self._remove(day)
+                    removed += 1
+                days = [day for day in days if day >= cutoff]
+            compacted = sum(self._compact_day(day) for day in days[:-1])
+        if compacted or removed:
+            logger.info(f"Compacted {compacted} and removed {removed} results partitions in {self.path}")
+        return compacted, removed
+
+    def _compact_day(self, day: int) -> bool:
+        partition = DayPartition(self.path, day)
+        if partition.segment_id is None:
+            return False
+        temp_path = partition.compacted_path + '.tmp'
+        write_compacted(temp_path, partition.iter_rows(0, partition.rows, COMPACTED_BLOCK_ROWS),
+                        partition.segment_id, partition.segment_rows)
+        with self._write_lock, self._directory_lock():
+            if BinaryResultsStore(partition.segment_path).count() != partition.segment_rows:
+                # Rows arrived while compacting; the day is compacted again on the next rotation
+                os.unlink(temp_path)
+                return False
+            os.replace(temp_path, partition.compacted_path)
+            os.unlink(partition.segment_path)
+        return True
+
+    def _remove(self, day: int) -> None:
+        with self._write_lock, self._directory_lock() as lock:
+            for suffix in (PARTITION_SUFFIX, COMPACTED_SUFFIX):
+                path = _partition_path(self.path, day, suffix)
+                if os.path.exists(path):
+                    os.unlink(path)
+            self._bump_generation(lock)
+
+
+RESULTS_BACKENDS = {
+    'csv': CsvResultsStore,
+    'binary': BinaryResultsStore,
+    'partitioned': PartitionedResultsStore,
+}
+
+
+def get_results_store(backend: Optional[str] = None) -> ResultsStore:
+    """
+    Create the results store selected by configuration
+
+    Args:
+        backend: Backend name overriding config.RESULTS_BACKEND
+
+    Returns:
+        Results store for the configured results file (or partition directory)
+    """
+    backend = backend or config.RESULTS_BACKEND
+    if backend not in RESULTS_BACKENDS:
+        raise ValueError(f"Unknown results backend: {backend}")
+    path = {
+        'binary': config.RESULTS_BINARY_FILE,
+        'partitioned': config.RESULTS_PARTITION_DIR,
+    }.get(backend, config.RESULTS_FILE)
+    return RESULTS_BACKENDS[backend](path)
+
+
+def convert_csv_to_binary(csv_path: str, binary_path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    One-shot conversion of a results CSV file into the binary format
+
+    Args:
+        csv_path: Existing results CSV file
+        binary_path: Binary results file to create (must not exist)
+        chunk_rows: Rows converted per chunk
+
+    Returns:
+        Number of rows converted
+    """
+    if os.path.exists(binary_path):
+        raise FileExistsError(f"Refusing to overwrite {binary_path}")
+    source = CsvResultsStore(csv_path)
+    target = BinaryResultsStore(binary_path)
+    target.initialize()
+    total = 0
+    for columns in source.iter_chunks(chunk_rows):
+        target.append_columns(columns)
+        total += len(columns['timestamp'])
+    logger.info(f"Converted {total} rows from {csv_path} to {binary_path}")
+    return total
+
+
+def export_csv(store: ResultsStore, csv_path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Export any results store to a CSV file in the standard column layout
+
+    Args:
+        store: Source results store
+        csv_path: CSV file to write (overwritten if it exists)
+        chunk_rows: Rows exported per chunk
+
+    Returns:
+        Number of rows exported
+    """
+    target = CsvResultsStore(csv_path)
+    if target.exists():
+        os.unlink(csv_path)
+    target.initialize()
+    total = 0
+    for columns in store.iter_chunks(chunk_rows):
+        target.append_columns(columns)
+        total += len(columns['timestamp'])
+    return total
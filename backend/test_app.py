@@ -10,6 +10,10 @@ from utils import pv_profile
 from models import MeterReading, PVData
 from config import config
 from simulation import SimulationManager
+from loadgen import run_load
+from coordination import SimulationCoordinator
+from counters import pipeline_counters
+from latency import latency_histograms
 
 
 @pytest.fixture
@@ -20,6 +24,25 @@ def client():
         yield client
 
 
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Keep the counters, histograms and state files the tests write out of the real DATA_DIR"""
+    path = tmp_path / 'data'
+    path.mkdir()
+    monkeypatch.setattr(config, 'DATA_DIR', str(path))
+    # Spawned worker processes read DATA_DIR from the environment
+    monkeypatch.setenv('DATA_DIR', str(path))
+    for metrics, name in ((pipeline_counters, 'pipeline.counters'), (latency_histograms, 'latency.histograms')):
+        metrics.close()
+        monkeypatch.setattr(metrics, '_path', str(path / name))
+    # The app's coordinator opened its lock and state files at import
+    monkeypatch.setattr(app, 'coordinator', SimulationCoordinator(app.simulation_manager, str(path)))
+    yield path
+    app.coordinator.stop()
+    pipeline_counters.close()
+    latency_histograms.close()
+
+
 def test_get_results_with_data(client):
     """Test results endpoint with sample data"""
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv') as f:
@@ -71,6 +94,7 @@ def test_start_simulation(client):
         assert data['status'] == 'started'
         assert data['running'] == True
         mock_start.assert_called_once()
+    app.coordinator.stop()
 
 def test_start_simulation_already_running(client):
     """Test start simulation when already running"""
@@ -346,3 +370,1456 @@ def test_csv_file_creation_with_headers():
     # Clean up
     if os.path.exists(temp_file):
         os.unlink(temp_file)
+
+def test_tail_csv_reads_backwards_in_blocks():
+    """Test tail reader returns the last rows across block boundaries"""
+    from storage import tail_csv
+    
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as f:
+        f.write('timestamp,meter,pv,sum\r\n')
+        for i in range(200):
+            f.write(f'2023-01-01T12:{i // 60:02d}:{i % 60:02d},{i},1.0,-1.0\r\n')
+        f.write('2023-01-01T12:03:20,5.')  # Row still being written
+        temp_file = f.name
+    
+    rows = tail_csv(temp_file, 50, block_size=64)
+    assert len(rows) == 50
+    assert rows[0]['meter'] == '150'
+    assert rows[-1]['meter'] == '199'
+    assert rows[-1]['sum'] == '-1.0'
+    
+    # Asking for more rows than exist stops at the header
+    rows = tail_csv(temp_file, 500, block_size=64)
+    assert len(rows) == 200
+    assert rows[0]['meter'] == '0'
+    
+    os.unlink(temp_file)
+
+def test_tail_csv_header_only():
+    """Test tail reader on a results file without data rows"""
+    from storage import tail_csv
+    
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv') as f:
+        f.write('timestamp,meter,pv,sum\n')
+        temp_file = f.name
+    
+    assert tail_csv(temp_file, 50) == []
+    
+    os.unlink(temp_file)
+
+def test_binary_results_store_roundtrip():
+    """Test binary store appends fixed-width records and reads them via memmap"""
+    from storage import BinaryResultsStore, RESULT_DTYPE, BINARY_HEADER_SIZE
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BinaryResultsStore(os.path.join(tmp, 'results.bin'))
+        store.initialize()
+        assert store.count() == 0
+        assert store.tail(5) == []
+        
+        store.append([
+            ('2023-01-01T12:00:00', 5.5, 7.2, 1.7),
+            ('2023-01-01T12:00:03', 6.1, 7.1, 1.0),
+            ('2023-01-01T12:00:06', 4.0, 7.0, 3.0),
+        ])
+        assert store.count() == 3
+        assert store.size_bytes() == BINARY_HEADER_SIZE + 3 * RESULT_DTYPE.itemsize
+        
+        latest = store.tail(2)
+        assert [r['meter'] for r in latest] == [6.1, 4.0]
+        assert latest[0]['pv'] == 7.1
+        assert latest[0]['net'] == 1.0
+        assert latest[0]['timestamp'].startswith('2023-01-01T12:00:03')
+        
+        # A partially written record is ignored
+        with open(store.path, 'ab') as f:
+            f.write(b'\x00' * 7)
+        assert store.count() == 3
+
+def test_results_store_backends_must_implement_every_method():
+    """Test a backend missing part of the store interface fails when constructed"""
+    from storage import ResultsStore, RESULTS_BACKENDS
+    
+    class IncompleteStore(ResultsStore):
+        def initialize(self) -> None:
+            pass
+    
+    with pytest.raises(TypeError, match='abstract'):
+        IncompleteStore('results.incomplete')
+    for backend in RESULTS_BACKENDS.values():
+        backend('results.unused')
+
+def test_convert_csv_to_binary_and_export():
+    """Test one-shot CSV conversion and CSV export from the binary store"""
+    from storage import BinaryResultsStore, CsvResultsStore, convert_csv_to_binary, export_csv
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'results.csv')
+        bin_path = os.path.join(tmp, 'results.bin')
+        with open(csv_path, 'w') as f:
+            f.write('timestamp,meter,pv,sum\n')
+            for i in range(25):
+                f.write(f'2023-01-01T12:00:{i:02d},5.5,{i / 10:.1f},{i / 10 - 5.5:.2f}\n')
+        
+        assert convert_csv_to_binary(csv_path, bin_path, chunk_rows=10) == 25
+        with pytest.raises(FileExistsError):
+            convert_csv_to_binary(csv_path, bin_path)
+        
+        binary = BinaryResultsStore(bin_path)
+        assert binary.count() == 25
+        assert binary.tail(1)[0]['pv'] == 2.4
+        
+        out_path = os.path.join(tmp, 'export.csv')
+        assert export_csv(binary, out_path) == 25
+        rows = CsvResultsStore(out_path).read_all()
+        assert len(rows) == 25
+        assert float(rows[-1]['sum']) == -3.1
+
+def test_get_results_latest_binary_backend(client):
+    """Test latest results endpoint served from the binary store"""
+    from storage import BinaryResultsStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_path = os.path.join(tmp, 'results.bin')
+        store = BinaryResultsStore(bin_path)
+        store.initialize()
+        store.append([(f'2023-01-01T12:00:{i:02d}', 5.0, 7.0, 2.0) for i in range(60)])
+        
+        with patch.object(config, 'RESULTS_BACKEND', 'binary'), \
+             patch.object(config, 'RESULTS_BINARY_FILE', bin_path):
+            rv = client.get('/results/latest')
+            data = json.loads(rv.data)
+            assert len(data) == 50
+            assert data[-1]['net'] == 2.0
+            
+            rv = client.get('/metrics')
+            assert json.loads(rv.data)['data_points'] == 60
+
+def test_batch_writer_writes_and_acks_in_batches():
+    """Test batched writes use one append and one multi-message ack per batch"""
+    from simulation import BatchWriter, decode_meter_message
+    from storage import CsvResultsStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvResultsStore(os.path.join(tmp, 'results.csv'))
+        store.initialize()
+        channel = Mock()
+        writer = BatchWriter(store, channel, batch_size=3, linger=60)
+        
+        for tag in range(1, 5):
+            body = json.dumps({'timestamp': f'2023-01-01T12:00:0{tag}', 'meter': 5.0})
+            writer.add(decode_meter_message(body), tag)
+        
+        # First batch is full and acknowledged up to its last delivery tag
+        channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+        assert store.count() == 3
+        
+        # Linger has not elapsed, so the remaining row stays buffered
+        writer.flush_if_due()
+        assert store.count() == 3
+        
+        writer.flush()
+        channel.basic_ack.assert_called_with(delivery_tag=4, multiple=True)
+        assert store.count() == 4
+
+def test_batch_writer_requeues_on_write_failure():
+    """Test a failed batch write hands the messages back to the broker"""
+    from simulation import BatchWriter
+    
+    store = Mock()
+    store.append.side_effect = OSError("disk full")
+    channel = Mock()
+    writer = BatchWriter(store, channel, batch_size=2, linger=60)
+    writer.add(('2023-01-01T12:00:00', 5.0, 8.0), 7)
+    writer.add(('2023-01-01T12:00:03', 5.0, 8.0), 8)
+    
+    channel.basic_nack.assert_called_once_with(delivery_tag=8, multiple=True, requeue=True)
+    channel.basic_ack.assert_not_called()
+
+def test_malformed_timestamp_rejects_only_its_message():
+    """Test a bad timestamp is rejected at decode time and never fails the rest of a batch"""
+    from simulation import BatchWriter, decode_meter_message
+    
+    for timestamp in ('garbage', '', 12345):
+        with pytest.raises(ValueError):
+            decode_meter_message(json.dumps({'timestamp': timestamp, 'meter': 5.0}))
+    
+    store = Mock()
+    store.append.return_value = 2
+    channel = Mock()
+    writer = BatchWriter(store, channel, batch_size=3, linger=60)
+    writer.add(('2023-01-01T12:00:00', 5.0, 8.0), 1)
+    writer.add(('garbage', 5.0, 8.0), 2)
+    writer.add(('2023-01-01T12:00:06', 5.0, 8.0), 3)
+    
+    channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+    channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+    assert [row[0] for row in store.append.call_args[0][0]] == ['2023-01-01T12:00:00', '2023-01-01T12:00:06']
+
+def test_build_fleet_consistent_hash_routing():
+    """Test fleet sites are spread over consumer queues by consistent hashing"""
+    from fleet import build_fleet, ConsistentHashRing, shard_queue, sites_by_queue
+    
+    single = build_fleet(1, 1)
+    assert single[0].routing_key == config.METER_QUEUE
+    assert single[0].capacity_kw == 8.0
+    
+    sites = build_fleet(1000, 4, seed=1)
+    groups = sites_by_queue(sites)
+    assert set(groups) == {shard_queue(i, 4) for i in range(4)}
+    assert all(150 < len(group) < 350 for group in groups.values())
+    assert all(3.0 <= site.capacity_kw <= 10.0 for site in sites)
+    assert build_fleet(1000, 4, seed=1) == sites  # Deterministic
+    
+    # Adding a consumer only moves keys to the new consumer
+    before = ConsistentHashRing(range(4))
+    after = ConsistentHashRing(range(5))
+    moved = [k for k in map(str, range(1000)) if before.lookup(k) != after.lookup(k)]
+    assert all(after.lookup(k) == 4 for k in moved)
+    assert len(moved) < 400
+
+def test_process_meter_message_uses_site_capacity():
+    """Test PV output is scaled by the capacity of the reading's site"""
+    from simulation import process_meter_message
+    
+    body = json.dumps({'timestamp': '2023-01-01T12:00:00', 'meter': 2.0, 'meter_id': 7})
+    assert process_meter_message(body, {7: 4.0}) == ('2023-01-01T12:00:00', 2.0, 4.0, 2.0)
+    # Unknown or missing meter IDs fall back to the reference household
+    assert process_meter_message(body)[2] == 8.0
+
+def test_start_fleet_simulation(client):
+    """Test starting a fleet reports per-consumer throughput in metrics"""
+    with patch('simulation.get_rabbitmq_connection') as mock_conn:
+        mock_conn.return_value.channel.return_value = Mock()
+        
+        rv = client.post('/start', json={'fleet_size': 0})
+        assert rv.status_code == 400
+        
+        rv = client.post('/start', json={'fleet_size': 20, 'consumers': 3})
+        assert rv.status_code == 200
+        assert json.loads(rv.data)['fleet_size'] == 20
+        
+        data = json.loads(client.get('/metrics').data)
+        assert data['fleet_size'] == 20
+        assert len(data['throughput']) == 3
+        assert sum(c['sites'] for c in data['throughput']) == 20
+        
+        app.coordinator.stop()
+
+def test_pv_profile_batch_matches_scalar():
+    """Test vectorized PV profile agrees with the scalar function"""
+    import numpy as np
+    from utils import pv_profile_batch, fractional_hours
+    
+    hours = np.arange(0, 24, 0.25)
+    expected = [pv_profile(int(h), int(round((h % 1) * 60))) for h in hours]
+    assert np.allclose(pv_profile_batch(hours), expected)
+    assert np.allclose(pv_profile_batch([12.0, 12.0], [4.0, 8.0]), [4.0, 8.0])
+    
+    timestamps = np.array(['2023-01-01T12:30:45', '2023-06-01T00:00:00'], dtype='datetime64[us]')
+    assert fractional_hours(timestamps).tolist() == [12.5, 0.0]
+    assert fractional_hours(timestamps.astype(np.int64), with_seconds=True)[0] == 12.5125
+
+def test_batch_writer_nacks_invalid_readings():
+    """Test out-of-range readings in a batch are rejected individually"""
+    from simulation import BatchWriter
+    
+    store = Mock()
+    store.append.return_value = 120  # Bytes appended
+    channel = Mock()
+    writer = BatchWriter(store, channel, batch_size=3, linger=60)
+    writer.add(('2023-01-01T12:00:00', 5.0, 8.0), 1)
+    writer.add(('2023-01-01T12:00:03', 5.0, 8.0), 2)
+    writer.add(('2023-01-01T12:00:06', 5.0, 40.0), 3)  # PV above the validated range
+    
+    channel.basic_nack.assert_called_once_with(delivery_tag=3, requeue=False)
+    channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    rows = list(store.append.call_args[0][0])
+    assert rows == [('2023-01-01T12:00:00', 5.0, 8.0, 3.0), ('2023-01-01T12:00:03', 5.0, 8.0, 3.0)]
+
+def test_pv_profile_table_interpolation():
+    """Test lookup table matches the exact profile and scales by capacity"""
+    import numpy as np
+    from utils import PVProfileTable, pv_profile_batch, pv_output
+    
+    table = PVProfileTable(resolution=1)
+    assert table.values.dtype == np.float32
+    assert len(table.values) == 86401
+    
+    hours = np.linspace(0, 23.99, 1000)
+    assert np.allclose(table.lookup(hours), pv_profile_batch(hours), atol=1e-4)
+    assert abs(table.lookup_scalar(11, 30) - pv_profile(11, 30)) < 1e-4
+    assert abs(table.lookup_scalar(12, 0, capacity=4.0) - 4.0) < 1e-4
+    
+    # A coarse table still interpolates closely between its samples
+    coarse = PVProfileTable(resolution=900)
+    assert np.allclose(coarse.lookup(hours), pv_profile_batch(hours), atol=0.05)
+    
+    # A 0 kW table produces 0 kW and still scales to a site's own capacity
+    empty = PVProfileTable(capacity=0.0)
+    assert not empty.lookup(hours).any()
+    assert empty.lookup_scalar(12, 0) == 0.0
+    assert np.allclose(empty.lookup(hours, 4.0), pv_profile_batch(hours, 4.0), atol=1e-4)
+    assert abs(empty.lookup_scalar(12, 0, capacity=4.0) - 4.0) < 1e-4
+    with patch.object(config, 'PV_CAPACITY', 0.0):
+        assert np.allclose(pv_output([12.0, 12.0], [0.0, 8.0]), [0.0, 8.0], atol=1e-4)
+    
+    with pytest.raises(ValueError):
+        PVProfileTable(resolution=7)
+
+def test_pv_profile_table_swaps_with_config():
+    """Test the configured table is cached per parameter set"""
+    from utils import current_profile_table
+    from simulation import process_meter_message
+    
+    with patch.object(config, 'PV_LOOKUP_TABLE', False):
+        assert current_profile_table() is None
+    
+    with patch.object(config, 'PV_LOOKUP_TABLE', True):
+        table = current_profile_table()
+        assert current_profile_table() is table
+        
+        body = json.dumps({'timestamp': '2023-01-01T11:30:00', 'meter': 2.0})
+        assert process_meter_message(body)[2] == round(pv_profile(11, 30), 2)
+        
+        with patch.object(config, 'PV_PEAK_HOUR', 13.0):
+            shifted = current_profile_table()
+            assert shifted is not table
+            assert shifted.peak_hour == 13.0
+
+def test_run_backfill_in_chunks():
+    """Test backfill writes the whole range in bounded, reproducible chunks"""
+    from backfill import run_backfill
+    from storage import BinaryResultsStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BinaryResultsStore(os.path.join(tmp, 'results.bin'))
+        chunks = []
+        rows = run_backfill(datetime(2024, 6, 1), datetime(2024, 6, 2), step=60, seed=7,
+                            store=store, chunk_rows=100, progress=lambda w, t: chunks.append((w, t)))
+        assert rows == 1440
+        assert store.count() == 1440
+        assert chunks[0] == (100, 1440) and chunks[-1] == (1440, 1440)
+        
+        records = store.records()
+        assert (records['meter'] >= 0.5).all() and (records['meter'] <= 10.0).all()
+        noon = store.read_all()[720]
+        assert noon['timestamp'].startswith('2024-06-01T12:00:00')
+        assert noon['pv'] == 8.0
+        
+        # Same seed, same data
+        other = BinaryResultsStore(os.path.join(tmp, 'other.bin'))
+        run_backfill(datetime(2024, 6, 1), datetime(2024, 6, 2), step=60, seed=7, store=other)
+        assert (other.records()['meter'] == records['meter']).all()
+        
+        # Older rows after newer ones would break the stores' time-ordered lookups
+        with pytest.raises(ValueError, match='after the last stored reading'):
+            run_backfill(datetime(2024, 1, 1), datetime(2024, 1, 2), step=3600, store=store)
+        assert store.count() == 1440
+    
+    with pytest.raises(ValueError):
+        run_backfill(datetime(2024, 6, 2), datetime(2024, 6, 1), step=60)
+
+def test_backfill_endpoint(client):
+    """Test backfill endpoint runs a job and reports its progress"""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'results.csv')
+        with patch.object(config, 'RESULTS_FILE', csv_path):
+            rv = client.post('/backfill', json={'start': 'not a date', 'end': '2024-01-01'})
+            assert rv.status_code == 400
+            
+            rv = client.post('/backfill', json={'start': '2024-01-01T00:00:00', 'end': '2024-01-01T01:00:00', 'step': 3})
+            assert rv.status_code == 202
+            app.backfill_job.join(timeout=10)
+            
+            data = json.loads(client.get('/backfill').data)
+            assert data['status'] == 'completed'
+            assert data['backfill']['rows_written'] == 1200
+            assert len(json.loads(client.get('/results/latest').data)) == 50
+            
+            # Ranges overlapping stored rows and oversized ranges are refused
+            rv = client.post('/backfill', json={'start': '2024-01-01T00:30:00', 'end': '2024-01-01T02:00:00'})
+            assert rv.status_code == 409
+            with patch.object(config, 'BACKFILL_MAX_ROWS', 100):
+                rv = client.post('/backfill', json={'start': '2024-01-02T00:00:00', 'end': '2024-01-03T00:00:00'})
+                assert rv.status_code == 400
+
+def test_backfill_and_simulation_exclude_each_other(client):
+    """Test a backfill in any process keeps the simulation and other backfills from starting"""
+    from backfill import BackfillLock, BackfillBusy
+    
+    lock = BackfillLock()
+    lock.acquire()
+    try:
+        with pytest.raises(BackfillBusy):
+            BackfillLock().acquire()
+        rv = client.post('/start')
+        assert rv.status_code == 409
+        assert not app.simulation_manager.is_running
+        rv = client.post('/backfill', json={'start': '2030-01-01T00:00:00', 'end': '2030-01-01T01:00:00'})
+        assert rv.status_code == 409
+    finally:
+        lock.release()
+
+def test_aggregate_buckets():
+    """Test per-bucket min/mean/max aggregation"""
+    import numpy as np
+    from aggregation import aggregate, aggregate_chunks, parse_bucket
+    
+    assert parse_bucket('15m') == 15 * 60 * 1_000_000
+    with pytest.raises(ValueError):
+        parse_bucket('5x')
+    
+    minute = 60 * 1_000_000
+    columns = {
+        'timestamp': np.array([0, 20, 40, 60, 80], dtype=np.int64) * 1_000_000,
+        'meter': np.array([1.0, 2.0, 3.0, 10.0, 20.0]),
+        'pv': np.zeros(5),
+        'net': np.array([-1.0, -2.0, -3.0, -10.0, -20.0]),
+    }
+    buckets = aggregate(columns, minute)
+    assert len(buckets) == 2
+    assert buckets[0]['count'] == 3
+    assert buckets[0]['meter'] == {'min': 1.0, 'mean': 2.0, 'max': 3.0}
+    assert buckets[1]['net'] == {'min': -20.0, 'mean': -15.0, 'max': -10.0}
+    assert buckets[1]['timestamp'].startswith('1970-01-01T00:01:00')
+    
+    # Chunks are merged per bucket, including a bucket split across chunks
+    chunks = [{name: values[i:i + 2] for name, values in columns.items()} for i in range(0, 5, 2)]
+    assert aggregate_chunks(chunks, minute) == buckets
+    assert aggregate_chunks([], minute) == []
+
+def test_lttb_keeps_extremes():
+    """Test LTTB caps the point count and keeps peaks"""
+    import numpy as np
+    from aggregation import lttb, lttb_chunks
+    
+    x = np.arange(10_000)
+    y = np.sin(x / 500.0)
+    y[4321] = 50.0  # Spike that must survive downsampling
+    indices = lttb(x, y, 200)
+    assert len(indices) == 200
+    assert indices[0] == 0 and indices[-1] == 9_999
+    assert 4321 in indices
+    assert (np.diff(indices) > 0).all()
+    assert len(lttb(x[:50], y[:50], 200)) == 50
+    
+    # The chunked version picks the same points without holding the series
+    columns = {'timestamp': x, 'meter': y, 'pv': y, 'net': y}
+    read_chunks = lambda: ({name: values[i:i + 777] for name, values in columns.items()} for i in range(0, len(x), 777))
+    assert (lttb_chunks(read_chunks, 'meter', 200)['timestamp'] == x[indices]).all()
+    assert len(lttb_chunks(read_chunks, 'meter', 20_000)['timestamp']) == 10_000
+
+def test_aggregate_endpoint(client):
+    """Test aggregate endpoint over a time range"""
+    from backfill import run_backfill
+    from storage import BinaryResultsStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_path = os.path.join(tmp, 'results.bin')
+        run_backfill(datetime(2024, 1, 1), datetime(2024, 1, 2), step=3, store=BinaryResultsStore(bin_path))
+        
+        with patch.object(config, 'RESULTS_BACKEND', 'binary'), \
+             patch.object(config, 'RESULTS_BINARY_FILE', bin_path):
+            rv = client.get('/results/aggregate?from=2024-01-01T06:00:00&to=2024-01-01T12:00:00&bucket=1h')
+            data = json.loads(rv.data)
+            assert len(data) == 6
+            assert all(bucket['count'] == 1200 for bucket in data)
+            assert data[0]['timestamp'].startswith('2024-01-01T06:00:00')
+            
+            rv = client.get('/results/aggregate?method=lttb&points=100')
+            data = json.loads(rv.data)
+            assert len(data) == 100
+            assert set(data[0]) == {'timestamp', 'meter', 'pv', 'sum', 'net'}
+            
+            assert client.get('/results/aggregate?bucket=soon').status_code == 400
+
+def test_sparse_time_index_range_queries():
+    """Test the CSV time index is built, extended incrementally and rebuilt"""
+    import numpy as np
+    from storage import CsvResultsStore, SparseTimeIndex, INDEX_SUFFIX
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.csv')
+        store = CsvResultsStore(path)
+        store.initialize()
+        start = datetime(2024, 1, 1)
+        rows = [((start.replace(hour=i // 3600, minute=i // 60 % 60, second=i % 60)).isoformat(), 5.0, 1.0, -4.0)
+                for i in range(0, 10000)]
+        store.append(rows[:6000])
+        store.append(rows[6000:])
+        
+        index = SparseTimeIndex(path, stride=512)
+        index.sync()
+        assert index.rows == 10000
+        assert len(index.entries) == 20  # Rows 0, 512, ..., 9728
+        assert store.count() == 10000
+        assert os.path.exists(path + INDEX_SUFFIX)
+        
+        # Range query reads only the matching slice
+        start_us = int(np.datetime64('2024-01-01T01:00:00', 'us').astype(np.int64))
+        end_us = int(np.datetime64('2024-01-01T01:30:00', 'us').astype(np.int64))
+        lo, hi = index.byte_range(start_us, end_us)
+        assert hi - lo < os.path.getsize(path) / 2
+        columns = store.read_range(start_us, end_us)
+        assert len(columns['timestamp']) == 1800
+        assert columns['timestamp'][0] == start_us
+        
+        # Incremental update after more rows, then automatic rebuild when the index is missing
+        store.append([('2024-01-01T03:00:00', 5.0, 1.0, -4.0)])
+        assert store.count() == 10001
+        os.unlink(path + INDEX_SUFFIX)
+        rebuilt = SparseTimeIndex(path, stride=512)
+        rebuilt.sync(persist=True)
+        assert rebuilt.rows == 10001
+        
+        # A persisted index is reused and only the new tail is scanned
+        reloaded = SparseTimeIndex(path, stride=512)
+        reloaded.sync()
+        assert (reloaded.entries == rebuilt.entries).all()
+        
+        # Readers never write the index file, however often they sync
+        persisted = os.path.getsize(path + INDEX_SUFFIX)
+        store.append([('2024-01-01T03:00:01', 5.0, 1.0, -4.0)] * 600)
+        for _ in range(2):
+            SparseTimeIndex(path, stride=512).sync()
+        assert os.path.getsize(path + INDEX_SUFFIX) == persisted
+        
+        # An index file with duplicated entries is ignored and rebuilt
+        with open(path + INDEX_SUFFIX, 'ab') as f:
+            f.write(rebuilt.entries[-3:].tobytes())
+        repaired = SparseTimeIndex(path, stride=512)
+        repaired.sync()
+        assert repaired.rows == 10601
+        assert len(repaired.entries) == 21
+
+def test_get_results_time_range(client):
+    """Test /results?from=&to= returns only matching rows"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.csv')
+        with open(path, 'w') as f:
+            f.write('timestamp,meter,pv,sum\n')
+            for i in range(60):
+                f.write(f'2023-01-01T12:{i:02d}:00,5.5,7.2,1.7\n')
+        
+        with patch.object(config, 'RESULTS_FILE', path):
+            rv = client.get('/results?from=2023-01-01T12:10:00&to=2023-01-01T12:20:00')
+            data = json.loads(rv.data)
+            assert len(data) == 10
+            assert data[0]['timestamp'].startswith('2023-01-01T12:10:00')
+            assert data[0]['net'] == 1.7
+            
+            assert client.get('/results?from=yesterday').status_code == 400
+
+
+def test_broadcaster_bounded_queue_drops_oldest():
+    """Test slow stream clients keep only the newest records"""
+    from broadcast import ResultBroadcaster
+    
+    broadcaster = ResultBroadcaster(max_queue=3, max_clients=1)
+    subscription = broadcaster.subscribe()
+    assert broadcaster.subscribe() is None
+    
+    broadcaster.publish([(f'2025-01-01T12:00:0{i}', 5.0, 2.0, -3.0) for i in range(5)])
+    records = subscription.get(timeout=0.1)
+    assert [r['timestamp'] for r in records] == ['2025-01-01T12:00:02', '2025-01-01T12:00:03', '2025-01-01T12:00:04']
+    assert records[0]['net'] == records[0]['sum'] == -3.0
+    assert subscription.dropped == 2
+    assert subscription.get(timeout=0.01) == []
+    
+    subscription.close()
+    assert broadcaster.client_count == 0
+
+
+def test_results_stream_endpoint(client):
+    """Test the SSE endpoint delivers only rows published after subscribing"""
+    from broadcast import broadcaster
+    
+    broadcaster.publish([('2025-01-01T11:59:57', 1.0, 1.0, 0.0)])
+    rv = client.get('/results/stream', buffered=False)
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/event-stream'
+    assert broadcaster.client_count == 1
+    
+    broadcaster.publish([('2025-01-01T12:00:00', 5.5, 7.2, 1.7)])
+    events = iter(rv.response)
+    assert next(events).startswith(b'retry:')
+    event = next(events).decode()
+    assert event.startswith('data: ')
+    assert json.loads(event[len('data: '):]) == [
+        {'timestamp': '2025-01-01T12:00:00', 'meter': 5.5, 'pv': 7.2, 'sum': 1.7, 'net': 1.7}
+    ]
+    
+    rv.close()
+    assert broadcaster.client_count == 0
+
+
+def test_read_since_cursor():
+    """Test cursor reads return only rows appended after the cursor"""
+    from storage import CsvResultsStore, BinaryResultsStore
+    
+    tmpdir = tempfile.mkdtemp()
+    for store in (CsvResultsStore(os.path.join(tmpdir, 'r.csv')), BinaryResultsStore(os.path.join(tmpdir, 'r.bin'))):
+        store.initialize()
+        store.append([('2025-01-01T12:00:00', 5.0, 1.0, -4.0), ('2025-01-01T12:00:03', 5.5, 1.0, -4.5)])
+        
+        rows, cursor = store.read_since(0, 50)
+        assert [r['timestamp'][:19] for r in rows] == ['2025-01-01T12:00:00', '2025-01-01T12:00:03']
+        assert store.read_since(cursor, 50) == ([], cursor)
+        
+        store.append([('2025-01-01T12:00:06', 6.0, 1.0, -5.0), ('2025-01-01T12:00:09', 6.5, 1.0, -5.5)])
+        rows, next_cursor = store.read_since(cursor, 1)
+        assert [r['timestamp'][:19] for r in rows] == ['2025-01-01T12:00:09']
+        assert next_cursor == store.size_bytes()
+        # Cursors beyond the end of the file start over
+        rows, _ = store.read_since(next_cursor + 1000, 50)
+        assert len(rows) == 4
+    
+    # A row still being written is left for the next call
+    csv_store = CsvResultsStore(os.path.join(tmpdir, 'r.csv'))
+    _, cursor = csv_store.read_since(0, 50)
+    with open(csv_store.path, 'a') as f:
+        f.write('2025-01-01T12:00:12,7.0,1.')
+    assert csv_store.read_since(cursor, 50) == ([], cursor)
+    assert cursor < csv_store.size_bytes()
+
+
+def test_get_latest_results_since_and_etag(client):
+    """Test /results/latest cursors and conditional requests"""
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv') as f:
+        f.write('timestamp,meter,pv,sum\n')
+        f.write('2023-01-01T12:00:00,5.5,7.2,1.7\n')
+        temp_file = f.name
+    
+    with patch.object(config, 'RESULTS_FILE', temp_file):
+        rv = client.get('/results/latest?since=0')
+        assert rv.status_code == 200
+        data = rv.get_json()
+        assert [r['net'] for r in data['results']] == [1.7]
+        etag = rv.headers['ETag']
+        
+        rv = client.get(f"/results/latest?since={data['cursor']}", headers={'If-None-Match': etag})
+        assert rv.status_code == 304
+        assert rv.data == b''
+        
+        with open(temp_file, 'a') as f:
+            f.write('2023-01-01T12:00:03,6.1,7.1,1.0\n')
+        rv = client.get(f"/results/latest?since={data['cursor']}", headers={'If-None-Match': etag})
+        assert rv.status_code == 200
+        assert rv.headers['ETag'] != etag
+        assert [r['timestamp'] for r in rv.get_json()['results']] == ['2023-01-01T12:00:03']
+        
+        assert client.get('/results/latest?since=abc').status_code == 400
+        
+        # A failed read keeps the cursor shape, so the client can poll again
+        with patch('storage.CsvResultsStore.read_since', side_effect=OSError("read failed")):
+            rv = client.get(f"/results/latest?since={data['cursor']}")
+            assert rv.get_json() == {'results': [], 'cursor': data['cursor']}
+    
+    os.unlink(temp_file)
+
+
+def test_latest_results_have_one_shape_across_backends(client, tmp_path):
+    """Test /results/latest returns the same records from the ring buffer, CSV and binary stores"""
+    from storage import BinaryResultsStore, CsvResultsStore
+    
+    rows = [
+        ('2023-01-01T12:00:00', 5.5, 7.2, 1.7),
+        ('2023-01-01T12:00:03.250000', 6.126, 7.1, 0.974),
+        ('2023-01-01T12:00:06', 4.8, 0.0, -4.8),
+    ]
+    csv_path, bin_path = str(tmp_path / 'results.csv'), str(tmp_path / 'results.bin')
+    CsvResultsStore(csv_path).initialize()
+    CsvResultsStore(csv_path).append(rows)
+    BinaryResultsStore(bin_path).initialize()
+    BinaryResultsStore(bin_path).append(rows)
+    
+    responses = []
+    for backend, ring_capacity in (('csv', app.recent_results.capacity), ('csv', 0), ('binary', 0)):
+        with patch.object(config, 'RESULTS_BACKEND', backend), \
+             patch.object(config, 'RESULTS_FILE', csv_path), \
+             patch.object(config, 'RESULTS_BINARY_FILE', bin_path), \
+             patch.object(app.recent_results, 'capacity', ring_capacity):
+            responses.append(client.get('/results/latest').get_json())
+            responses.append(client.get('/results/latest?since=0').get_json()['results'])
+    
+    assert responses[0] == [
+        {'timestamp': '2023-01-01T12:00:00', 'meter': 5.5, 'pv': 7.2, 'sum': 1.7, 'net': 1.7},
+        {'timestamp': '2023-01-01T12:00:03.250000', 'meter': 6.13, 'pv': 7.1, 'sum': 0.97, 'net': 0.97},
+        {'timestamp': '2023-01-01T12:00:06', 'meter': 4.8, 'pv': 0.0, 'sum': -4.8, 'net': -4.8},
+    ]
+    assert all(response == responses[0] for response in responses)
+
+
+def test_ring_buffer_write_through_and_catch_up():
+    """Test the ring buffer serves recent rows and follows external appends"""
+    from storage import CsvResultsStore, to_epoch_micros
+    from ring_buffer import ResultRingBuffer
+    
+    store = CsvResultsStore(os.path.join(tempfile.mkdtemp(), 'results.csv'))
+    store.initialize()
+    store.append([(f'2025-01-01T12:00:0{i}', 5.0, float(i), i - 5.0) for i in range(3)])
+    
+    ring = ResultRingBuffer(capacity=4)
+    ring.warm(store)
+    assert [r['pv'] for r in ring.latest(store, 4)] == [0.0, 1.0, 2.0]
+    assert ring.total_rows(store) == 3
+    
+    # Written through the buffer, then appended behind its back (e.g. by a backfill)
+    ring.write(store, [('2025-01-01T12:00:03', 5.0, 3.0, -2.0)])
+    store.append([('2025-01-01T12:00:04', 5.0, 4.0, -1.0), ('2025-01-01T12:00:05', 5.0, 5.0, 0.0)])
+    latest = ring.latest(store, 4)
+    assert [r['pv'] for r in latest] == [2.0, 3.0, 4.0, 5.0]
+    assert latest[-1] == {'timestamp': '2025-01-01T12:00:05', 'meter': 5.0, 'pv': 5.0, 'sum': 0.0, 'net': 0.0}
+    assert ring.total_rows(store) == 6
+    assert ring.latest(store, 5) is None
+    
+    # Ranges are answered only when the buffer reaches back far enough
+    start_us = to_epoch_micros(['2025-01-01T12:00:03'])[0]
+    assert [r['pv'] for r in ring.read_range(store, start_us)] == [3.0, 4.0, 5.0]
+    assert ring.read_range(store, None) is None
+    
+    # A truncated store is reloaded from scratch
+    with open(store.path, 'w') as f:
+        f.write('timestamp,meter,pv,sum\n2025-01-02T00:00:00,1.0,0.0,-1.0\n')
+    assert [r['timestamp'] for r in ring.read_range(store)] == ['2025-01-02T00:00:00']
+    assert ring.total_rows(store) == 1
+
+
+def _coordination_worker(conn, barrier):
+    """A server process: races the others to /start, then answers commands"""
+    import app as worker_app
+    
+    client = worker_app.app.test_client()
+    barrier.wait()
+    rv = client.post('/start')
+    conn.send(rv.get_json()['status'])
+    while True:
+        command = conn.recv()
+        if command == 'exit':
+            break
+        rv = client.get('/status') if command == 'status' else client.post('/stop')
+        conn.send(rv.get_json())
+    worker_app.coordinator.stop()
+
+
+def test_single_leader_across_worker_processes(tmp_path, monkeypatch):
+    """Test exactly one of several server processes runs the simulation"""
+    import multiprocessing
+    import time
+    from storage import CsvResultsStore
+    
+    results_file = tmp_path / 'results.csv'
+    monkeypatch.setenv('DATA_DIR', str(tmp_path))
+    monkeypatch.setenv('RESULTS_FILE', str(results_file))
+    # Each process runs its own in-process broker instead of RabbitMQ
+    monkeypatch.setenv('TRANSPORT', 'inprocess')
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(3)
+    pipes, processes = [], []
+    for _ in range(3):
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_coordination_worker, args=(child, barrier), daemon=True)
+        process.start()
+        pipes.append(parent)
+        processes.append(process)
+    
+    def ask(pipe, command=None):
+        if command:
+            pipe.send(command)
+        assert pipe.poll(60), "worker process did not answer"
+        return pipe.recv()
+    
+    try:
+        starts = [ask(pipe) for pipe in pipes]
+        assert sorted(starts) == ['already running', 'already running', 'started']
+        leader = pipes[starts.index('started')]
+        follower = pipes[starts.index('already running')]
+        
+        time.sleep(1.5)
+        statuses = [ask(pipe, 'status') for pipe in pipes]
+        assert all(status['running'] for status in statuses)
+        assert len({status['leader_pid'] for status in statuses}) == 1
+        
+        # A single writer: one row per meter reading, no duplicate timestamps
+        rows = CsvResultsStore(str(results_file)).read_all()
+        assert len(rows) >= 1
+        assert len({row['timestamp'] for row in rows}) == len(rows)
+        
+        # A stop request from any process stops the leader
+        assert ask(follower, 'stop')['status'] == 'stopped'
+        assert not any(ask(pipe, 'status')['running'] for pipe in (leader, follower))
+    finally:
+        for pipe in pipes:
+            pipe.send('exit')
+        for process in processes:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.terminate()
+
+
+def test_leader_probe_and_stop_requests_do_not_disturb_other_runs(tmp_path, monkeypatch):
+    """Test probing the leader lock never takes it and stale stop requests are ignored"""
+    import threading
+    import time
+    from coordination import LeaderLock, SimulationCoordinator, LOCK_FILE
+    
+    path = str(tmp_path / LOCK_FILE)
+    probe, leader = LeaderLock(path), LeaderLock(path)
+    assert not probe.held_elsewhere()
+    
+    # A probe running all the time never makes an acquire fail
+    done = threading.Event()
+    
+    def poll():
+        while not done.is_set():
+            probe.held_elsewhere()
+    
+    poller = threading.Thread(target=poll)
+    poller.start()
+    try:
+        for _ in range(500):
+            assert leader.acquire()
+            leader.release()
+    finally:
+        done.set()
+        poller.join()
+    assert leader.acquire()
+    assert probe.held_elsewhere()
+    assert not leader.held_elsewhere()
+    leader.release()
+    assert not probe.held_elsewhere()
+    
+    # A stop request naming an earlier run does not stop the current leader
+    monkeypatch.setattr(config, 'LEADER_HEARTBEAT', 0.05)
+    manager = Mock(is_running=False, fleet_size=1)
+    manager.start.side_effect = lambda **kwargs: setattr(manager, 'is_running', True) or True
+    manager.throughput.return_value = [{'messages': 0}]
+    coordinator = SimulationCoordinator(manager, data_dir=str(tmp_path))
+    assert coordinator.start() == 'started'
+    try:
+        started_at = coordinator._state.read()['started_at']
+        coordinator._state.update(stop_requested=started_at - 1)
+        time.sleep(0.3)
+        assert coordinator.is_leader
+        manager.stop.assert_not_called()
+        
+        # One naming this run does
+        coordinator._state.update(stop_requested=started_at)
+        deadline = time.monotonic() + 5
+        while coordinator.is_leader and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not coordinator.is_leader
+        manager.stop.assert_called()
+    finally:
+        coordinator.stop()
+
+
+def test_in_process_broker_batching_and_backpressure():
+    """Test the in-process transport delivers in batches, bounds queues and redelivers"""
+    from transport import InProcessBroker, BackpressureTimeout
+    
+    broker = InProcessBroker(max_queue_size=3, publish_timeout=0.05)
+    channel = broker.connect().channel()
+    channel.queue_declare(queue='q', durable=True)
+    for i in range(3):
+        channel.basic_publish(exchange='', routing_key='q', body=f'm{i}')
+    with pytest.raises(BackpressureTimeout):
+        channel.basic_publish(exchange='', routing_key='q', body='m3')
+    
+    connection = broker.connect()
+    consumer = connection.channel()
+    consumer.basic_qos(prefetch_count=2)
+    received = []
+    consumer.basic_consume(queue='q', on_message_callback=lambda ch, method, props, body: received.append((method.delivery_tag, body)))
+    connection.process_data_events(time_limit=0.1)
+    assert received == [(1, b'm0'), (2, b'm1')]
+    
+    # The prefetch window is full until messages are acknowledged
+    connection.process_data_events(time_limit=0.01)
+    assert len(received) == 2
+    consumer.basic_nack(delivery_tag=2, multiple=True, requeue=True)
+    connection.process_data_events(time_limit=0.1)
+    assert [body for _, body in received[2:]] == [b'm0', b'm1']
+    consumer.basic_ack(delivery_tag=4, multiple=True)
+    
+    # Unacknowledged messages go back to the queue when the connection closes
+    connection.process_data_events(time_limit=0.1)
+    assert received[-1][1] == b'm2'
+    connection.close()
+    assert broker.depths() == {'q': 1}
+
+
+def test_meter_publish_resumes_after_backpressure_without_duplicates():
+    """Test a burst cut short by backpressure keeps only its unsent messages"""
+    from transport import InProcessBroker, BackpressureTimeout
+    
+    broker = InProcessBroker(max_queue_size=3, publish_timeout=0.01)
+    channel = broker.connect().channel()
+    channel.queue_declare(queue='q', durable=True)
+    pending = [('q', f'm{i}') for i in range(5)]
+    with pytest.raises(BackpressureTimeout):
+        SimulationManager._publish(channel, pending)
+    assert pending == [('q', 'm3'), ('q', 'm4')]
+    
+    queue = broker.declare('q')
+    delivered = [body for (body, _), _ in queue.get_batch(3, 0)]
+    SimulationManager._publish(channel, pending)
+    assert pending == []
+    delivered += [body for (body, _), _ in queue.get_batch(3, 0)]
+    assert delivered == [b'm0', b'm1', b'm2', b'm3', b'm4']
+
+
+def test_meter_burst_is_committed_as_one_transaction():
+    """Test a batched burst costs one commit, and a failed burst is rolled back and kept"""
+    channel = Mock()
+    pending = [('q', f'm{i}') for i in range(5)]
+    SimulationManager._publish(channel, pending, transactional=True)
+    assert pending == []
+    assert channel.basic_publish.call_count == 5
+    channel.tx_commit.assert_called_once()
+    
+    pending = [('q', f'm{i}') for i in range(5)]
+    channel.tx_commit.side_effect = ConnectionError("commit failed")
+    with pytest.raises(ConnectionError):
+        SimulationManager._publish(channel, pending, transactional=True)
+    channel.tx_rollback.assert_called_once()
+    assert len(pending) == 5
+
+
+def test_simulation_runs_on_in_process_transport(tmp_path):
+    """Test the full pipeline writes results without RabbitMQ"""
+    import time
+    from storage import CsvResultsStore
+    
+    results_file = str(tmp_path / 'results.csv')
+    with patch.object(config, 'TRANSPORT', 'inprocess'), \
+         patch.object(config, 'RESULTS_FILE', results_file), \
+         patch.object(config, 'BATCH_MODE', True), \
+         patch.object(config, 'BATCH_LINGER', 0.1):
+        manager = SimulationManager()
+        assert manager.start(fleet_size=50, consumers=2)
+        deadline = time.monotonic() + 10
+        while CsvResultsStore(results_file).count() < 50 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        manager.stop()
+    
+    assert CsvResultsStore(results_file).count() == 50
+    assert sum(stats['messages'] for stats in manager.throughput()) == 50
+
+
+def test_async_engine_thousands_of_meters(tmp_path):
+    """Test the asyncio engine runs a large fleet on one loop and stops promptly"""
+    import time
+    import threading
+    from storage import CsvResultsStore
+    from async_engine import AsyncSimulationEngine
+    
+    results_file = str(tmp_path / 'results.csv')
+    threads_before = threading.active_count()
+    with patch.object(config, 'RESULTS_FILE', results_file), \
+         patch.object(config, 'METER_INTERVAL', 1):
+        engine = AsyncSimulationEngine()
+        assert engine.start(fleet_size=2000, consumers=4)
+        assert not engine.start()
+        assert engine.is_running and engine.fleet_size == 2000
+        # One loop thread plus the writer, not one thread per meter
+        assert threading.active_count() - threads_before <= 2
+        
+        deadline = time.monotonic() + 10
+        while CsvResultsStore(results_file).count() < 2000 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        
+        stop_started = time.monotonic()
+        assert engine.stop()
+        assert time.monotonic() - stop_started < 1.0
+        assert not engine.is_running
+    
+    rows = CsvResultsStore(results_file).count()
+    assert rows >= 2000
+    assert sum(stats['messages'] for stats in engine.throughput()) == rows
+
+
+def test_async_engine_stop_writes_batches_waiting_for_the_writer(tmp_path):
+    """Test stopping during a slow write still writes every consumer's batch"""
+    import asyncio
+    import time
+    from async_engine import AsyncSimulationEngine
+    
+    written = []
+    
+    class SlowWriteEngine(AsyncSimulationEngine):
+        async def _meter(self, site, queue, phase):
+            for second in range(5):
+                await queue.put((f'2025-01-01T12:00:0{second}', 1.0, site.capacity_kw))
+            await asyncio.Event().wait()
+        
+        @staticmethod
+        def _write(store, stats, readings):
+            time.sleep(0.2)
+            written.extend(readings)
+    
+    with patch.object(config, 'RESULTS_FILE', str(tmp_path / 'results.csv')), \
+         patch.object(config, 'BATCH_SIZE', 2), \
+         patch.object(config, 'PREFETCH_COUNT', 100):
+        engine = SlowWriteEngine()
+        assert engine.start(fleet_size=4, consumers=2)
+        # Stop while one consumer's batch is being written and the other's waits for the writer
+        time.sleep(0.1)
+        assert engine.stop()
+    
+    assert len(written) == 20
+
+
+def test_process_batch_writer_writes_pool_results_in_order(tmp_path):
+    """Test batches computed in pool processes are written and acked in submission order"""
+    from simulation import ProcessBatchWriter, create_pv_pool
+    from storage import CsvResultsStore
+    
+    store = CsvResultsStore(str(tmp_path / 'results.csv'))
+    store.initialize()
+    channel = Mock()
+    pool = create_pv_pool(1, {1: 4.0})
+    try:
+        writer = ProcessBatchWriter(store, channel, batch_size=2, linger=60, pool=pool, max_pending=4)
+        for tag in range(1, 6):
+            body = json.dumps({'timestamp': f'2023-01-01T12:00:0{tag}', 'meter': 5.0, 'meter_id': 1})
+            writer.add((body.encode(), 'application/json'), tag)
+        writer.add((b'not json', None), 6)
+        # A malformed timestamp is rejected on its own, not requeued with its batch
+        writer.add((json.dumps({'timestamp': 'garbage', 'meter': 5.0}).encode(), None), 7)
+        writer.add((json.dumps({'timestamp': '2023-01-01T12:00:08', 'meter': 5.0}).encode(), None), 8)
+        writer.close()
+    finally:
+        pool.shutdown()
+    
+    assert [c.kwargs for c in channel.basic_nack.call_args_list] == [
+        {'delivery_tag': 6, 'requeue': False}, {'delivery_tag': 7, 'requeue': False}
+    ]
+    assert [c.kwargs['delivery_tag'] for c in channel.basic_ack.call_args_list] == [2, 4, 5, 8]
+    rows = store.read_all()
+    assert [row['timestamp'] for row in rows] == [f'2023-01-01T12:00:0{tag}' for tag in (1, 2, 3, 4, 5, 8)]
+    # PV is computed with the site capacity passed to the pool
+    assert float(rows[0]['pv']) == 4.0
+
+def test_validate_batch_matches_model_bounds():
+    """Test vectorized validation reports the rows the models would reject"""
+    import numpy as np
+    from models import validate_batch
+    
+    pv = np.array([0.0, 10.0, 10.01, 5.0, np.nan])
+    net = np.array([-20.0, 10.0, 0.0, -20.5, 0.0])
+    violations = validate_batch(pv=pv, net=net)
+    assert violations['pv'].tolist() == [False, False, True, False, True]
+    assert violations['net'].tolist() == [False, False, False, True, False]
+    
+    for p, n, rejected in zip(pv, net, violations['pv'] | violations['net']):
+        if np.isnan(p):
+            continue
+        try:
+            PVData(timestamp=datetime.now(), meter=5.0, pv=p, net=n)
+            assert not rejected
+        except ValueError:
+            assert rejected
+    
+    assert validate_batch(meter=[0.0, 20.0], pv=5.0) == {}
+    assert validate_batch(meter=[20.5])['meter'].tolist() == [True]
+
+
+def test_binary_meter_frames_roundtrip_and_batching(tmp_path):
+    """Test binary frames carry the same readings as JSON and settle each message once"""
+    from fleet import build_fleet
+    from simulation import BatchWriter, create_meter_messages, decode_meter_samples
+    from storage import CsvResultsStore
+    from wire import CONTENT_TYPE_BINARY, READING_DTYPE, message_properties
+    
+    sites = build_fleet(10, 2, seed=1)
+    capacities = {site.meter_id: site.capacity_kw for site in sites}
+    frames = create_meter_messages(sites, wire_format='binary', frame_size=4)
+    assert all(isinstance(body, bytes) for _, body in frames)
+    assert sum(len(body) for _, body in frames) == 10 * READING_DTYPE.itemsize
+    assert all(len(body) <= 4 * READING_DTYPE.itemsize for _, body in frames)
+    assert message_properties(frames[0][1]).content_type == CONTENT_TYPE_BINARY
+    
+    readings = [r for _, body in frames for r in decode_meter_samples(body, CONTENT_TYPE_BINARY, capacities)]
+    assert sorted(r[2] for r in readings) == sorted(capacities.values())
+    assert all(r[1] == round(r[1], 2) and 0.5 <= r[1] <= 10.0 for r in readings)
+    
+    # Single-reading frames take a struct fast path that matches the NumPy decoder
+    from storage import to_epoch_micros
+    from wire import decode_frame
+    _, single = create_meter_messages(sites[:1], wire_format='binary', frame_size=1)[0]
+    timestamp, meter, capacity = decode_meter_samples(single, CONTENT_TYPE_BINARY, capacities)[0]
+    record = decode_frame(single)[0]
+    assert to_epoch_micros([timestamp])[0] == record['timestamp']
+    assert meter == round(float(record['meter']), 2) and capacity == sites[0].capacity_kw
+    
+    # JSON messages are still accepted when no content type is given
+    _, body = create_meter_messages(sites[:1], wire_format='json')[0]
+    assert decode_meter_samples(body, None, capacities)[0][2] == sites[0].capacity_kw
+    
+    store = CsvResultsStore(str(tmp_path / 'results.csv'))
+    store.initialize()
+    channel = Mock()
+    writer = BatchWriter(store, channel, batch_size=3, linger=60)
+    frame = [('2023-01-01T12:00:00', 5.0, 8.0), ('2023-01-01T12:00:00', 5.0, 40.0),
+             ('2023-01-01T12:00:00', 5.0, 8.0), ('2023-01-01T12:00:00', 5.0, 8.0)]
+    writer.add_all(frame, 1)
+    # The whole frame goes into one batch; its invalid reading is dropped, not the message
+    channel.basic_ack.assert_called_once_with(delivery_tag=1, multiple=True)
+    channel.basic_nack.assert_not_called()
+    assert store.count() == 3
+
+
+def test_get_results_streams_pages_and_ndjson(client):
+    """Test /results streams a JSON array or NDJSON and supports offset/limit paging"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.csv')
+        with open(path, 'w') as f:
+            f.write('timestamp,meter,pv,sum\n')
+            for i in range(5000):
+                f.write(f'2023-01-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d},5.5,7.2,1.7\n')
+        
+        # Too many rows for the ring buffer, so the file is streamed
+        with patch.object(config, 'RESULTS_FILE', path), \
+             patch.object(app.recent_results, 'capacity', 0):
+            rv = client.get('/results')
+            assert rv.is_streamed
+            data = json.loads(rv.data)
+            assert len(data) == 5000
+            assert data[4999]['timestamp'] == '2023-01-01T01:23:19'
+            assert data[0]['net'] == 1.7
+            
+            data = json.loads(client.get('/results?offset=4500&limit=2').data)
+            assert [r['timestamp'] for r in data] == ['2023-01-01T01:15:00', '2023-01-01T01:15:01']
+            assert json.loads(client.get('/results?offset=6000').data) == []
+            
+            rv = client.get('/results?from=2023-01-01T00:10:00&offset=1&limit=3', headers={'Accept': 'application/x-ndjson'})
+            assert rv.mimetype == 'application/x-ndjson'
+            lines = [json.loads(line) for line in rv.data.decode().splitlines()]
+            assert [r['timestamp'][:19] for r in lines] == [
+                '2023-01-01T00:10:01', '2023-01-01T00:10:02', '2023-01-01T00:10:03'
+            ]
+            
+            assert client.get('/results?limit=-1').status_code == 400
+        
+        # Ranges are paged and aggregated chunk by chunk, never read whole
+        with patch.object(config, 'RESULTS_FILE', path), \
+             patch.object(app, 'RECORD_CHUNK_ROWS', 100), \
+             patch('storage.CsvResultsStore.read_range', side_effect=AssertionError('range read whole')):
+            data = json.loads(client.get('/results?from=2023-01-01T00:10:00&offset=250&limit=120').data)
+            assert len(data) == 120
+            assert data[0]['timestamp'][:19] == '2023-01-01T00:14:10'
+            assert data[-1]['timestamp'][:19] == '2023-01-01T00:16:09'
+            
+            buckets = json.loads(client.get('/results/aggregate?from=2023-01-01T00:10:00&bucket=10m').data)
+            assert sum(bucket['count'] for bucket in buckets) == 4400
+            points = json.loads(client.get('/results/aggregate?from=2023-01-01T00:10:00&method=lttb&points=50').data)
+            assert len(points) == 50
+            assert client.get('/results/aggregate?method=lttb&points=1000000').status_code == 400
+
+
+def test_export_endpoint_streams_csv_range(client):
+    """Test /results/export streams a time range and rejects unusable formats"""
+    import importlib.util
+    from storage import BinaryResultsStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_path = os.path.join(tmp, 'results.bin')
+        store = BinaryResultsStore(bin_path)
+        store.initialize()
+        store.append([(f'2023-01-01T12:{i:02d}:00', 5.0, 7.0, 2.0) for i in range(60)])
+        
+        with patch.object(config, 'RESULTS_BACKEND', 'binary'), \
+             patch.object(config, 'RESULTS_BINARY_FILE', bin_path):
+            rv = client.get('/results/export?from=2023-01-01T12:10:00&to=2023-01-01T12:20:00')
+            assert rv.status_code == 200 and rv.is_streamed
+            assert rv.mimetype == 'text/csv'
+            assert 'results.csv' in rv.headers['Content-Disposition']
+            lines = rv.data.decode().splitlines()
+            assert lines[0] == 'timestamp,meter,pv,sum'
+            assert len(lines) == 11
+            assert lines[1] == '2023-01-01T12:10:00,5.0,7.0,2.0'
+            
+            assert client.get('/results/export?format=xlsx').status_code == 400
+            if importlib.util.find_spec('pyarrow') is None:
+                assert client.get('/results/export?format=parquet').status_code == 501
+
+
+def test_export_cli_parquet_and_arrow_roundtrip(tmp_path):
+    """Test the export CLI writes Parquet row groups and Arrow streams readable by pyarrow"""
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    import cli
+    from storage import CsvResultsStore
+    
+    results_file = str(tmp_path / 'results.csv')
+    store = CsvResultsStore(results_file)
+    store.initialize()
+    store.append([(f'2023-01-01T12:{i // 60:02d}:{i % 60:02d}', 5.5, 7.25, 1.75) for i in range(3000)])
+    
+    with patch.object(config, 'RESULTS_FILE', results_file):
+        target = str(tmp_path / 'out.parquet')
+        assert cli.main(['export', target, '--backend', 'csv', '--from', '2023-01-01T12:10:00']) == 0
+        table = pq.read_table(target)
+        assert table.num_rows == 2400
+        assert table.schema.field('timestamp').type == pa.timestamp('us')
+        assert table.column('pv')[0].as_py() == 7.25
+        
+        target = str(tmp_path / 'out.arrow')
+        assert cli.main(['export', target, '--backend', 'csv']) == 0
+        with open(target, 'rb') as f:
+            assert pa.ipc.open_stream(f).read_all().num_rows == 3000
+
+
+def test_partitioned_store_compaction_and_retention(tmp_path, monkeypatch):
+    """Test day partitions are compacted once closed, keep late rows and expire"""
+    import numpy as np
+    from storage import PartitionedResultsStore, DAY_MICROS, to_epoch_micros
+    from ring_buffer import ResultRingBuffer
+    
+    store = PartitionedResultsStore(str(tmp_path / 'results'))
+    store.initialize()
+    monkeypatch.setattr(config, 'RESULTS_AUTO_COMPACT', False)
+    start = int(to_epoch_micros(['2023-01-01T00:00:00'])[0])
+    timestamps = start + np.arange(0, 3 * DAY_MICROS, 60_000_000)
+    rows = len(timestamps)
+    store.append_columns({
+        'timestamp': timestamps,
+        'meter': np.full(rows, 5.0),
+        'pv': np.full(rows, 7.0),
+        'net': np.full(rows, 2.0),
+    })
+    _, cursor = store.read_since(0, 1)
+    
+    def partition_files():
+        return sorted(name for name in os.listdir(store.path) if name.startswith('results-'))
+    
+    store.compact()
+    assert partition_files() == [
+        'results-2023-01-01.pvc', 'results-2023-01-02.pvc', 'results-2023-01-03.bin'
+    ]
+    assert store.count() == rows
+    columns = store.read_range(start + DAY_MICROS - 120_000_000, start + DAY_MICROS + 120_000_000)
+    assert len(columns['timestamp']) == 4
+    assert [r['meter'] for chunk in store.iter_records(1439, 2) for r in chunk] == [5.0, 5.0]
+    
+    # Late rows for a compacted day are kept beside it until the next compaction
+    store.append([('2023-01-01T23:59:59.5', 1.0, 2.0, 3.0), ('2023-01-04T00:00:00', 1.0, 2.0, 3.0)])
+    assert store.count() == rows + 2
+    assert store.read_range(start, start + DAY_MICROS)['meter'][-1] == 1.0
+    new_rows, cursor = store.read_since(cursor, 10)
+    assert [r['timestamp'] for r in new_rows] == ['2023-01-04T00:00:00']
+    assert store.compact() == (2, 0)
+    assert store.count() == rows + 2
+    
+    # ETag and end cursor come from stat calls, without opening a partition
+    ring = ResultRingBuffer(10)
+    assert ring.total_rows(store) == rows + 2
+    with patch('storage.DayPartition', side_effect=AssertionError('partition opened')):
+        etag = store.etag()
+        assert store.end_cursor() == cursor
+    # A late row for an older day moves neither the end nor the newest segment
+    store.append([('2023-01-02T12:00:00.5', 1.0, 2.0, 3.0)])
+    assert store.end_cursor() == cursor
+    assert store.etag() != etag
+    assert ring.total_rows(store) == rows + 3
+    
+    etag = store.etag()
+    with patch.object(config, 'RESULTS_RETENTION_DAYS', 2):
+        assert store.compact(today=start // DAY_MICROS + 3) == (0, 2)
+    assert partition_files() == ['results-2023-01-03.pvc', 'results-2023-01-04.bin']
+    assert store.read_since(cursor, 10) == ([], cursor)
+    assert store.etag() != etag
+    assert ring.total_rows(store) == store.count() == 1441
+
+
+def test_partitioned_store_writers_take_the_directory_flock(tmp_path, monkeypatch):
+    """Test appends and compactions wait for a flock held by another process"""
+    import fcntl
+    import threading
+    from storage import PartitionedResultsStore, PARTITION_LOCK_FILE
+    
+    store = PartitionedResultsStore(str(tmp_path / 'results'))
+    monkeypatch.setattr(config, 'RESULTS_AUTO_COMPACT', False)
+    store.append([('2023-01-01T12:00:00', 5.0, 7.0, 2.0)])
+    
+    for write in (lambda: store.append([('2023-01-02T12:00:00', 5.0, 7.0, 2.0)]), store.compact):
+        # A separate open file description conflicts like another process would
+        with open(os.path.join(store.path, PARTITION_LOCK_FILE), 'ab') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.2)
+            assert writer.is_alive()
+        writer.join(5)
+        assert not writer.is_alive()
+    assert store.count() == 2
+    assert os.path.exists(os.path.join(store.path, 'results-2023-01-01.pvc'))
+
+
+def test_export_reads_only_overlapping_partitions(client, tmp_path, monkeypatch):
+    """Test range reads of the partitioned store open only the days in the range"""
+    import numpy as np
+    import storage
+    
+    opened = []
+    real_partition = storage.DayPartition
+    def partition(directory, day):
+        opened.append(day)
+        return real_partition(directory, day)
+    
+    store = storage.PartitionedResultsStore(str(tmp_path / 'results'))
+    monkeypatch.setattr(config, 'RESULTS_AUTO_COMPACT', False)
+    store.append([(f'2023-01-{day:02d}T12:00:00', 5.0, 7.0, 2.0) for day in range(1, 11)])
+    
+    with patch.object(config, 'RESULTS_BACKEND', 'partitioned'), \
+         patch.object(config, 'RESULTS_PARTITION_DIR', store.path), \
+         patch.object(storage, 'DayPartition', side_effect=partition):
+        rv = client.get('/results/export?from=2023-01-04T00:00:00&to=2023-01-06T00:00:00')
+        lines = rv.data.decode().splitlines()
+    assert lines[1:] == ['2023-01-04T12:00:00,5.0,7.0,2.0', '2023-01-05T12:00:00,5.0,7.0,2.0']
+    assert [str(np.datetime64(day, 'D')) for day in opened] == ['2023-01-04', '2023-01-05']
+
+
+def test_pipeline_counters_maintained_persisted_and_recovered(tmp_path):
+    """Test batch writes update the counters, which survive reopening and are rebuilt from the store"""
+    from counters import PipelineCounters
+    from simulation import BatchWriter
+    from storage import CsvResultsStore
+    
+    results_file = str(tmp_path / 'results.csv')
+    store = CsvResultsStore(results_file)
+    store.initialize()
+    counters = PipelineCounters(str(tmp_path / 'pipeline.counters'))
+    
+    with patch.object(config, 'RESULTS_FILE', results_file), \
+         patch('simulation.pipeline_counters', counters):
+        counters.open()  # Seeded from the store: the CSV header so far
+        writer = BatchWriter(store, Mock(), batch_size=3, linger=60)
+        writer.add(('2023-01-01T12:00:00', 5.0, 8.0), 1)
+        writer.add(('2023-01-01T12:00:03', 5.0, 8.0), 2)
+        writer.add(('2023-01-01T12:00:06', 5.0, 40.0), 3)  # PV above the validated range
+        
+        snapshot = counters.snapshot()
+        assert snapshot['rows_written'] == 2
+        assert snapshot['bytes_written'] == store.size_bytes()
+        assert (snapshot['messages_consumed'], snapshot['messages_acked'], snapshot['messages_nacked']) == (3, 2, 1)
+        assert snapshot['validation_failures'] == 1
+        assert snapshot['last_write'] > 0
+        counters.close()
+        
+        assert PipelineCounters(counters.path).snapshot() == snapshot
+        
+        # A lost counters file is rebuilt from the results store
+        os.unlink(counters.path)
+        recovered = PipelineCounters(counters.path).snapshot()
+        assert recovered['rows_written'] == 2
+        assert recovered['bytes_written'] == store.size_bytes()
+        assert recovered['messages_consumed'] == 0
+
+
+def test_metrics_prometheus_format(client):
+    """Test /metrics is served in the Prometheus text format on request"""
+    rv = client.get('/metrics')
+    assert rv.mimetype == 'application/json'
+    assert set(json.loads(rv.data)['counters']) >= {'rows_written', 'messages_acked', 'last_write'}
+    assert set(json.loads(rv.data)['latency']['dwell']) >= {'count', 'p50_ms', 'p99_ms', 'max_ms'}
+    
+    for rv in (client.get('/metrics?format=prometheus'),
+               client.get('/metrics', headers={'Accept': 'text/plain;version=0.0.4;q=0.5,*/*;q=0.1'})):
+        assert rv.mimetype == 'text/plain'
+        text = rv.data.decode()
+        assert '# TYPE pvsim_rows_written_total counter' in text
+        assert '# TYPE pvsim_results_rows gauge' in text
+        samples = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+        assert float(samples['pvsim_simulation_running']) in (0, 1)
+        assert int(samples['pvsim_validation_failures_total']) >= 0
+        assert '# TYPE pvsim_stage_latency_seconds histogram' in text
+        assert 'pvsim_stage_latency_seconds_bucket{stage="write",le="+Inf"}' in samples
+
+
+def test_latency_histograms_record_stages_and_switch_off(tmp_path, monkeypatch):
+    """Test batch writes record every stage into shared histograms, and the switch turns recording off"""
+    from counters import PipelineCounters
+    from latency import LatencyHistograms, summarize, bucket_index, bucket_bounds
+    from simulation import BatchWriter
+    from storage import CsvResultsStore
+    
+    store = CsvResultsStore(str(tmp_path / 'results.csv'))
+    store.initialize()
+    histograms = LatencyHistograms(str(tmp_path / 'latency.histograms'))
+    monkeypatch.setattr('simulation.pipeline_counters', PipelineCounters(str(tmp_path / 'pipeline.counters')))
+    monkeypatch.setattr('simulation.latency_histograms', histograms)
+    monkeypatch.setattr(config, 'LATENCY_HISTOGRAMS', True)
+    
+    writer = BatchWriter(store, Mock(), batch_size=2, linger=60)
+    writer.add(('2023-01-01T12:00:00', 5.0, 8.0), 1)
+    writer.add(('2023-01-01T12:00:03', 5.0, 8.0), 2)
+    for value in range(1, 1001):
+        histograms.record('decode', value)
+    
+    # Another process sees the same histograms once this one has flushed its recordings
+    histograms.flush()
+    summary = summarize(LatencyHistograms(histograms.path).snapshot())
+    assert [summary[stage]['count'] for stage in ('compute', 'validate', 'write', 'ack')] == [1, 1, 1, 1]
+    assert summary['decode']['count'] == 1000
+    assert summary['decode']['p50_ms'] == pytest.approx(0.5, rel=1 / 16)
+    assert summary['decode']['p99_ms'] == pytest.approx(0.99, rel=1 / 16)
+    assert summary['decode']['max_ms'] == pytest.approx(1.0, rel=1 / 16)
+    lower, upper = bucket_bounds()
+    assert all(lower[bucket_index(value)] <= value < upper[bucket_index(value)] for value in (0, 31, 32, 1000, 10 ** 9))
+    
+    monkeypatch.setattr(config, 'LATENCY_HISTOGRAMS', False)
+    assert histograms.start() is None
+    writer.add(('2023-01-01T12:00:06', 5.0, 8.0), 3)
+    writer.add(('2023-01-01T12:00:09', 5.0, 8.0), 4)
+    assert summarize(histograms.snapshot())['write']['count'] == 1
+
+
+def test_benchmark_suite_compares_metrics_by_parameters():
+    """Test the suite compares each metric with the same benchmark and parameters of the baseline"""
+    from benchmarks.suite import compare
+    
+    def document(results):
+        return {'benchmarks': [{'name': 'pipeline', 'results': results}]}
+    
+    baseline = document([
+        {'backend': 'csv', 'batch_mode': False, 'messages_per_second': 1000, 'cpu_us_per_message': 50.0},
+        {'backend': 'binary', 'batch_mode': False, 'messages_per_second': 2000, 'cpu_us_per_message': 20.0},
+    ])
+    current = document([
+        {'backend': 'csv', 'batch_mode': False, 'messages_per_second': 800, 'cpu_us_per_message': 52.0},
+        {'backend': 'binary', 'batch_mode': False, 'messages_per_second': 2500, 'cpu_us_per_message': None},
+        {'backend': 'binary', 'batch_mode': True, 'messages_per_second': 9000, 'cpu_us_per_message': 5.0},
+    ])
+    changes = {(c['parameters']['backend'], c['metric']): c for c in compare(baseline, current, threshold=0.1)}
+    
+    assert set(changes) == {('csv', 'messages_per_second'), ('csv', 'cpu_us_per_message'),
+                            ('binary', 'messages_per_second')}
+    assert changes[('csv', 'messages_per_second')]['change'] == -0.2
+    assert changes[('csv', 'messages_per_second')]['regression']
+    assert changes[('csv', 'cpu_us_per_message')]['change'] == -0.04
+    assert not changes[('csv', 'cpu_us_per_message')]['regression']
+    assert changes[('binary', 'messages_per_second')]['change'] == 0.25
+
+
+def test_loadgen_drives_pipeline_and_pollers_open_loop(tmp_path):
+    """Test the load generator gets every reading written and reports latencies from intended send times"""
+    with patch.object(config, 'TRANSPORT', 'inprocess'), \
+         patch.object(config, 'RESULTS_BACKEND', 'csv'), \
+         patch.object(config, 'RESULTS_FILE', str(tmp_path / 'results.csv')), \
+         patch.object(config, 'PV_CONSUMERS', 2):
+        report = run_load(rate=200, duration=0.5, pollers=2, poll_rate=10, fleet_size=20, drain=10)
+    
+    meter = report['meter']
+    assert meter['sent'] == meter['written'] == 100
+    assert meter['unwritten'] == meter['dropped'] == 0
+    assert meter['send_lag_ms']['count'] == meter['end_to_end_ms']['count'] == 100
+    assert 0 < meter['end_to_end_ms']['p50_ms'] <= meter['end_to_end_ms']['max_ms']
+    
+    polled = report['http']
+    assert polled['requests'] == 10 and polled['errors'] == 0
+    assert set(polled['status']) <= {'200', '304'}
+    assert polled['latency_ms']['count'] == 10
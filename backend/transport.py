@@ -0,0 +1,226 @@
+"""
+In-process message transport for PV Simulator
+
+InProcessBroker replaces RabbitMQ when config.TRANSPORT is 'inprocess'. Its
+connections implement the subset of pika's BlockingConnection and
+BlockingChannel API used by the meter and PV workers, so the pipeline runs
+unchanged on a single node without a broker, and the CPU cost of the
+simulation and storage layers can be measured on their own.
+"""
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Messages handed to a consumer per process_data_events call when no prefetch limit is set
+DEFAULT_DELIVERY_BATCH = 256
+
+
+class BackpressureTimeout(Exception):
+    """A publish waited longer than the publish timeout for space in a full queue"""
+
+
+@dataclass(frozen=True)
+class Delivery:
+    """Delivery metadata passed to consumer callbacks (like pika's Basic.Deliver)"""
+    delivery_tag: int
+    routing_key: str
+    redelivered: bool = False
+
+
+# A queued message: (body, properties)
+Message = Tuple[bytes, Any]
+
+
+class MessageQueue:
+    """Bounded FIFO of messages with blocking batch puts and gets"""
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._messages: Deque[Tuple[Message, bool]] = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, message: Message, timeout: Optional[float]) -> None:
+        """
+        Append a message, waiting while the queue is full
+
+        Raises:
+            BackpressureTimeout: If no space became available within timeout seconds
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._messages) < self.max_size, timeout):
+                raise BackpressureTimeout(f"Queue {self.name} is full ({self.max_size} messages)")
+            self._messages.append((message, False))
+            self._cond.notify_all()
+
+    def requeue(self, messages: List[Message]) -> None:
+        """Put rejected or unacknowledged messages back at the head of the queue"""
+        with self._cond:
+            self._messages.extendleft((message, True) for message in reversed(messages))
+            self._cond.notify_all()
+
+    def get_batch(self, max_items: int, timeout: float) -> List[Tuple[Message, bool]]:
+        """
+        Remove up to max_items messages, waiting up to timeout seconds for the first
+
+        Returns:
+            (message, redelivered) pairs, oldest first
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._messages, timeout):
+                return []
+            batch = [self._messages.popleft() for _ in range(min(max_items, len(self._messages)))]
+            self._cond.notify_all()
+            return batch
+
+
+class InProcessChannel:
+    """Channel on an InProcessBroker with pika's acknowledgement semantics"""
+
+    def __init__(self, broker: 'InProcessBroker'):
+        self._broker = broker
+        self._prefetch = 0
+        self._consumers: List[Tuple[MessageQueue, Callable]] = []
+        self._unacked: Dict[int, Tuple[MessageQueue, Message]] = {}
+        self._next_tag = 1
+        self.is_open = True
+
+    def queue_declare(self, queue: str, durable: bool = False, **kwargs) -> None:
+        self._broker.declare(queue)
+
+    def tx_select(self) -> None:
+        """Publishes are delivered as they are accepted; there are no transactions to open"""
+
+    def tx_commit(self) -> None:
+        """Every accepted publish is already delivered, so there is nothing to commit"""
+
+    def tx_rollback(self) -> None:
+        """Accepted publishes cannot be taken back"""
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs) -> None:
+        self._prefetch = prefetch_count
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, **kwargs) -> None:
+        if isinstance(body, str):
+            body = body.encode()
+        self._broker.declare(routing_key).put((body, properties), self._broker.publish_timeout)
+
+    def basic_consume(self, queue: str, on_message_callback: Callable, **kwargs) -> str:
+        self._consumers.append((self._broker.declare(queue), on_message_callback))
+        return f"ctag{len(self._consumers)}"
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> List[Tuple[MessageQueue, Message]]:
+        tags = [t for t in self._unacked if t <= delivery_tag] if multiple else [delivery_tag]
+        return [self._unacked.pop(tag) for tag in tags if tag in self._unacked]
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        self._settle(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True) -> None:
+        settled = self._settle(delivery_tag, multiple)
+        if requeue:
+            self._requeue(settled)
+
+    def _requeue(self, messages: List[Tuple[MessageQueue, Message]]) -> None:
+        by_queue: Dict[str, List[Message]] = {}
+        for queue, message in messages:
+            by_queue.setdefault(queue.name, []).append(message)
+        for name, queued in by_queue.items():
+            self._broker.declare(name).requeue(queued)
+
+    def _deliver(self, time_limit: float) -> int:
+        """Hand queued messages to the consumers, waiting up to time_limit for the first"""
+        delivered = 0
+        waited = False
+        for queue, callback in self._consumers:
+            room = self._prefetch - len(self._unacked) if self._prefetch else DEFAULT_DELIVERY_BATCH
+            if room <= 0:
+                continue
+            # Only the first eligible consumer blocks; the others are polled
+            batch = queue.get_batch(room, 0 if waited else time_limit)
+            waited = True
+            for message, redelivered in batch:
+                tag = self._next_tag
+                self._next_tag += 1
+                self._unacked[tag] = (queue, message)
+                body, properties = message
+                callback(self, Delivery(tag, queue.name, redelivered), properties, body)
+            delivered += len(batch)
+        if not waited:
+            # No consumers, or the prefetch window is full until messages are acked
+            time.sleep(time_limit)
+        return delivered
+
+    def close(self) -> None:
+        """Return unacknowledged messages to their queues, as a broker does on channel close"""
+        if self.is_open:
+            self._requeue(list(self._unacked.values()))
+            self._unacked.clear()
+            self.is_open = False
+
+
+class InProcessConnection:
+    """Connection on an InProcessBroker (a single channel per connection)"""
+
+    def __init__(self, broker: 'InProcessBroker'):
+        self._channel = InProcessChannel(broker)
+        self.is_open = True
+
+    def channel(self) -> InProcessChannel:
+        return self._channel
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        """Deliver pending messages to consumers, waiting up to time_limit if there are none"""
+        self._channel._deliver(time_limit)
+
+    def close(self) -> None:
+        self._channel.close()
+        self.is_open = False
+
+
+class InProcessBroker:
+    """
+    Bounded in-memory queues shared by all connections in the process
+
+    Args:
+        max_queue_size: Messages a queue holds before publishers block
+        publish_timeout: Seconds a publisher waits for space before
+            BackpressureTimeout is raised (None waits indefinitely)
+    """
+
+    def __init__(self, max_queue_size: int, publish_timeout: Optional[float] = None):
+        self.max_queue_size = max_queue_size
+        self.publish_timeout = publish_timeout
+        self._queues: Dict[str, MessageQueue] = {}
+        self._lock = threading.Lock()
+
+    def declare(self, name: str) -> MessageQueue:
+        with self._lock:
+            if name not in self._queues:
+                self._queues[name] = MessageQueue(name, self.max_queue_size)
+            return self._queues[name]
+
+    def connect(self) -> InProcessConnection:
+        return InProcessConnection(self)
+
+    def depths(self) -> Dict[str, int]:
+        """Number of ready messages in each queue"""
+        with self._lock:
+            return {name: len(queue) for name, queue in self._queues.items()}
+
+
+@lru_cache(maxsize=None)
+def get_in_process_broker() -> InProcessBroker:
+    """The process-wide broker used when config.TRANSPORT is 'inprocess'"""
+    return InProcessBroker(config.INPROCESS_QUEUE_SIZE, config.INPROCESS_PUBLISH_TIMEOUT)
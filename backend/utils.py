@@ -4,28 +4,185 @@ Utility functions for PV Simulator
 import time
 import logging
 import numpy as np
-from functools import wraps
-from typing import Callable, Any
+from functools import lru_cache, wraps
+from typing import Callable, Any, Optional
 import pika
+from numpy.typing import ArrayLike
 from config import config
 
 logger = logging.getLogger(__name__)
 
+MICROS_PER_MINUTE = 60 * 1_000_000
+MICROS_PER_HOUR = 60 * MICROS_PER_MINUTE
+MICROS_PER_DAY = 24 * MICROS_PER_HOUR
+SECONDS_PER_DAY = 24 * 60 * 60
 
-def pv_profile(hour: int, minute: int = 0) -> float:
+
+def pv_profile(hour: int, minute: int = 0, capacity: float = 8.0,
+               peak_hour: float = 12.0, width: float = 18.0) -> float:
     """
     Simulate PV output as a bell curve (Gaussian) with realistic curve
     
     Args:
         hour: Hour of the day (0-23)
         minute: Minute of the hour (0-59)
+        capacity: Peak output of the installation in kW
+        peak_hour: Hour of maximum output (solar noon)
+        width: Spread of the curve (twice its variance in hours squared)
         
     Returns:
-        PV power output in kW (0-8 kW max at solar noon)
+        PV power output in kW (0-capacity kW, max at solar noon)
     """
     time_decimal = hour + minute / 60.0
-    peak_hour = 12.0  # Solar noon
-    return max(0, 8 * np.exp(-((time_decimal - peak_hour)**2) / 18))
+    return max(0, capacity * np.exp(-((time_decimal - peak_hour)**2) / width))
+
+
+def pv_profile_batch(hours: ArrayLike, capacity: ArrayLike = 8.0,
+                     peak_hour: float = 12.0, width: float = 18.0) -> np.ndarray:
+    """
+    Vectorized PV output for many points in time
+    
+    Args:
+        hours: Fractional hours of the day (e.g. 12.5 for 12:30)
+        capacity: Peak output in kW, either a scalar or one value per point
+        peak_hour: Hour of maximum output (solar noon)
+        width: Spread of the curve (twice its variance in hours squared)
+        
+    Returns:
+        PV power output in kW for every point
+    """
+    time_decimal = np.asarray(hours, dtype=np.float64)
+    return np.maximum(0, capacity * np.exp(-((time_decimal - peak_hour)**2) / width))
+
+
+class PVProfileTable:
+    """
+    Precomputed daily PV profile with linear interpolation
+    
+    The profile is sampled every `resolution` seconds over one day (86,400
+    float32 entries at one second resolution), so PV output becomes an index
+    lookup instead of an exponential per reading.
+    """
+    
+    def __init__(self, peak_hour: float = 12.0, width: float = 18.0,
+                 capacity: float = 8.0, resolution: int = 1):
+        if resolution < 1 or SECONDS_PER_DAY % resolution:
+            raise ValueError("Table resolution must be a whole divisor of a day in seconds")
+        self.peak_hour = peak_hour
+        self.width = width
+        self.capacity = capacity
+        self.resolution = resolution
+        # A table for 0 kW is sampled at 1 kW, so it still scales to other capacities
+        self._sampled_capacity = capacity or 1.0
+        # One extra sample at 24:00 so interpolation never wraps
+        samples = SECONDS_PER_DAY // resolution + 1
+        hours = np.arange(samples) * (resolution / 3600.0)
+        self.values = pv_profile_batch(hours, self._sampled_capacity, peak_hour, width).astype(np.float32)
+        self._scalar_values = self.values.tolist()
+        self._samples_per_hour = 3600.0 / resolution
+    
+    def lookup(self, hours: ArrayLike, capacity: Optional[ArrayLike] = None) -> np.ndarray:
+        """
+        Interpolated PV output for an array of fractional hours
+        
+        Args:
+            hours: Fractional hours of the day
+            capacity: Optional peak output in kW to scale the table to
+            
+        Returns:
+            PV power output in kW for every point
+        """
+        position = np.mod(np.asarray(hours, dtype=np.float64), 24.0) * self._samples_per_hour
+        index = position.astype(np.int64)
+        fraction = position - index
+        values = self.values[index] * (1.0 - fraction) + self.values[index + 1] * fraction
+        if capacity is None and self.capacity != self._sampled_capacity:
+            capacity = self.capacity
+        if capacity is not None:
+            values = values * (np.asarray(capacity, dtype=np.float64) / self._sampled_capacity)
+        return values
+    
+    def lookup_scalar(self, hour: int, minute: int = 0, capacity: Optional[float] = None) -> float:
+        """Interpolated PV output for a single hour/minute, without NumPy overhead"""
+        position = ((hour + minute / 60.0) % 24.0) * self._samples_per_hour
+        index = int(position)
+        fraction = position - index
+        value = self._scalar_values[index] * (1.0 - fraction) + self._scalar_values[index + 1] * fraction
+        if capacity is None and self.capacity != self._sampled_capacity:
+            capacity = self.capacity
+        if capacity is not None:
+            value *= capacity / self._sampled_capacity
+        return value
+
+
+@lru_cache(maxsize=8)
+def get_profile_table(peak_hour: float = 12.0, width: float = 18.0,
+                      capacity: float = 8.0, resolution: int = 1) -> PVProfileTable:
+    """Build (once per parameter set) and return a PV profile lookup table"""
+    logger.info(f"Building PV profile table (peak {peak_hour}h, width {width}, "
+                f"{capacity} kW, {resolution}s resolution)")
+    return PVProfileTable(peak_hour, width, capacity, resolution)
+
+
+def current_profile_table() -> Optional[PVProfileTable]:
+    """
+    Lookup table for the configured PV profile, or None if tables are disabled
+    
+    Tables are cached by their parameters, so changing the profile settings
+    swaps in a matching table on the next call.
+    """
+    if not config.PV_LOOKUP_TABLE:
+        return None
+    return get_profile_table(config.PV_PEAK_HOUR, config.PV_WIDTH,
+                             config.PV_CAPACITY, config.PV_TABLE_RESOLUTION)
+
+
+def pv_output(hours: ArrayLike, capacity: ArrayLike = 8.0) -> np.ndarray:
+    """
+    PV output for the configured profile, from the lookup table when enabled
+    
+    Args:
+        hours: Fractional hours of the day
+        capacity: Peak output in kW, either a scalar or one value per point
+        
+    Returns:
+        PV power output in kW for every point
+    """
+    table = current_profile_table()
+    if table is not None:
+        return table.lookup(hours, capacity)
+    return pv_profile_batch(hours, capacity, config.PV_PEAK_HOUR, config.PV_WIDTH)
+
+
+def pv_output_scalar(hour: int, minute: int = 0, capacity: float = 8.0) -> float:
+    """Single-reading variant of pv_output"""
+    table = current_profile_table()
+    if table is not None:
+        return table.lookup_scalar(hour, minute, capacity)
+    return pv_profile(hour, minute, capacity, config.PV_PEAK_HOUR, config.PV_WIDTH)
+
+
+def fractional_hours(timestamps: ArrayLike, with_seconds: bool = False) -> np.ndarray:
+    """
+    Convert timestamps to fractional hours of the day
+    
+    By default seconds are dropped, matching the hour/minute resolution
+    used by pv_profile.
+    
+    Args:
+        timestamps: datetime64 values or int64 epoch microseconds
+        with_seconds: Keep the sub-minute part of the time of day
+        
+    Returns:
+        Fractional hours in the range [0, 24)
+    """
+    micros = np.asarray(timestamps)
+    if np.issubdtype(micros.dtype, np.datetime64):
+        micros = micros.astype('datetime64[us]').astype(np.int64)
+    micros_of_day = np.mod(micros.astype(np.int64), MICROS_PER_DAY)
+    if not with_seconds:
+        micros_of_day -= micros_of_day % MICROS_PER_MINUTE
+    return micros_of_day / MICROS_PER_HOUR
 
 
 def retry_on_failure(max_retries: int = 3, delay: int = 5):
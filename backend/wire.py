@@ -0,0 +1,70 @@
+"""
+Wire formats of meter messages
+
+Meter readings are published either as JSON, one reading per message, or as
+binary frames of one or more packed readings. The content_type in a
+message's AMQP properties says which format it uses, so consumers accept
+both and the producer's format can be switched without draining the queues.
+"""
+import struct
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import pika
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_BINARY = 'application/x-pv-meter-frame'
+WIRE_FORMATS: Dict[str, str] = {'json': CONTENT_TYPE_JSON, 'binary': CONTENT_TYPE_BINARY}
+
+# A packed reading: epoch microseconds, meter ID and meter value in kW (16 bytes)
+READING_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('meter_id', '<u4'),
+    ('meter', '<f4'),
+])
+# The same layout for unpacking a single reading without NumPy
+READING_STRUCT = struct.Struct('<qIf')
+
+# Persistent message properties for each content type, built once
+_PROPERTIES = {
+    content_type: pika.BasicProperties(delivery_mode=2, content_type=content_type)
+    for content_type in WIRE_FORMATS.values()
+}
+
+
+def encode_frame(timestamp_us: int, meter_ids: np.ndarray, meter: np.ndarray) -> bytes:
+    """
+    Pack readings taken at the same time into a binary frame
+
+    Args:
+        timestamp_us: Epoch microseconds of the readings
+        meter_ids: Meter ID of every reading
+        meter: Meter value in kW of every reading
+    """
+    records = np.empty(len(meter_ids), dtype=READING_DTYPE)
+    records['timestamp'] = timestamp_us
+    records['meter_id'] = meter_ids
+    records['meter'] = meter
+    return records.tobytes()
+
+
+def decode_frame(body: bytes) -> np.ndarray:
+    """
+    Unpack a binary frame into a structured READING_DTYPE array
+
+    Raises:
+        ValueError: If the body is empty or not a whole number of readings
+    """
+    if not body or len(body) % READING_DTYPE.itemsize:
+        raise ValueError(f"Invalid meter frame of {len(body)} bytes")
+    return np.frombuffer(body, dtype=READING_DTYPE)
+
+
+def content_type_of(properties: Any) -> Optional[str]:
+    """Content type of a message from its AMQP properties (None if not given)"""
+    return getattr(properties, 'content_type', None)
+
+
+def message_properties(body: Union[str, bytes]) -> pika.BasicProperties:
+    """Persistent properties for a message body: bytes are binary frames, str is JSON"""
+    return _PROPERTIES[CONTENT_TYPE_BINARY if isinstance(body, bytes) else CONTENT_TYPE_JSON]
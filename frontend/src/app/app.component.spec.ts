@@ -24,6 +24,7 @@ describe('AppComponent', () => {
       'stopSimulation',
       'getResults',
       'getLatestResults',
+      'liveResults',
       'getStatus',
       'updateStatus'
     ], {
@@ -46,6 +47,7 @@ describe('AppComponent', () => {
     // Setup default spies
     simulatorService.getResults.and.returnValue(of([]));
     simulatorService.getLatestResults.and.returnValue(of([]));
+    simulatorService.liveResults.and.returnValue(of([]));
     simulatorService.getStatus.and.returnValue(of({ running: false }));
     simulatorService.startSimulation.and.returnValue(of(mockResponse));
     simulatorService.stopSimulation.and.returnValue(of({ status: 'stopped', running: false }));
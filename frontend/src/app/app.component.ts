@@ -1,6 +1,6 @@
 import { Component, OnDestroy, OnInit } from '@angular/core';
-import { Subject, interval } from 'rxjs';
-import { switchMap, takeUntil } from 'rxjs/operators';
+import { Subject } from 'rxjs';
+import { takeUntil } from 'rxjs/operators';
 import { SimulationData, SimulatorService } from './services/simulator.service';
 
 @Component({
@@ -15,7 +15,7 @@ export class AppComponent implements OnInit, OnDestroy {
   error: string | null = null;
   private destroy$ = new Subject<void>();
   private pollingStop$ = new Subject<void>();
-  private pollingInterval = 2000; // 2 seconds
+  private pollingInterval = 2000; // 2 seconds, used when the result stream is unavailable
   private maxDataPoints = 50; // Maximum number of data points to display
   private lastTimestamp = '';
 
@@ -98,11 +98,10 @@ export class AppComponent implements OnInit, OnDestroy {
     // Stop any existing polling first
     this.pollingStop$.next();
     
-    interval(this.pollingInterval)
+    this.simulatorService.liveResults(this.pollingInterval)
       .pipe(
         takeUntil(this.destroy$),
-        takeUntil(this.pollingStop$),
-        switchMap(() => this.simulatorService.getLatestResults())
+        takeUntil(this.pollingStop$)
       )
       .subscribe({
         next: (data) => {
@@ -121,15 +120,8 @@ export class AppComponent implements OnInit, OnDestroy {
       return;
     }
 
-    // If this is the first data load or simulation was restarted, replace all data
-    if (this.chartData.length === 0 || newData.length < this.maxDataPoints) {
-      this.chartData = [...newData];
-      this.lastTimestamp = newData[newData.length - 1]?.timestamp || '';
-      this.latestData = newData[newData.length - 1] || null;
-      return;
-    }
-
-    // Find new data points (timestamps newer than our last recorded timestamp)
+    // Find new data points (timestamps newer than our last recorded timestamp).
+    // Stream events contain only new rows; polled snapshots overlap with what we have.
     const newDataPoints = newData.filter(item => item.timestamp > this.lastTimestamp);
     
     if (newDataPoints.length > 0) {
@@ -1,4 +1,4 @@
-import { TestBed } from '@angular/core/testing';
+import { TestBed, discardPeriodicTasks, fakeAsync, tick } from '@angular/core/testing';
 import { HttpClientTestingModule, HttpTestingController } from '@angular/common/http/testing';
 import { SimulatorService, SimulationData, SimulationResponse } from './simulator.service';
 
@@ -85,6 +85,42 @@ describe('SimulatorService', () => {
     req.flush(mockSimulationData);
   });
 
+  it('should stream live results and fall back to polling on stream errors', fakeAsync(() => {
+    const sources: any[] = [];
+    const originalEventSource = (window as any).EventSource;
+    (window as any).EventSource = function (this: any, url: string) {
+      this.url = url;
+      this.close = jasmine.createSpy('close');
+      sources.push(this);
+    };
+
+    const received: SimulationData[][] = [];
+    const subscription = service.liveResults(2000).subscribe(data => received.push(data));
+    expect(sources.length).toBe(1);
+    expect(sources[0].url).toBe('http://localhost:5000/results/stream');
+
+    sources[0].onmessage({ data: JSON.stringify([mockSimulationData[1]]) });
+    expect(received).toEqual([[mockSimulationData[1]]]);
+
+    spyOn(console, 'warn');
+    sources[0].onerror();
+    expect(sources[0].close).toHaveBeenCalled();
+    tick(0);
+    const poll = httpMock.expectOne(req => req.url === 'http://localhost:5000/results/latest');
+    expect(poll.request.params.get('since')).toBe('0');
+    poll.flush({ results: mockSimulationData, cursor: 120 });
+    expect(received[1]).toEqual(mockSimulationData);
+
+    tick(2000);
+    const nextPoll = httpMock.expectOne(req => req.url === 'http://localhost:5000/results/latest');
+    expect(nextPoll.request.params.get('since')).toBe('120');
+    nextPoll.flush({ results: [], cursor: 120 });
+
+    subscription.unsubscribe();
+    discardPeriodicTasks();
+    (window as any).EventSource = originalEventSource;
+  }));
+
   it('should update status', () => {
     let currentStatus = false;
     
@@ -1,6 +1,7 @@
 import { HttpClient } from '@angular/common/http';
 import { Injectable, inject } from '@angular/core';
-import { BehaviorSubject, Observable } from 'rxjs';
+import { BehaviorSubject, Observable, defer, timer } from 'rxjs';
+import { catchError, map, switchMap, tap } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
 
 export interface SimulationData {
@@ -14,6 +15,11 @@ export interface SimulationStatus {
   running: boolean;
 }
 
+export interface LatestResults {
+  results: SimulationData[];
+  cursor: number;  // Pass as `since` to receive only rows written after these
+}
+
 export interface SimulationResponse {
   status: string;
   running: boolean;
@@ -52,6 +58,52 @@ export class SimulatorService {
     return this.http.get<SimulationData[]>(`${this.apiUrl}/results/latest`);
   }
 
+  getLatestResultsSince(cursor: number): Observable<LatestResults> {
+    return this.http.get<LatestResults>(`${this.apiUrl}/results/latest`, {
+      params: { since: cursor }
+    });
+  }
+
+  /**
+   * New results pushed by the backend over Server-Sent Events.
+   * Each event carries only rows written since the previous one.
+   */
+  streamResults(): Observable<SimulationData[]> {
+    return new Observable<SimulationData[]>(subscriber => {
+      const source = new EventSource(`${this.apiUrl}/results/stream`);
+      source.onmessage = event => subscriber.next(JSON.parse(event.data));
+      source.onerror = () => {
+        source.close();
+        subscriber.error(new Error('Result stream unavailable'));
+      };
+      return () => source.close();
+    });
+  }
+
+  /**
+   * Live results: the SSE stream when available, polling /results/latest otherwise
+   */
+  liveResults(pollingInterval: number): Observable<SimulationData[]> {
+    // Each poll asks only for rows after the previous cursor; idle polls are answered with 304
+    const polling = defer(() => {
+      let cursor = 0;
+      return timer(0, pollingInterval).pipe(
+        switchMap(() => this.getLatestResultsSince(cursor)),
+        tap(page => cursor = page.cursor),
+        map(page => page.results)
+      );
+    });
+    if (typeof EventSource === 'undefined') {
+      return polling;
+    }
+    return this.streamResults().pipe(
+      catchError(error => {
+        console.warn('Falling back to polling:', error);
+        return polling;
+      })
+    );
+  }
+
   updateStatus(running: boolean): void {
     this.statusSubject.next(running);
   }